@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import contextlib
 import copy
 from pathlib import Path
+from typing import Iterator
 
 import pandas as pd
 from omegaconf import DictConfig, OmegaConf
@@ -12,6 +14,7 @@ from lightning_pose.models import ALLOWED_MODELS
 from lightning_pose.utils import io as io_utils
 from lightning_pose.utils.predictions import generate_labeled_video as generate_labeled_video_fn
 from lightning_pose.utils.predictions import (
+    InferenceSession,
     load_model_from_checkpoint,
     predict_dataset,
     predict_video,
@@ -38,6 +41,8 @@ class Model:
 
     model: ALLOWED_MODELS | None = None
 
+    _session: InferenceSession | None = None
+
     # Just a constant we can use as a default value for kwargs,
     # to differentiate between user omitting a kwarg, vs explicitly passing None.
     UNSPECIFIED = "unspecified"
@@ -92,6 +97,44 @@ class Model:
                 skip_data_module=True,
             )
 
+    @contextlib.contextmanager
+    def inference_session(
+        self,
+        device: str | None = None,
+        decoder: str | None = None,
+    ) -> Iterator[InferenceSession]:
+        """Keep the model loaded on its device across many prediction calls.
+
+        Inside the context, `predict_on_video_file`, `predict_on_label_csv` and their multiview
+        versions run the network directly instead of constructing a Lightning Trainer, and the
+        data modules used for metrics are built once and reused. This removes most of the
+        per-call overhead when predicting on many short videos:
+
+        .. code-block:: python
+
+            with model.inference_session():
+                for video_file in video_files:
+                    model.predict_on_video_file(video_file)
+
+        Args:
+            device: device to run the model on, e.g. "cuda:1"; defaults to the first gpu if
+                available, else the cpu
+            decoder: heatmap decoder used during the session ("full" or "local"); defaults to
+                `model.heatmap_decoder` from the config
+
+        """
+        if self._session is not None:
+            # nested sessions share the outer session
+            yield self._session
+            return
+        self._load()
+        self._session = InferenceSession(self.model, device=device, decoder=decoder)
+        try:
+            yield self._session
+        finally:
+            self._session.close()
+            self._session = None
+
     def image_preds_dir(self) -> Path:
         return self.model_dir / "image_preds"
 
@@ -175,13 +218,14 @@ class Model:
             # interprets this as a mirrored multiview model, and compute_metrics fails.
             del cfg_pred.data.mirrored_column_matches
 
-        data_module_pred = _build_datamodule_pred(cfg_pred)
+        data_module_pred = self._get_datamodule_pred(cfg_pred)
 
         preds_file_path = output_dir / "predictions.csv"
         preds_file = str(preds_file_path)
 
         df = predict_dataset(
-            cfg_pred, data_module_pred, model=self.model, preds_file=preds_file
+            cfg_pred, data_module_pred, model=self.model, preds_file=preds_file,
+            session=self._session,
         )
 
         if compute_metrics:
@@ -190,6 +234,7 @@ class Model:
                 labels_file=str(csv_file),
                 preds_file=preds_file,
                 data_module=data_module_pred,
+                pca_cache_dir=self.model_dir,
             )
         else:
             metrics = None
@@ -247,7 +292,7 @@ class Model:
 
         cfg_pred = OmegaConf.merge(self.cfg, cfg_overrides)
 
-        data_module_pred = _build_datamodule_pred(cfg_pred)
+        data_module_pred = self._get_datamodule_pred(cfg_pred)
 
         preds_files = []
         for i, view_name in enumerate(view_names):
@@ -257,7 +302,8 @@ class Model:
 
         # Outputs dict[str, pd.DataFrame] because inputs indicate multiview.
         view_to_df_dict = predict_dataset(
-            cfg_pred, data_module_pred, model=self.model, preds_file=preds_files
+            cfg_pred, data_module_pred, model=self.model, preds_file=preds_files,
+            session=self._session,
         )
 
         if compute_metrics:
@@ -270,6 +316,7 @@ class Model:
                     labels_file=str(labels_file),
                     preds_file=_preds_file,
                     data_module=data_module_pred,
+                    pca_cache_dir=self.model_dir,
                 )
         else:
             metrics = None
@@ -282,6 +329,11 @@ class Model:
         output_dir: str | Path | None = UNSPECIFIED,
         compute_metrics: bool = True,
         generate_labeled_video: bool = False,
+        num_shards: int = 1,
+        devices: list[str] | None = None,
+        start_frame: int = 0,
+        end_frame: int | None = None,
+        stride: int = 1,
     ) -> PredictionResult:
         """Predicts on a video file and computes unsupervised loss metrics if applicable.
 
@@ -294,6 +346,15 @@ class Model:
                 predictions.
             generate_labeled_video (bool, optional): Whether to save a labeled video.
                 Defaults to False.
+            num_shards (int, optional): Split the video into this many frame ranges that are
+                predicted in parallel processes; see `utils.predictions.predict_video`.
+            devices (list[str], optional): Devices used by the shard processes.
+            start_frame (int, optional): First frame to predict on. Defaults to 0.
+            end_frame (int, optional): Predict on frames before this one.
+                Defaults to the end of the video.
+            stride (int, optional): Predict on every `stride`-th frame. Defaults to 1.
+                Predictions on a subset of frames are indexed by frame number; the temporal
+                norm metric is skipped for strides other than 1.
 
         Returns:
             PredictionResult: A PredictionResult object containing the predictions and metrics.
@@ -317,6 +378,12 @@ class Model:
             video_file=str(video_file),
             model=self,
             output_pred_file=str(prediction_csv_file),
+            session=self._session,
+            num_shards=num_shards,
+            devices=devices,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            stride=stride,
         )
         if generate_labeled_video:
             labeled_mp4_file = str(
@@ -328,16 +395,18 @@ class Model:
                 output_mp4_file=labeled_mp4_file,
                 confidence_thresh_for_vid=self.cfg.eval.confidence_thresh_for_vid,
                 colormap=self.cfg.eval.get("colormap", "cool"),
+                num_workers=self.cfg.eval.get("labeled_video_num_workers", 1),
             )
 
         if compute_metrics:
             # FIXME: Data module is only used for computing PCA metrics.
-            data_module = _build_datamodule_pred(self.cfg)
+            data_module = self._get_datamodule_pred(self.cfg)
             metrics = compute_metrics_single(
                 cfg=self.cfg,
                 labels_file=None,
                 preds_file=str(prediction_csv_file),
                 data_module=data_module,
+                pca_cache_dir=self.model_dir,
             )
         else:
             metrics = None
@@ -350,6 +419,11 @@ class Model:
         output_dir: str | Path | None = UNSPECIFIED,
         compute_metrics: bool = True,
         generate_labeled_video: bool = False,
+        num_shards: int = 1,
+        devices: list[str] | None = None,
+        start_frame: int = 0,
+        end_frame: int | None = None,
+        stride: int = 1,
     ) -> MultiviewPredictionResult:
         """Version of `predict_on_video_file` that accesses to multiple camera views of each frame.
 
@@ -366,6 +440,15 @@ class Model:
                 predictions.
             generate_labeled_video (bool, optional): Whether to save a labeled video.
                 Defaults to False.
+            num_shards (int, optional): Split the videos into this many frame ranges that are
+                predicted in parallel processes; see `utils.predictions.predict_video`.
+            devices (list[str], optional): Devices used by the shard processes.
+            start_frame (int, optional): First frame to predict on. Defaults to 0.
+            end_frame (int, optional): Predict on frames before this one.
+                Defaults to the end of the video.
+            stride (int, optional): Predict on every `stride`-th frame. Defaults to 1.
+                Predictions on a subset of frames are indexed by frame number; the temporal
+                norm metric is skipped for strides other than 1.
 
         Returns:
             MultiviewPredictionResult: object containing the predictions and metrics for each view.
@@ -407,6 +490,12 @@ class Model:
             video_file=list(map(str, video_file_per_view)),
             model=self,
             output_pred_file=prediction_csv_file_list,
+            session=self._session,
+            num_shards=num_shards,
+            devices=devices,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            stride=stride,
         )
         if generate_labeled_video:
             for video_file, preds_df in zip(video_file_per_view, df_list):
@@ -419,10 +508,11 @@ class Model:
                     output_mp4_file=labeled_mp4_file,
                     confidence_thresh_for_vid=self.cfg.eval.confidence_thresh_for_vid,
                     colormap=self.cfg.eval.get("colormap", "cool"),
+                    num_workers=self.cfg.eval.get("labeled_video_num_workers", 1),
                 )
 
-        data_module = _build_datamodule_pred(self.cfg)
         if compute_metrics:
+            data_module = self._get_datamodule_pred(self.cfg)
             metrics = {}
             for view_name, preds_file in zip(view_names, prediction_csv_file_list):
                 metrics[view_name] = compute_metrics_single(
@@ -430,6 +520,7 @@ class Model:
                     labels_file=None,
                     preds_file=preds_file,
                     data_module=data_module,
+                    pca_cache_dir=self.model_dir,
                 )
         else:
             metrics = None
@@ -438,6 +529,44 @@ class Model:
 
         return MultiviewPredictionResult(predictions=df_dict, metrics=metrics)
 
+    def export(
+        self,
+        output_file: str | Path | None = None,
+        export_format: str = "torchscript",
+    ) -> Path:
+        """Export the network and its heatmap decoder to a self-contained graph.
+
+        The exported file is run with :class:`lightning_pose.runtime.Predictor`, which does not
+        need Lightning or this model directory.
+
+        Args:
+            output_file: Path of the exported graph. Defaults to `{model_dir}/exported_model.pt`
+                for TorchScript and `{model_dir}/exported_model.onnx` for ONNX.
+            export_format: "torchscript" or "onnx"; ONNX export requires the `onnx` package.
+
+        Returns:
+            Path: The path of the exported graph.
+        """
+        # imported here so that loading and predicting does not depend on the exporter
+        from lightning_pose.utils.export import export_model
+
+        if self._session is not None:
+            raise RuntimeError("cannot export a model inside of an inference session")
+        self._load()
+        if output_file is None:
+            suffix = ".onnx" if export_format == "onnx" else ".pt"
+            output_file = self.model_dir / f"exported_model{suffix}"
+        return export_model(self.model, self.cfg, output_file, export_format=export_format)
+
+    def _get_datamodule_pred(self, cfg: DictConfig):
+        """Build a prediction data module, reusing it within an inference session."""
+        if self._session is None:
+            return _build_datamodule_pred(cfg)
+        key = OmegaConf.to_yaml(cfg)
+        if key not in self._session.data_modules:
+            self._session.data_modules[key] = _build_datamodule_pred(cfg)
+        return self._session.data_modules[key]
+
 
 def _build_datamodule_pred(cfg: DictConfig):
     cfg_pred = copy.deepcopy(cfg)
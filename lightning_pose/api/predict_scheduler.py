@@ -0,0 +1,513 @@
+"""Distribute video prediction jobs across worker processes, with a resumable job manifest."""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import torch
+from omegaconf import open_dict
+
+from lightning_pose.api.model import Model
+from lightning_pose.api.prediction_cache import PredictionCache, model_fingerprint
+from lightning_pose.data.utils import get_videos_metadata
+from lightning_pose.data.video_readers import get_video_reader
+from lightning_pose.utils.io import load_predictions
+from lightning_pose.utils.predictions import generate_labeled_video, get_default_devices
+
+__all__ = [
+    "PredictionManifest",
+    "PredictionScheduler",
+    "get_default_devices",
+]
+
+MANIFEST_FILENAME = "predict_manifest.json"
+CACHE_DIRNAME = "prediction_cache"
+
+# frames predicted on by jobs without recorded options, e.g. by runs that predate manifests
+_FULL_VIDEO_OPTIONS = {"start_frame": 0, "end_frame": None, "stride": 1}
+
+
+class PredictionManifest:
+    """Persistent record of video prediction jobs, used to resume interrupted runs.
+
+    A job predicts on a single video, or on all views of a multiview session, and is keyed by the
+    absolute paths of its videos. The manifest file is rewritten (atomically) after every status
+    change, so a job that was running when the run was interrupted is still marked as "running"
+    and will be predicted again, even if some of its output files were already written.
+
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, manifest_file: str | Path) -> None:
+        self.manifest_file = Path(manifest_file)
+        self.jobs: dict[str, dict] = {}
+        if self.manifest_file.exists():
+            with open(self.manifest_file) as f:
+                self.jobs = json.load(f)["jobs"]
+
+    @staticmethod
+    def job_id(video_files: list[str | Path]) -> str:
+        return "|".join(str(Path(v).absolute()) for v in video_files)
+
+    def add(self, video_files: list[str | Path], output_files: list[str | Path]) -> str:
+        """Register a job (keeping its previous status if it is already in the manifest)."""
+        job_id = self.job_id(video_files)
+        job = self.jobs.setdefault(job_id, {"status": self.PENDING})
+        job["videos"] = [str(Path(v).absolute()) for v in video_files]
+        job["outputs"] = [str(Path(o).absolute()) for o in output_files]
+        return job_id
+
+    def is_complete(self, job_id: str, options: dict | None = None) -> bool:
+        """Check whether a job can be skipped.
+
+        Jobs that were started by an earlier run are complete if they finished and all of their
+        outputs exist. Jobs that were never started (e.g. predicted by a run that predates
+        manifests) are complete if all of their outputs exist.
+
+        Args:
+            job_id: id returned by :meth:`add`
+            options: frame options (start_frame, end_frame, stride) of the current run; jobs
+                that were predicted with other options are not complete
+
+        """
+        job = self.jobs[job_id]
+        if options is not None and job.get("options", _FULL_VIDEO_OPTIONS) != options:
+            return False
+        outputs_exist = all(Path(o).exists() for o in job["outputs"])
+        if job["status"] == self.PENDING:
+            return outputs_exist
+        return job["status"] == self.DONE and outputs_exist
+
+    def set_status(self, job_id: str, status: str, **info) -> None:
+        job = self.jobs[job_id]
+        job["status"] = status
+        job.update(info)
+        if status in (self.DONE, self.FAILED):
+            job["finished"] = _timestamp()
+        self.save()
+
+    def save(self) -> None:
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix(".json.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump({"jobs": self.jobs}, f, indent=2)
+        os.replace(tmp_file, self.manifest_file)
+
+
+class PredictionScheduler:
+    """Predict on many videos with a pool of worker processes that each load the model once.
+
+    Workers are assigned devices round-robin from `devices`, so several workers can share a gpu,
+    and cpu-only machines can run one worker per group of cores; each worker process only sees
+    its own gpu. Jobs are marked as running in the manifest when a worker starts them. Every
+    worker keeps the model in an inference session (see :meth:`Model.inference_session`) for the
+    lifetime of the pool. With `num_workers=1` jobs are run in the main process.
+
+    """
+
+    def __init__(
+        self,
+        model_dir: str | Path,
+        hydra_overrides: list[str] | None = None,
+        num_workers: int = 1,
+        devices: list[str] | None = None,
+        generate_labeled_video: bool = True,
+        manifest_file: str | Path | None = None,
+        num_shards: int = 1,
+        start_frame: int = 0,
+        end_frame: int | None = None,
+        stride: int = 1,
+        use_cache: bool = True,
+        cache_dir: str | Path | None = None,
+    ) -> None:
+        """
+
+        Args:
+            model_dir: directory of the trained model
+            hydra_overrides: config overrides applied when loading the model
+            num_workers: number of worker processes
+            devices: devices assigned to the workers, e.g. ["cuda:0", "cuda:1"] or ["cpu"];
+                defaults to all visible gpus, or the cpu if there are none
+            generate_labeled_video: save a labeled video for each predicted video
+            manifest_file: path of the job manifest; defaults to
+                `<model_dir>/video_preds/predict_manifest.json`
+            num_shards: split each video into this many frame ranges that are predicted in
+                parallel processes on `devices` (see `utils.predictions.predict_video`); cannot be
+                combined with `num_workers > 1`
+            start_frame: first frame of each video to predict on
+            end_frame: predict on frames before this one; defaults to the end of each video
+            stride: predict on every `stride`-th frame
+            use_cache: reuse the outputs of earlier predictions on videos with the same content
+                and the same model (see :class:`PredictionCache`), and store new outputs
+            cache_dir: directory of the prediction cache, which can be shared between models;
+                defaults to `<model_dir>/prediction_cache`
+
+        """
+        if num_workers > 1 and num_shards > 1:
+            # each worker would start its own pool of shard processes on all of the devices
+            raise ValueError(
+                "num_workers > 1 cannot be combined with num_shards > 1; use workers to predict "
+                "on many videos, or shards to predict on a few long videos"
+            )
+        self.model_dir = Path(model_dir).absolute()
+        self.hydra_overrides = hydra_overrides
+        self.num_workers = max(1, num_workers)
+        self.devices = devices or get_default_devices()
+        # keyword arguments of `Model.predict_on_video_file(_multiview)`
+        self.predict_kwargs = dict(
+            generate_labeled_video=generate_labeled_video,
+            num_shards=num_shards,
+            devices=self.devices,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            stride=stride,
+        )
+        self.model = Model.from_dir2(self.model_dir, hydra_overrides=hydra_overrides)
+        if manifest_file is None:
+            manifest_file = self.model.video_preds_dir() / MANIFEST_FILENAME
+        self.manifest = PredictionManifest(manifest_file)
+        # prediction options that change the outputs; recorded in the manifest and the cache key
+        self.frame_options = dict(start_frame=start_frame, end_frame=end_frame, stride=stride)
+        self.cache = None
+        if use_cache:
+            self.cache = PredictionCache(cache_dir or self.model_dir / CACHE_DIRNAME)
+            self.model_fp = model_fingerprint(self.model_dir, self.model.cfg)
+
+    def output_files(self, video_files: list[Path]) -> list[Path]:
+        return [self.model.video_preds_dir() / f"{Path(v).stem}.csv" for v in video_files]
+
+    def labeled_video_files(self, video_files: list[Path]) -> list[Path]:
+        return [
+            self.model.labeled_videos_dir() / f"{Path(v).stem}_labeled.mp4" for v in video_files
+        ]
+
+    def run(self, video_jobs: list[list[Path]], skip_existing: bool = True) -> PredictionManifest:
+        """Predict on each job (a list with a video, or with the videos of a multiview session).
+
+        With a prediction cache, jobs whose outputs are cached are restored from the cache instead
+        of predicted, and the outputs of new predictions are added to the cache; jobs that were
+        predicted by a different model (or on videos that changed) are predicted again. Jobs on
+        identical videos (e.g. renamed copies) are predicted once and restored from the cache.
+        Without a cache, or if the cache has no entry for a job, jobs are skipped if the manifest
+        records them as complete, with the same frame options (`start_frame`, `end_frame`,
+        `stride`).
+
+        Args:
+            video_jobs: one entry per job
+            skip_existing: skip jobs that are cached (or complete); otherwise predict all jobs
+
+        Returns:
+            the updated manifest
+
+        """
+        job_ids = []
+        # jobs on the same videos as a job in `job_ids`, by cache key
+        duplicates: dict[str, list[str]] = {}
+        for video_files in video_jobs:
+            output_files = self.output_files(video_files)
+            job_id = self.manifest.add(video_files, output_files)
+            job = self.manifest.jobs[job_id]
+            video_names = ", ".join(str(v) for v in video_files)
+            prev_cache_key = job.get("cache_key")
+            if self.cache is not None:
+                job["cache_key"] = self.cache.key(video_files, self.model_fp, self.frame_options)
+                if job["cache_key"] in duplicates:
+                    job["status"] = PredictionManifest.PENDING
+                    duplicates[job["cache_key"]].append(job_id)
+                    continue
+                if skip_existing and self._restore(job_id):
+                    print(f"Skipping {video_names} (restored from the prediction cache)")
+                    job["status"] = PredictionManifest.DONE
+                    job["options"] = self.frame_options
+                    continue
+            # outputs that are not cached, e.g. predicted without a cache; with a cache, only
+            # outputs of the same model on the same videos are kept
+            if (
+                skip_existing
+                and prev_cache_key in (None, job.get("cache_key"))
+                and self.manifest.is_complete(job_id, self.frame_options)
+            ):
+                print(f"Skipping {video_names} (already predicted)")
+                job["status"] = PredictionManifest.DONE
+                continue
+            job["status"] = PredictionManifest.PENDING
+            job_ids.append(job_id)
+            if self.cache is not None:
+                duplicates[job["cache_key"]] = []
+        self.manifest.save()
+        if len(job_ids) == 0:
+            return self.manifest
+
+        # all views of a session have the same number of frames
+        metadata = get_videos_metadata([self.manifest.jobs[j]["videos"][0] for j in job_ids])
+        for job_id, m in zip(job_ids, metadata):
+            self.manifest.jobs[job_id]["frames"] = m.frame_count
+        num_workers = min(self.num_workers, len(job_ids))
+        print(
+            f"Predicting on {len(job_ids)} job(s) ({sum(m.frame_count for m in metadata)} "
+            f"frames) with {num_workers} worker(s)"
+        )
+        if num_workers == 1:
+            self._run_serial(job_ids)
+        else:
+            self._run_parallel(job_ids, num_workers)
+
+        # restore the outputs of identical videos from the cache entries of the predicted jobs
+        for cache_key, duplicate_ids in duplicates.items():
+            for job_id in duplicate_ids:
+                if self._restore(job_id):
+                    self.manifest.set_status(
+                        job_id, PredictionManifest.DONE, options=self.frame_options,
+                    )
+                    print(f"[{PredictionManifest.DONE}] {job_id} (identical videos)")
+                else:
+                    self.manifest.set_status(
+                        job_id, PredictionManifest.FAILED, error="identical videos failed",
+                    )
+            job_ids += duplicate_ids
+
+        failed = [j for j in job_ids if self.manifest.jobs[j]["status"] != PredictionManifest.DONE]
+        if len(failed) > 0:
+            print(f"{len(failed)} job(s) failed; see {self.manifest.manifest_file}")
+        return self.manifest
+
+    def _run_serial(self, job_ids: list[str]) -> None:
+        device = self.devices[0]
+        _prepare_model_for_device(self.model, device, num_workers=1)
+        with _dali_device(device), self.model.inference_session(device=device):
+            for job_id in job_ids:
+                self.manifest.set_status(
+                    job_id, PredictionManifest.RUNNING, device=device, started=_timestamp(),
+                )
+                result = _run_job(
+                    self.model, self.manifest.jobs[job_id]["videos"], self.predict_kwargs,
+                )
+                result["device"] = device
+                self._finish_job(job_id, result)
+
+    def _run_parallel(self, job_ids: list[str], num_workers: int) -> None:
+        # start with the longest jobs, so that a long video does not keep one worker busy at the
+        # end of the run while the others are idle
+        job_ids = sorted(job_ids, key=lambda j: self.manifest.jobs[j]["frames"], reverse=True)
+        # cuda cannot be re-initialized in forked processes
+        ctx = multiprocessing.get_context("spawn")
+        device_queue = ctx.Queue()
+        for i in range(num_workers):
+            device_queue.put(self.devices[i % len(self.devices)])
+        # workers report when they start a job, so that queued jobs stay pending
+        started_queue = ctx.Queue()
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(
+                str(self.model_dir), self.hydra_overrides, device_queue, started_queue,
+                num_workers,
+            ),
+        ) as pool:
+            futures = {}
+            for job_id in job_ids:
+                future = pool.submit(
+                    _run_worker_job,
+                    job_id,
+                    self.manifest.jobs[job_id]["videos"],
+                    self.predict_kwargs,
+                )
+                futures[future] = job_id
+            not_done = set(futures)
+            while not_done:
+                done, not_done = wait(not_done, timeout=1.0, return_when=FIRST_COMPLETED)
+                self._mark_started(started_queue)
+                for future in done:
+                    job_id = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # the worker process itself died
+                        result = {"status": PredictionManifest.FAILED, "error": repr(e)}
+                    self._finish_job(job_id, result)
+                    print(f"[{result['status']}] {job_id}")
+
+    def _mark_started(self, started_queue: multiprocessing.Queue) -> None:
+        while True:
+            try:
+                job_id, info = started_queue.get_nowait()
+            except queue.Empty:
+                return
+            # the result of a short job can arrive before its start message
+            if self.manifest.jobs[job_id]["status"] == PredictionManifest.PENDING:
+                self.manifest.set_status(job_id, PredictionManifest.RUNNING, **info)
+
+    def _finish_job(self, job_id: str, result: dict) -> None:
+        if result["status"] == PredictionManifest.DONE:
+            # frames that the outputs were predicted on
+            result["options"] = self.frame_options
+            if self.cache is not None:
+                self._store(job_id)
+        self.manifest.set_status(job_id, **result)
+
+    def _store(self, job_id: str) -> None:
+        job = self.manifest.jobs[job_id]
+        labeled_video_files = None
+        if self.predict_kwargs["generate_labeled_video"]:
+            labeled_video_files = self.labeled_video_files(job["videos"])
+        self.cache.store(
+            job["cache_key"], job["outputs"], labeled_video_files=labeled_video_files,
+            videos=job["videos"], model_dir=self.model_dir,
+        )
+
+    def _restore(self, job_id: str) -> bool:
+        """Restore the outputs of a job from the cache; returns False if they are not cached."""
+        job = self.manifest.jobs[job_id]
+        labeled_video_files = None
+        if self.predict_kwargs["generate_labeled_video"]:
+            labeled_video_files = self.labeled_video_files(job["videos"])
+        if not self.cache.restore(job["cache_key"], job["outputs"], labeled_video_files):
+            return False
+        if labeled_video_files is not None:
+            missing = [
+                (video_file, output_file, labeled_video_file)
+                for video_file, output_file, labeled_video_file in zip(
+                    job["videos"], job["outputs"], labeled_video_files
+                )
+                if not labeled_video_file.exists()
+            ]
+            # cached by a run that skipped labeled videos; render them from the predictions
+            for video_file, output_file, labeled_video_file in missing:
+                generate_labeled_video(
+                    video_file=video_file,
+                    preds_df=load_predictions(output_file),
+                    output_mp4_file=str(labeled_video_file),
+                    confidence_thresh_for_vid=self.model.cfg.eval.confidence_thresh_for_vid,
+                    colormap=self.model.cfg.eval.get("colormap", "cool"),
+                    num_workers=self.model.cfg.eval.get("labeled_video_num_workers", 1),
+                )
+            if missing:
+                self._store(job_id)
+        return True
+
+
+def _prepare_model_for_device(model: Model, device: str, num_workers: int) -> None:
+    if torch.device(device).type != "cpu":
+        return
+    # DALI decodes on the gpu; fall back to the OpenCV reader
+    if get_video_reader(model.cfg.dali) == "dali":
+        print("Predicting on the cpu: using the OpenCV video reader")
+        with open_dict(model.cfg):
+            model.cfg.dali.predict_reader = "opencv"
+    # split the cores between the workers rather than oversubscribing them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // num_workers))
+
+
+def _run_job(model: Model, video_files: list[str], predict_kwargs: dict) -> dict:
+    t_beg = time.time()
+    try:
+        if model.config.is_multi_view():
+            model.predict_on_video_file_multiview(video_files, **predict_kwargs)
+        else:
+            for video_file in video_files:
+                model.predict_on_video_file(video_file, **predict_kwargs)
+    except Exception:
+        traceback.print_exc()
+        return {
+            "status": PredictionManifest.FAILED,
+            "error": traceback.format_exc(limit=3),
+            "elapsed": time.time() - t_beg,
+        }
+    return {"status": PredictionManifest.DONE, "error": None, "elapsed": time.time() - t_beg}
+
+
+def _timestamp() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@contextlib.contextmanager
+def _dali_device(device: str):
+    """Make DALI decode on `device` in the current process.
+
+    DALI pipelines decode on the gpu given by LOCAL_RANK (see `PrepareDALI`), which defaults to
+    the first gpu.
+
+    """
+    local_rank = os.environ.get("LOCAL_RANK")
+    if torch.device(device).type == "cuda":
+        os.environ["LOCAL_RANK"] = str(torch.device(device).index or 0)
+    try:
+        yield
+    finally:
+        if local_rank is None:
+            os.environ.pop("LOCAL_RANK", None)
+        else:
+            os.environ["LOCAL_RANK"] = local_rank
+
+
+def _pin_worker_device(device: str) -> str:
+    """Make the gpu of a worker process the only gpu visible to it.
+
+    Must be called before cuda is initialized in the worker. Otherwise DALI (see `_dali_device`)
+    and the cuda context that torch creates on the first gpu would put every worker on gpu 0.
+
+    Returns:
+        the device to use in the worker process
+
+    """
+    if torch.device(device).type != "cuda":
+        return device
+    index = torch.device(device).index or 0
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+    if visible:
+        # device indices are relative to the gpus visible to the parent process
+        os.environ["CUDA_VISIBLE_DEVICES"] = visible.split(",")[index].strip()
+    else:
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(index)
+    os.environ["LOCAL_RANK"] = "0"
+    return "cuda:0"
+
+
+# model and device of the current worker process, set by _init_worker
+_worker_model: Model | None = None
+_worker_device: str | None = None
+_worker_started_queue: multiprocessing.Queue | None = None
+
+
+def _init_worker(
+    model_dir: str,
+    hydra_overrides: list[str] | None,
+    device_queue: multiprocessing.Queue,
+    started_queue: multiprocessing.Queue,
+    num_workers: int,
+) -> None:
+    global _worker_model, _worker_device, _worker_started_queue
+    # the device reported in the manifest; the worker only sees this gpu
+    _worker_device = device_queue.get()
+    _worker_started_queue = started_queue
+    device = _pin_worker_device(_worker_device)
+    _worker_model = Model.from_dir2(model_dir, hydra_overrides=hydra_overrides)
+    _prepare_model_for_device(_worker_model, device, num_workers)
+    # the session stays open until the worker process exits; multiprocessing runs finalizers
+    # with an exit priority when the process shuts down, unlike atexit hooks
+    session = _worker_model.inference_session(device=device)
+    session.__enter__()
+    multiprocessing.util.Finalize(
+        None, session.__exit__, args=(None, None, None), exitpriority=10,
+    )
+
+
+def _run_worker_job(job_id: str, video_files: list[str], predict_kwargs: dict) -> dict:
+    _worker_started_queue.put((job_id, {"device": _worker_device, "started": _timestamp()}))
+    result = _run_job(_worker_model, video_files, predict_kwargs)
+    result["device"] = _worker_device
+    return result
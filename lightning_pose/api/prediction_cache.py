@@ -0,0 +1,227 @@
+"""Content-addressed cache of video predictions, keyed on video and model fingerprints."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from omegaconf import DictConfig, OmegaConf
+
+from lightning_pose.utils import io as io_utils
+
+__all__ = [
+    "PredictionCache",
+    "file_fingerprint",
+    "model_fingerprint",
+]
+
+# size of each block that is hashed by `file_fingerprint`
+_BLOCK_SIZE = 1 << 20
+
+# files written next to the predictions `<video_stem>.csv`, see `save_predictions` and
+# `compute_metrics_single`
+_OUTPUT_SUFFIXES = [
+    ".csv",
+    ".npz",
+    ".h5",
+    "_temporal_norm.csv",
+    "_pca_singleview_error.csv",
+    "_pca_multiview_error.csv",
+]
+
+# suffix of labeled videos `<labeled_videos_dir>/<video_stem>_labeled.mp4` in cache entries
+_LABELED_VIDEO_SUFFIX = "_labeled.mp4"
+
+# config entries that do not change the predictions
+_IGNORED_CONFIG_KEYS = [("data", "data_dir"), ("data", "video_dir"), ("dali", None)]
+
+
+def file_fingerprint(path: str | Path) -> str:
+    """Fast fingerprint of a (large) file from its size and three sampled blocks.
+
+    Hashes the first, middle and last megabyte of the file rather than all of it, so that
+    fingerprinting an archive of videos on shared storage only reads a few megabytes per video.
+    Identical copies of a file have the same fingerprint regardless of their name or location.
+
+    """
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        if size <= 3 * _BLOCK_SIZE:
+            h.update(f.read())
+        else:
+            for offset in [0, (size - _BLOCK_SIZE) // 2, size - _BLOCK_SIZE]:
+                f.seek(offset)
+                h.update(f.read(_BLOCK_SIZE))
+    return h.hexdigest()
+
+
+def model_fingerprint(model_dir: str | Path, cfg: DictConfig) -> str:
+    """Fingerprint of a trained model: its checkpoint and the config entries used to predict."""
+    ckpt_file = io_utils.ckpt_path_from_base_path(
+        base_path=str(model_dir), model_name=cfg.model.model_name
+    )
+    if ckpt_file is None:
+        raise FileNotFoundError(f"no checkpoint found in {model_dir}")
+    cfg = OmegaConf.to_container(cfg, resolve=True)
+    for section, key in _IGNORED_CONFIG_KEYS:
+        if key is None:
+            cfg.pop(section, None)
+        else:
+            cfg.get(section, {}).pop(key, None)
+    h = hashlib.blake2b(file_fingerprint(ckpt_file).encode(), digest_size=16)
+    h.update(json.dumps(cfg, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """Store of prediction outputs, indexed by the content of the videos and of the model.
+
+    Each entry holds the prediction (and unsupervised metric) files of a single video, or of all
+    views of a multiview session, and is keyed on the fingerprints of the videos, the fingerprint
+    of the model, and prediction options such as the frame range. Renamed copies of a video
+    therefore share an entry, and retraining a model invalidates its entries. Entries are stored
+    under `<cache_dir>/<key>/`, with an `entry.json` file that is written last.
+
+    Files are hard-linked into and out of the cache when possible (copied otherwise), so cached
+    outputs take no extra space. The size and modification time of every file are recorded in the
+    entry file; an entry whose files were rewritten in place through one of their links is
+    discarded rather than restored.
+
+    """
+
+    ENTRY_FILENAME = "entry.json"
+
+    def __init__(self, cache_dir: str | Path) -> None:
+        self.cache_dir = Path(cache_dir)
+
+    @staticmethod
+    def key(
+        video_files: list[str | Path],
+        model_fp: str,
+        options: dict | None = None,
+    ) -> str:
+        """Cache key of a prediction job.
+
+        Args:
+            video_files: video of the job, or videos of all views in view order
+            model_fp: model fingerprint, see `model_fingerprint`
+            options: prediction options that change the outputs, e.g. the frame range
+
+        """
+        h = hashlib.blake2b(model_fp.encode(), digest_size=16)
+        for video_file in video_files:
+            h.update(file_fingerprint(video_file).encode())
+        h.update(json.dumps(options or {}, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def contains(self, key: str) -> bool:
+        return (self.entry_dir(key) / self.ENTRY_FILENAME).exists()
+
+    def store(
+        self,
+        key: str,
+        output_files: list[str | Path],
+        labeled_video_files: list[str | Path] | None = None,
+        **info,
+    ) -> None:
+        """Add the outputs of a job to the cache.
+
+        Args:
+            key: cache key of the job
+            output_files: prediction csv file of each video of the job; files with the same stem
+                (metrics, binary copies of the predictions) are stored with it
+            labeled_video_files: (optional) labeled video of each video of the job; stored if they
+                exist
+            info: additional metadata saved in the entry file
+
+        """
+        tmp_dir = self.cache_dir / f".{key}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        sources = []
+        for i, output_file in enumerate(map(Path, output_files)):
+            for suffix in _OUTPUT_SUFFIXES:
+                sources.append((i, suffix, output_file.with_name(output_file.stem + suffix)))
+        for i, labeled_video_file in enumerate(labeled_video_files or []):
+            sources.append((i, _LABELED_VIDEO_SUFFIX, Path(labeled_video_file)))
+        files = []
+        for i, suffix, src in sources:
+            if src.exists():
+                dst = tmp_dir / f"{i}{suffix}"
+                _link_or_copy(src, dst)
+                stat = dst.stat()
+                files.append([i, suffix, stat.st_size, stat.st_mtime_ns])
+        with open(tmp_dir / self.ENTRY_FILENAME, "w") as f:
+            json.dump(
+                {"files": files, "created": time.strftime("%Y-%m-%d %H:%M:%S"), **info},
+                f,
+                indent=2,
+                default=str,
+            )
+        entry_dir = self.entry_dir(key)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+
+    def restore(
+        self,
+        key: str,
+        output_files: list[str | Path],
+        labeled_video_files: list[str | Path] | None = None,
+    ) -> bool:
+        """Restore the cached outputs of a job to `output_files` (and their metric files).
+
+        Args:
+            key: cache key of the job
+            output_files: prediction csv file of each video of the job
+            labeled_video_files: (optional) restore cached labeled videos to these files; jobs
+                cached without labeled videos are still restored
+
+        Returns:
+            False if the cache has no valid entry for `key`
+
+        """
+        if not self.contains(key):
+            return False
+        entry_dir = self.entry_dir(key)
+        with open(entry_dir / self.ENTRY_FILENAME) as f:
+            files = json.load(f)["files"]
+        for i, suffix, size, mtime_ns in files:
+            stat = (entry_dir / f"{i}{suffix}").stat()
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                # rewritten through a hard link since it was stored
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                return False
+        for i, suffix, _, _ in files:
+            if suffix == _LABELED_VIDEO_SUFFIX:
+                if labeled_video_files is None:
+                    continue
+                dst = Path(labeled_video_files[i])
+            else:
+                output_file = Path(output_files[i])
+                dst = output_file.with_name(output_file.stem + suffix)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            _link_or_copy(entry_dir / f"{i}{suffix}", dst)
+        return True
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link `src` to `dst`, or copy it if linking fails (e.g. across file systems).
+
+    Copies keep the modification time of `src`, which `load_predictions` compares.
+
+    """
+    if dst.exists() and os.path.samefile(src, dst):
+        return
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
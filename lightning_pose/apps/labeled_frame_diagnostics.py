@@ -31,6 +31,7 @@ from lightning_pose.apps.utils import (
     get_model_folders_vis,
     update_labeled_file_list,
 )
+from lightning_pose.utils.io import load_predictions
 
 # catplot_options = ["boxen", "box", "bar", "violin", "strip"]  # for seaborn
 catplot_options = ["box", "violin", "strip"]  # for plotly
@@ -97,7 +98,7 @@ def run():
                     dframe = pd.read_csv(model_pred_file_path, index_col=0)
                     dframes_metrics[model_name][str(model_pred_file)] = dframe
                 else:
-                    dframe = pd.read_csv(model_pred_file_path, header=[1, 2], index_col=0)
+                    dframe = load_predictions(model_pred_file_path).droplevel("scorer", axis=1)
                     dframes_metrics[model_name]['confidence'] = dframe
                 data_types = dframe.iloc[:, -1].unique()
 
@@ -3,6 +3,7 @@ from typing import Any, Dict, Tuple
 import lightning.pytorch as pl
 import torch
 from lightning.pytorch.callbacks import Callback
+from torch.nn import functional as F
 
 # to ignore imports for sphix-autoapidoc
 __all__ = [
@@ -286,45 +287,33 @@ class PatchMasker:
 
         # Initialize masks
         patch_mask = torch.ones(batch_size, num_views, total_patches_per_view, device=device)
-        masked_images = images.clone()
-
-        # Apply patch masking per batch sample and view
-        for batch_idx in range(batch_size):
-            for view_idx in range(num_views):
-                if patches_to_mask_per_view > 0:
-                    # Create a deterministic seed for this specific combination
-                    # Same patches are masked for the same training step, batch, and view
-                    # Using multiplication to avoid seed collisions between different combinations
-                    deterministic_seed = (
-                        self.patch_seed
-                        + training_step
-                        + batch_idx * 1000
-                        + view_idx * 100
-                    )
-                    # Create a local generator instead of modifying global torch seed
-                    local_generator = torch.Generator(device=device)
-                    local_generator.manual_seed(deterministic_seed)
-
-                    # Random patch selection with local generator
-                    patch_indices = torch.randperm(
-                        total_patches_per_view,
-                        device=device,
-                        generator=local_generator
-                    )[:patches_to_mask_per_view]
-                    patch_mask[batch_idx, view_idx, patch_indices] = 0
-                    # Zero out the selected patches
-                    for patch_idx in patch_indices:
-                        # Convert patch index to spatial coordinates
-                        patch_h = (patch_idx // num_patches_w) * patch_size
-                        patch_w = (patch_idx % num_patches_w) * patch_size
-                        # Zero out the patch region
-                        masked_images[
-                            batch_idx,
-                            view_idx,
-                            :,
-                            patch_h:patch_h + patch_size,
-                            patch_w:patch_w + patch_size
-                        ] = 0
+        if patches_to_mask_per_view == 0:
+            return images.clone(), patch_mask
+
+        # Draw an independent random permutation of the patches for every batch sample and view
+        # at once; same patches are masked for the same training step, batch index, and view
+        # Use a local generator instead of modifying global torch seed
+        local_generator = torch.Generator(device=device)
+        local_generator.manual_seed(self.patch_seed + training_step)
+        patch_indices = torch.rand(
+            batch_size, num_views, total_patches_per_view,
+            device=device,
+            generator=local_generator,
+        ).argsort(dim=-1)[..., :patches_to_mask_per_view]
+        patch_mask.scatter_(-1, patch_indices, 0.0)
+
+        # Upsample the patch mask to pixel resolution; pixels beyond the last full patch are kept
+        pixel_mask = patch_mask.reshape(batch_size, num_views, 1, num_patches_h, num_patches_w)
+        pixel_mask = pixel_mask.repeat_interleave(patch_size, dim=-2)
+        pixel_mask = pixel_mask.repeat_interleave(patch_size, dim=-1)
+        pixel_mask = F.pad(
+            pixel_mask,
+            (0, width - num_patches_w * patch_size, 0, height - num_patches_h * patch_size),
+            value=1.0,
+        )
+
+        # Zero out the selected patches
+        masked_images = images * pixel_mask.to(images.dtype)
 
         return masked_images, patch_mask
 
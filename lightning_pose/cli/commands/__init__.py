@@ -1,6 +1,6 @@
 """Command modules for the lightning-pose CLI."""
 
-from . import crop, predict, remap, run_app, train
+from . import crop, export, predict, remap, run_app, train
 
 # List of all available commands
 COMMANDS = {
@@ -8,5 +8,6 @@ COMMANDS = {
     "predict": predict,
     "crop": crop,
     "remap": remap,
+    "export": export,
     "run_app": run_app,
 }
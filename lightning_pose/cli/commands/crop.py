@@ -52,7 +52,8 @@ def register_parser(subparsers):
                         ├── bbox.csv                      (bbox)
                         └── cropped_<csv_file_name>.csv   (cropped labels)
                 └── cropped_images/
-                        └── a/b/c/<image_name>.png        (cropped images)
+                        ├── a/b/c/<image_name>.png        (cropped images)
+                        └── packed_images.zip             (cropped images, with --packed)
 
             For an end-to-end usage example of the Cropzoom workflow, see the user guide:
             {_doc_link}.
@@ -83,6 +84,12 @@ def register_parser(subparsers):
         default="",  # Or a reasonable default like "0,0,0" if appropriate
         help="Comma-separated list of anchor keypoint names, defaults to all keypoints",
     )
+    crop_parser.add_argument(
+        "--packed",
+        action="store_true",
+        help="save cropped images to a single archive, cropped_images/packed_images.zip, "
+        "instead of one file per image. Training reads images from the archive",
+    )
     return crop_parser
 
 
@@ -151,6 +158,7 @@ def handle(args):
                 output_data_dir=cropped_data_dir,
                 output_bbox_file=output_bbox_file,
                 output_csv_file=output_csv_file_path,
+                packed=args.packed,
             )
         else:
             raise NotImplementedError("Only mp4 and csv files are supported.")
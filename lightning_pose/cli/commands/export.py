@@ -0,0 +1,75 @@
+"""Export command for the lightning-pose CLI."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from textwrap import dedent
+from typing import TYPE_CHECKING
+
+from .. import types
+
+if TYPE_CHECKING:
+    from lightning_pose.api.model import Model  # noqa: F401
+
+
+def register_parser(subparsers):
+    """Register the export command parser."""
+    description_text = dedent(
+        """\
+            Exports a trained model to a self-contained TorchScript or ONNX graph.
+
+            The graph includes the image normalization, the backbone, the head and the heatmap
+            decoder, and maps resized uint8 RGB frames to keypoints and confidences.
+            Run it with ``lightning_pose.runtime.Predictor``, which does not import Lightning.
+
+            By default the graph is saved to::
+
+                <model_dir>/
+                └── exported_model.pt                 (torchscript)
+                └── exported_model.onnx               (onnx)
+
+            Only single-view heatmap models (heatmap, heatmap_mhcrnn) can be exported.
+            ONNX export requires the onnx package, and running ONNX graphs requires onnxruntime.
+            """
+    )
+
+    export_parser = subparsers.add_parser(
+        "export",
+        description=description_text,
+        usage="litpose export <model_dir> [--format {torchscript,onnx}] [--output_file FILE]",
+    )
+    export_parser.add_argument(
+        "model_dir", type=types.existing_model_dir, help="path to a model directory"
+    )
+    export_parser.add_argument(
+        "--format",
+        dest="export_format",
+        choices=["torchscript", "onnx"],
+        default="torchscript",
+        help="format of the exported graph. Default is torchscript.",
+    )
+    export_parser.add_argument(
+        "--output_file",
+        type=Path,
+        help="path of the exported graph. Defaults to <model_dir>/exported_model.pt for "
+        "torchscript and <model_dir>/exported_model.onnx for onnx.",
+    )
+    return export_parser
+
+
+def get_parser():
+    """Return an ArgumentParser for the `litpose export` subcommand (for docs)."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="litpose")
+    subparsers = parser.add_subparsers(dest="command")
+    return register_parser(subparsers)
+
+
+def handle(args):
+    """Handle the export command."""
+    from lightning_pose.api.model import Model  # noqa: F811
+
+    model = Model.from_dir(args.model_dir)
+    output_file = model.export(output_file=args.output_file, export_format=args.export_format)
+    print(f"Exported model to {output_file}")
@@ -72,7 +72,87 @@ def register_parser(subparsers):
     predict_parser.add_argument(
         "--overwrite",
         action="store_true",
-        help="overwrite videos that already have prediction files",
+        help="predict again on videos that already have prediction files (or cached predictions)",
+    )
+
+    scheduling_args = predict_parser.add_argument_group("scheduling")
+    scheduling_args.add_argument(
+        "--num_workers",
+        type=int,
+        default=1,
+        help="number of worker processes that predict on videos in parallel; each worker loads "
+        "the model once. Progress is recorded in <model_dir>/video_preds/predict_manifest.json "
+        "so that interrupted runs resume where they stopped",
+    )
+    scheduling_args.add_argument(
+        "--devices",
+        nargs="+",
+        metavar="DEVICE",
+        help="devices assigned round-robin to the workers, e.g. cuda:0 cuda:1 or cpu. "
+        "Defaults to all visible gpus, or the cpu if there are none",
+    )
+    scheduling_args.add_argument(
+        "--num_shards",
+        type=int,
+        default=1,
+        help="split each video into this many frame ranges that are predicted in parallel "
+        "processes on --devices and then stitched; useful for single long videos. "
+        "Requires dali.predict_reader=opencv, and cannot be combined with --num_workers",
+    )
+    scheduling_args.add_argument(
+        "--cache_dir",
+        type=Path,
+        help="directory of the prediction cache, which can be shared between models. "
+        "Defaults to <model_dir>/prediction_cache",
+    )
+    scheduling_args.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="do not reuse or store cached predictions; skip videos based on existing "
+        "prediction files instead",
+    )
+
+    frame_args = predict_parser.add_argument_group("frame selection")
+    frame_args.add_argument(
+        "--start_frame",
+        type=int,
+        default=0,
+        help="first frame of each video to predict on",
+    )
+    frame_args.add_argument(
+        "--end_frame",
+        type=int,
+        help="predict on frames before this one. Defaults to the end of each video",
+    )
+    frame_args.add_argument(
+        "--stride",
+        type=int,
+        default=1,
+        help="predict on every Nth frame. Prediction files are indexed by frame number",
+    )
+
+    cropzoom_args = predict_parser.add_argument_group("cropzoom")
+    cropzoom_args.add_argument(
+        "--detector_model",
+        type=types.existing_model_dir,
+        help="predict with this detector model first, then crop each frame around the "
+        "detected animal and predict on the crop with the (pose) model in model_dir. "
+        "Videos are cropped on the fly and predictions are saved in the coordinates of the "
+        "original video; bboxes are saved to "
+        "<detector_model>/video_preds/<video_filename>_bbox.csv. Videos are predicted one at "
+        "a time, so frame selection and scheduling options cannot be used",
+    )
+    cropzoom_args.add_argument(
+        "--crop_ratio",
+        type=float,
+        default=2.0,
+        help="Crop a bounding box this much larger than the animal. Default is 2.",
+    )
+    cropzoom_args.add_argument(
+        "--anchor_keypoints",
+        type=str,
+        default="",
+        help="Comma-separated list of anchor keypoint names, defaults to all keypoints",
     )
 
     post_prediction_args = predict_parser.add_argument_group("post-prediction")
@@ -97,20 +177,108 @@ def handle(args):
     """Handle the predict command."""
     # Delay this import because it's slow.
     from lightning_pose.api.model import Model
+    from lightning_pose.api.predict_scheduler import PredictionScheduler
+
+    if args.detector_model is not None:
+        _check_cropzoom_args(args)
 
     model = Model.from_dir2(args.model_dir, hydra_overrides=args.overrides)
     input_paths = [Path(p) for p in args.input_path]
 
+    # label files are predicted right away; videos are collected into jobs for the scheduler
     if model.config.is_multi_view():
-        _predict_multi_type_multi_view(
-            model, input_paths, args.skip_viz, not args.overwrite
-        )
+        video_jobs = _predict_multi_type_multi_view(model, input_paths)
     else:
+        video_jobs = []
         for p in input_paths:
-            _predict_multi_type(model, p, args.skip_viz, not args.overwrite)
+            video_jobs += _predict_multi_type(model, p, not args.overwrite)
 
+    if len(video_jobs) > 0 and args.detector_model is not None:
+        _predict_cropzoom(model, video_jobs, args)
+    elif len(video_jobs) > 0:
+        scheduler = PredictionScheduler(
+            args.model_dir,
+            hydra_overrides=args.overrides,
+            num_workers=args.num_workers,
+            devices=args.devices,
+            generate_labeled_video=not args.skip_viz,
+            num_shards=args.num_shards,
+            start_frame=args.start_frame,
+            end_frame=args.end_frame,
+            stride=args.stride,
+            use_cache=not args.no_cache,
+            cache_dir=args.cache_dir,
+        )
+        scheduler.run(video_jobs, skip_existing=not args.overwrite)
 
-def _predict_multi_type(model: Model, path: Path, skip_viz: bool, skip_existing: bool):
+
+def _check_cropzoom_args(args) -> None:
+    """Reject options that have no effect with --detector_model."""
+    if args.start_frame != 0 or args.end_frame is not None or args.stride != 1:
+        raise NotImplementedError("--detector_model does not support frame selection")
+    # videos are predicted one at a time in this process, without the manifest or the cache
+    unsupported = [
+        flag for flag, is_set in [
+            ("--num_workers", args.num_workers != 1),
+            ("--num_shards", args.num_shards != 1),
+            ("--devices", args.devices is not None),
+            ("--cache_dir", args.cache_dir is not None),
+            ("--no_cache", args.no_cache),
+        ]
+        if is_set
+    ]
+    if unsupported:
+        raise NotImplementedError(f"--detector_model does not support {', '.join(unsupported)}")
+
+
+def _predict_cropzoom(pose_model: Model, video_jobs: list[list[Path]], args) -> None:
+    """Predict on videos with a detector model and the pose model, cropping frames on the fly."""
+    # delay these imports because they're slow
+    from omegaconf import OmegaConf
+
+    import lightning_pose.utils.cropzoom as cz
+    from lightning_pose.api.model import Model
+
+    if pose_model.config.is_multi_view():
+        raise NotImplementedError("--detector_model is not supported for multiview models")
+    detector_cfg = OmegaConf.create(
+        {
+            "crop_ratio": args.crop_ratio,
+            "anchor_keypoints": (
+                args.anchor_keypoints.split(",") if args.anchor_keypoints else []
+            ),
+        }
+    )
+    assert detector_cfg.crop_ratio > 1
+
+    detector_model = Model.from_dir(args.detector_model)
+    # load each model once for all videos
+    with detector_model.inference_session(), pose_model.inference_session():
+        for (video_file,) in video_jobs:
+            output_pred_file = pose_model.video_preds_dir() / (video_file.stem + ".csv")
+            if not args.overwrite and output_pred_file.exists():
+                print(f"Skipping {video_file} (prediction file already exists)")
+                continue
+            print(f"Predicting on {video_file} with {args.detector_model} and {args.model_dir}")
+            cz.predict_video_cropzoom(
+                input_video_file=video_file,
+                detector_model=detector_model,
+                pose_model=pose_model,
+                detector_cfg=detector_cfg,
+                output_bbox_file=(
+                    detector_model.video_preds_dir() / (video_file.stem + "_bbox.csv")
+                ),
+                output_pred_file=output_pred_file,
+                output_labeled_video_file=(
+                    None if args.skip_viz
+                    else pose_model.labeled_videos_dir() / (video_file.stem + "_labeled.mp4")
+                ),
+            )
+
+
+def _predict_multi_type(model: Model, path: Path, skip_existing: bool) -> list[list[Path]]:
+    """Predict on label csv files; return the video prediction jobs found in `path`."""
+    video_jobs = []
     if path.is_dir():
         image_files = [
             p for p in path.iterdir() if p.is_file() and p.suffix in [".png", ".jpg"]
@@ -122,24 +290,16 @@ def _predict_multi_type(model: Model, path: Path, skip_viz: bool, skip_existing:
 
         print(f"Processing directory {path}")
         for p in video_files:
-            _predict_multi_type(model, p, skip_viz, skip_existing)
+            video_jobs += _predict_multi_type(model, p, skip_existing)
 
     elif path.suffix == ".mp4":
-        # Check if prediction file already exists
-        prediction_csv_file = model.video_preds_dir() / f"{path.stem}.csv"
-        if skip_existing and prediction_csv_file.exists():
-            print(f"Skipping {path} (prediction file already exists)")
-            return
-
-        model.predict_on_video_file(
-            video_file=path, generate_labeled_video=(not skip_viz)
-        )
+        video_jobs.append([path])
     elif path.suffix == ".csv":
         # Check if prediction file already exists
         prediction_csv_file = model.image_preds_dir() / path.name / "predictions.csv"
         if skip_existing and prediction_csv_file.exists():
             print(f"Skipping {path} (prediction file already exists)")
-            return
+            return video_jobs
 
         model.predict_on_label_csv(
             csv_file=path,
@@ -148,11 +308,11 @@ def _predict_multi_type(model: Model, path: Path, skip_viz: bool, skip_existing:
         raise NotImplementedError("Not yet implemented: predicting on image files.")
     else:
         pass
+    return video_jobs
 
 
-def _predict_multi_type_multi_view(
-    model: Model, paths: list[Path], skip_viz: bool, skip_existing: bool
-):
+def _predict_multi_type_multi_view(model: Model, paths: list[Path]) -> list[list[Path]]:
+    """Return the video prediction jobs (one per session) for the videos in `paths`."""
     # delay this import because it's slow
     from lightning_pose.utils.io import (
         split_video_files_by_view,
@@ -173,22 +333,10 @@ def _predict_multi_type_multi_view(
                 for video_file_per_view in video_files_split
             ],
         )
-        for video_file_per_view in video_files_split:
-            if skip_existing and all(
-                (model.video_preds_dir() / f"{Path(video).stem}.csv").exists()
-                for video in video_file_per_view
-            ):
-                session_name = extract_session_name_from_video(
-                    Path(video_file_per_view[0]).name, model.config.cfg.data.view_names
-                )
-                print(f"Skipping {session_name} (prediction file already exists)")
-                continue
-
-            model.predict_on_video_file_multiview(
-                video_file_per_view, generate_labeled_video=not skip_viz
-            )
+        return video_files_split
     # if we have a list of directories, we process the videos in each separately
     elif all(path.is_dir() for path in paths):
+        video_jobs = []
         for path in paths:
             video_files = [
                 p for p in path.iterdir() if p.is_file() and p.suffix == ".mp4"
@@ -196,11 +344,10 @@ def _predict_multi_type_multi_view(
             if len(video_files) > 0:
                 print(f"Processing directory {path}")
 
-                _predict_multi_type_multi_view(
-                    model, video_files, skip_viz, skip_existing
-                )
+                video_jobs += _predict_multi_type_multi_view(model, video_files)
             else:
                 print(f"Skipping {path}: no videos found.")
+        return video_jobs
     else:
         raise NotImplementedError(
             "For multi view model predictions, either pass in multiple video views to be predicted, or a directory containing videos"
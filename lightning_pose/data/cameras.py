@@ -1,7 +1,6 @@
 import copy
 import itertools
 
-import cv2
 import numpy as np
 import torch
 from aniposelib.cameras import CameraGroup as CameraGroupAnipose
@@ -17,13 +16,30 @@ __all__ = [
 ]
 
 
+def _camera_pair_indices(
+    num_views: int,
+    device: torch.device | str,
+) -> tuple[TensorType["cam_pair"], TensorType["cam_pair"]]:
+    """Indices of the first and second camera of each pair, in itertools.combinations order."""
+    pairs = list(itertools.combinations(range(num_views), 2))
+    idxs1 = torch.tensor([j1 for j1, _ in pairs], dtype=torch.long, device=device)
+    idxs2 = torch.tensor([j2 for _, j2 in pairs], dtype=torch.long, device=device)
+    return idxs1, idxs2
+
+
 def project_camera_pairs_to_3d(
     points: TensorType["batch", "num_views", "num_keypoints", 2],
     intrinsics: TensorType["batch", "num_views", 3, 3],
     extrinsics: TensorType["batch", "num_views", 3, 4],
     dist: TensorType["batch", "num_views", "num_params"],
 ) -> TensorType["batch", "cam_pair", "num_keypoints", 3]:
-    """Project 2D keypoints from each pair of cameras into 3D world space."""
+    """Project 2D keypoints from each pair of cameras into 3D world space.
+
+    All batch elements, camera pairs and keypoints are triangulated with a single batched DLT
+    solve. Keypoints that are NaN in either view of a pair are triangulated from placeholder
+    coordinates and then set to NaN in the output, so they do not contribute gradients.
+
+    """
 
     num_batch, num_views, num_keypoints, _ = points.shape
 
@@ -34,73 +50,98 @@ def project_camera_pairs_to_3d(
         new_K=torch.eye(3, device=points.device).expand(num_batch, num_views, 3, 3),
     )
 
-    p3d = []
-    for j1, j2 in itertools.combinations(range(num_views), 2):
-
-        points1 = points[:, j1, ...]
-        points2 = points[:, j2, ...]
-
-        # create a mask for valid keypoints
-        # a keypoint is valid if it's not NaN in BOTH views
-        valid_mask = ~(
-                torch.isnan(points1).any(dim=-1) |
-                torch.isnan(points2).any(dim=-1)
-        )
-
-        # prepare points for triangulation
-        tri = torch.full(
-            (num_batch, num_keypoints, 3),
-            float('nan'),
-            device=points.device,
-            dtype=points.dtype,
-        )
-
-        # triangulate only valid points
-        for batch_idx in range(num_batch):
-            # get valid keypoint indices for this batch
-            batch_valid_indices = torch.where(valid_mask[batch_idx])[0]
-
-            if len(batch_valid_indices) > 0:
-                # extract valid points for this batch
-                batch_points1 = points1[batch_idx][valid_mask[batch_idx]]
-                batch_points2 = points2[batch_idx][valid_mask[batch_idx]]
-
-                # triangulate valid points
-                batch_tri = triangulate_points(
-                    P1=extrinsics[batch_idx, j1],
-                    P2=extrinsics[batch_idx, j2],
-                    points1=batch_points1,
-                    points2=batch_points2,
-                )
-
-                # place triangulated points back in the full tensor
-                tri[batch_idx, valid_mask[batch_idx]] = batch_tri
-
-        p3d.append(tri)
+    idxs1, idxs2 = _camera_pair_indices(num_views, device=points.device)
+    points1 = points[:, idxs1]  # shape (batch, cam_pair, num_keypoints, 2)
+    points2 = points[:, idxs2]
+
+    # a keypoint is valid if it's not NaN in BOTH views
+    valid_mask = ~(torch.isnan(points1).any(dim=-1) | torch.isnan(points2).any(dim=-1))
+    valid_mask = valid_mask.unsqueeze(-1)
+    points1 = torch.where(valid_mask, points1, torch.zeros_like(points1))
+    points2 = torch.where(valid_mask, points2, torch.zeros_like(points2))
+
+    # shape (batch, cam_pair, num_keypoints, 3)
+    tri = triangulate_points(
+        P1=extrinsics[:, idxs1],
+        P2=extrinsics[:, idxs2],
+        points1=points1,
+        points2=points2,
+    )
 
-    return torch.stack(p3d, dim=1)
+    return torch.where(valid_mask, tri, torch.full_like(tri, float("nan")))
 
 
 def get_valid_projection_masks(
     points: TensorType["batch", "num_views", "num_keypoints", 2]
 ) -> TensorType["batch", "cam_pair", "num_keypoints"]:
 
-    num_batch, num_views, num_keypoints, _ = points.shape
-
-    m3d = []
-    for j1, j2 in itertools.combinations(range(num_views), 2):
-        points1 = points[:, j1, :, 0]
-        points2 = points[:, j2, :, 0]
-        m3d.append(~torch.isnan(points1 + points2))
-    return torch.stack(m3d, dim=1)
+    idxs1, idxs2 = _camera_pair_indices(points.shape[1], device=points.device)
+    return ~torch.isnan(points[:, idxs1, :, 0] + points[:, idxs2, :, 0])
 
 
 class CameraGroup(CameraGroupAnipose):
     """Inherit Anipose camera group and add new non-jitted triangulation method for dataloaders."""
 
+    def get_camera_arrays(self) -> dict[str, np.ndarray]:
+        """Return stacked camera parameters, computed once and then cached.
+
+        The cache assumes the cameras are not modified in place after the first call; use
+        `copy_with_new_cameras` to change cameras.
+
+        Returns:
+            dict with keys
+                - intrinsics: shape (num_cameras, 3, 3)
+                - extrinsics: shape (num_cameras, 3, 4)
+                - distortions: shape (num_cameras, num_params)
+
+        """
+        for key in ("intrinsics", "extrinsics", "distortions"):
+            self._get_camera_array(key)
+        return self._camera_arrays
+
+    def _get_camera_array(self, key: str) -> np.ndarray:
+        """Stack a single camera parameter and cache it, see `get_camera_arrays`.
+
+        Each array is cached separately, so that triangulation only needs the extrinsics and
+        works for rigs whose cameras have different numbers of distortion parameters (e.g.
+        fisheye and pinhole cameras).
+
+        """
+        camera_arrays = getattr(self, "_camera_arrays", None)
+        if camera_arrays is None:
+            camera_arrays = self._camera_arrays = {}
+        if key not in camera_arrays:
+            if key == "intrinsics":
+                array = np.stack([
+                    np.asarray(cam.get_camera_matrix(), dtype=np.float64) for cam in self.cameras
+                ])
+            elif key == "extrinsics":
+                array = np.stack([cam.get_extrinsics_mat()[:3] for cam in self.cameras])
+            elif key == "distortions":
+                distortions = [
+                    np.asarray(cam.get_distortions(), dtype=np.float64).ravel()
+                    for cam in self.cameras
+                ]
+                if len({d.shape for d in distortions}) > 1:
+                    raise ValueError(
+                        "cannot stack the distortions of cameras with different numbers of "
+                        f"distortion parameters: {[d.size for d in distortions]}"
+                    )
+                array = np.stack(distortions)
+            else:
+                raise KeyError(key)
+            camera_arrays[key] = array
+        return camera_arrays[key]
+
     def triangulate_fast(self, points, undistort=True):
         """Given an CxNx2 array, this returns an Nx3 array of points,
-        where N is the number of points and C is the number of cameras"""
+        where N is the number of points and C is the number of cameras.
+
+        Every camera pair is triangulated with a single batched DLT solve (the same linear system
+        solved by `cv2.triangulatePoints`) and the median is taken across pairs, ignoring points
+        that are NaN in either camera of a pair.
+
+        """
 
         assert points.shape[0] == len(self.cameras), \
             f"Invalid points shape, first dim should be equal to" \
@@ -112,25 +153,43 @@ class CameraGroup(CameraGroupAnipose):
             one_point = True
 
         if undistort:
+            # each camera undistorts its own points, with the fisheye model for fisheye cameras
             new_points = np.empty(points.shape)
             for cnum, cam in enumerate(self.cameras):
                 # must copy in order to satisfy opencv underneath
-                sub = np.copy(points[cnum])
+                sub = np.array(points[cnum], dtype=np.float64)
                 new_points[cnum] = cam.undistort_points(sub)
             points = new_points
 
         n_cams, n_points, _ = points.shape
 
-        cam_Rt_mats = np.array([cam.get_extrinsics_mat()[:3] for cam in self.cameras])
-
-        p3d_allview_withnan = []
-        for j1, j2 in itertools.combinations(range(n_cams), 2):
-            pts1, pts2 = points[j1], points[j2]
-            Rt1, Rt2 = cam_Rt_mats[j1], cam_Rt_mats[j2]
-            tri = cv2.triangulatePoints(Rt1, Rt2, pts1.T, pts2.T)
-            tri = tri[:3] / tri[3]
-            p3d_allview_withnan.append(tri.T)
-        p3d_allview_withnan = np.array(p3d_allview_withnan)
+        pairs = list(itertools.combinations(range(n_cams), 2))
+        idxs1 = [j1 for j1, _ in pairs]
+        idxs2 = [j2 for _, j2 in pairs]
+        # shapes (n_pairs, 1, 3, 4) and (n_pairs, n_points, 2)
+        extrinsics = self._get_camera_array("extrinsics")
+        Rt1 = extrinsics[idxs1][:, None]
+        Rt2 = extrinsics[idxs2][:, None]
+        pts1 = points[idxs1]
+        pts2 = points[idxs2]
+
+        # DLT constraint matrices, shape (n_pairs, n_points, 4, 4)
+        A = np.stack([
+            pts1[..., 0:1] * Rt1[..., 2, :] - Rt1[..., 0, :],
+            pts1[..., 1:2] * Rt1[..., 2, :] - Rt1[..., 1, :],
+            pts2[..., 0:1] * Rt2[..., 2, :] - Rt2[..., 0, :],
+            pts2[..., 1:2] * Rt2[..., 2, :] - Rt2[..., 1, :],
+        ], axis=-2)
+        # a point is valid if it's not NaN in both cameras of the pair
+        valid = ~np.isnan(A).any(axis=(-2, -1))
+        A[~valid] = 0.0
+
+        # homogeneous solution is the right singular vector of the smallest singular value
+        _, _, vh = np.linalg.svd(A)
+        tri = vh[..., -1, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p3d_allview_withnan = tri[..., :3] / tri[..., 3:]
+        p3d_allview_withnan[~valid] = np.nan
         out = np.nanmedian(p3d_allview_withnan, axis=0)
 
         if one_point:
@@ -147,6 +206,7 @@ class CameraGroup(CameraGroupAnipose):
         """Create a new CameraGroup with the same properties but different cameras."""
         new_group = copy.deepcopy(self)
         new_group.cameras = cameras
+        new_group._camera_arrays = None
         return new_group
 
     @classmethod
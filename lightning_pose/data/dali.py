@@ -16,7 +16,7 @@ from lightning_pose.data.datatypes import (
     MultiviewUnlabeledBatchDict,
     UnlabeledBatchDict,
 )
-from lightning_pose.data.utils import count_frames
+from lightning_pose.data.utils import get_videos_metadata
 
 # to ignore imports for sphix-autoapidoc
 __all__ = [
@@ -276,7 +276,7 @@ class PrepareDALI(object):
         self.resize_dims = resize_dims
         self.dali_config = dali_config
         self.num_threads = num_threads
-        self.frame_count = sum(map(count_frames, filenames[0]))
+        self.frame_count = sum(m.frame_count for m in get_videos_metadata(filenames[0]))
         self._pipe_dict: dict = self._setup_pipe_dict(self.filenames, imgaug)
 
     @property
@@ -192,6 +192,25 @@ class BaseDataModule(pl.LightningDataModule):
             num_workers=self.num_workers,
         )
 
+    def on_after_batch_transfer(self, batch: dict, dataloader_idx: int) -> dict:
+        """Generate target heatmaps on the training device for datasets that skip them.
+
+        Datasets constructed with `heatmaps_on_device=True` only return (augmented) keypoints,
+        with out-of-frame keypoints already set to nan; the heatmaps for the whole batch are built
+        here with a single call to `generate_heatmaps`.
+
+        """
+        if not getattr(self.dataset, "heatmaps_on_device", False):
+            return batch
+        # semi-supervised training batches also contain unlabeled frames
+        labeled = batch["labeled"] if "labeled" in batch else batch
+        if "keypoints" in labeled and "heatmaps" not in labeled:
+            keypoints = labeled["keypoints"]
+            labeled["heatmaps"] = self.dataset.compute_batch_heatmaps(
+                keypoints.reshape(keypoints.shape[0], -1, 2)
+            )
+        return batch
+
 
 class UnlabeledDataModule(BaseDataModule):
     """Data module that contains labeled and unlabled data loaders."""
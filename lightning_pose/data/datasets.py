@@ -1,6 +1,9 @@
 """Dataset objects store images, labels, and functions for manipulation."""
 
 import os
+import zipfile
+from collections import OrderedDict
+from io import BytesIO
 from pathlib import Path
 from typing import Callable, Literal, Tuple, Union
 
@@ -26,12 +29,102 @@ from lightning_pose.utils import io as io_utils
 
 # to ignore imports for sphix-autoapidoc
 __all__ = [
+    "PACKED_IMAGES_FILENAME",
+    "PackedImageStore",
+    "DecodedImageCache",
     "BaseTrackingDataset",
     "HeatmapDataset",
     "MultiviewHeatmapDataset",
 ]
 
 
+# labeled frames of a data directory can be packed into this archive, see `PackedImageStore`
+PACKED_IMAGES_FILENAME = "packed_images.zip"
+
+
+class PackedImageStore(object):
+    """Read-only store of encoded images packed into a single uncompressed zip archive.
+
+    Members are the (png/jpg) image files, named by their path relative to the data directory.
+    Reading from one large file avoids the per-file overhead of thousands of small images, e.g.
+    on network filesystems. The archive is opened lazily so that every data loader worker holds
+    its own file handle.
+
+    """
+
+    def __init__(self, archive_file: str | Path) -> None:
+        self.archive_file = Path(archive_file)
+        with zipfile.ZipFile(self.archive_file) as archive:
+            self.names = frozenset(archive.namelist())
+        self._archive = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getstate__(self) -> dict:
+        # file handles cannot be shared between processes
+        return {**self.__dict__, "_archive": None}
+
+    def open(self, name: str) -> Image.Image:
+        """Open the image stored under `name`; PIL only parses the header until it is loaded."""
+        if self._archive is None:
+            self._archive = zipfile.ZipFile(self.archive_file)
+        return Image.open(BytesIO(self._archive.read(name)))
+
+
+class DecodedImageCache(object):
+    """In-memory LRU cache of decoded RGB uint8 frames with a byte budget.
+
+    Labeled frames are read from disk and decoded every epoch; for small label sets that fit in
+    memory the decoded frames can instead be kept around and augmented directly. Cached frames
+    are read-only so that augmentation pipelines cannot modify them in place.
+
+    Data loader workers each hold their own copy of the cache, so the memory used is up to
+    `max_bytes` per worker. Deep copies of a dataset (e.g. the train/val/test splits of a data
+    module) share the same cache.
+
+    """
+
+    def __init__(
+        self, max_bytes: int, read_fn: Callable[[Path], np.ndarray] | None = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self._frames = OrderedDict()
+        self._read_fn = read_fn or _read_image_file
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __deepcopy__(self, memo: dict) -> "DecodedImageCache":
+        return self
+
+    def __call__(self, path: str | Path) -> np.ndarray:
+        """Return the frame at `path` as an array of shape (height, width, 3)."""
+        key = str(path)
+        frame = self._frames.get(key)
+        if frame is not None:
+            self._frames.move_to_end(key)
+            return frame
+        frame = self._read_fn(path)
+        if frame.nbytes <= self.max_bytes:
+            frame.setflags(write=False)
+            self._frames[key] = frame
+            self.num_bytes += frame.nbytes
+            while self.num_bytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.num_bytes -= evicted.nbytes
+        return frame
+
+
+def _read_image_file(path: str | Path) -> np.ndarray:
+    # if 1 color channel, change to 3.
+    return np.asarray(Image.open(path).convert("RGB"))
+
+
 class BaseTrackingDataset(torch.utils.data.Dataset):
     """Base dataset that contains images and keypoints as (x, y) pairs."""
 
@@ -46,6 +139,7 @@ class BaseTrackingDataset(torch.utils.data.Dataset):
         do_context: bool = False,
         resize: bool = True,
         bbox_path: str | None = None,
+        image_cache_mb: float = 0.0,
     ) -> None:
         """Initialize a dataset for regression (rather than heatmap) models.
 
@@ -75,6 +169,8 @@ class BaseTrackingDataset(torch.utils.data.Dataset):
                 and keypoints before returning a batch of data.
             bbox_path: path to csv file that contains bounding box information; rows must be in
                 same order as csv file
+            image_cache_mb: memory budget (in MB) for caching decoded frames across epochs; 0
+                disables the cache and frames are decoded from disk every time
 
         """
         self.root_directory = Path(root_directory)
@@ -137,6 +233,48 @@ class BaseTrackingDataset(torch.utils.data.Dataset):
             bboxes = [None] * len(csv_data)
         self.bboxes = bboxes
 
+        # frames packed into a single archive are read from it rather than from image files
+        packed_file = self.root_directory / PACKED_IMAGES_FILENAME
+        self.image_store = PackedImageStore(packed_file) if packed_file.is_file() else None
+
+        self.image_cache_mb = image_cache_mb
+        if image_cache_mb > 0:
+            self.image_cache = DecodedImageCache(
+                max_bytes=int(image_cache_mb * 1024 ** 2), read_fn=self._decode_image,
+            )
+        else:
+            self.image_cache = None
+
+    def _store_name(self, path: Path) -> str | None:
+        """Name of the frame at `path` in the packed image store, if it is stored there."""
+        if self.image_store is None:
+            return None
+        try:
+            name = Path(path).relative_to(self.root_directory).as_posix()
+        except ValueError:
+            return None
+        return name if name in self.image_store else None
+
+    def open_image(self, path: Path) -> Image.Image:
+        """Open a frame from the packed image store, or from its file."""
+        name = self._store_name(path)
+        if name is not None:
+            return self.image_store.open(name)
+        return Image.open(path)
+
+    def image_exists(self, path: Path) -> bool:
+        return self._store_name(path) is not None or Path(path).exists()
+
+    def _decode_image(self, path: Path) -> np.ndarray:
+        # if 1 color channel, change to 3.
+        return np.asarray(self.open_image(path).convert("RGB"))
+
+    def read_image(self, path: Path) -> np.ndarray:
+        """Read an RGB frame as a uint8 array of shape (height, width, 3)."""
+        if self.image_cache is not None:
+            return self.image_cache(path)
+        return self._decode_image(path)
+
     @property
     def height(self) -> int:
         return self.image_resize_height
@@ -153,9 +291,8 @@ class BaseTrackingDataset(torch.utils.data.Dataset):
         keypoints_on_image = self.keypoints[idx]
         img_path = self.root_directory / img_name
         if not self.do_context:
-            # read image from file and apply transformations (if any)
-            # if 1 color channel, change to 3.
-            image = Image.open(img_path).convert("RGB")
+            # read image from file (or cache) and apply transformations (if any)
+            image = self.read_image(img_path)
             if self.imgaug_transform is not None:
                 transformed_images, transformed_keypoints = self.imgaug_transform(
                     images=np.expand_dims(image, axis=0),
@@ -175,13 +312,12 @@ class BaseTrackingDataset(torch.utils.data.Dataset):
             # read the images from image list to create dataset
             images = []
             for path in context_img_paths:
-                # read image from file and apply transformations (if any)
-                if not path.exists():
+                # read image from file (or cache) and apply transformations (if any)
+                if not self.image_exists(path):
                     # revert to center frame
                     path = context_img_paths[2]
-                # if 1 color channel, change to 3.
-                image = Image.open(path).convert("RGB")
-                images.append(np.asarray(image))
+                image = self.read_image(path)
+                images.append(image)
 
             # apply data aug pipeline
             if self.imgaug_transform is not None:
@@ -220,7 +356,7 @@ class BaseTrackingDataset(torch.utils.data.Dataset):
         if self.bboxes[idx] is not None:
             bbox = torch.tensor(self.bboxes[idx])
         else:
-            bbox = torch.tensor([0, 0, image.height, image.width])
+            bbox = torch.tensor([0, 0, image.shape[0], image.shape[1]])
 
         return BaseLabeledExampleDict(
             images=transformed_images,  # shape (3, img_height, img_width) or (5, 3, H, W)
@@ -247,6 +383,8 @@ class HeatmapDataset(BaseTrackingDataset):
         resize: bool = True,
         uniform_heatmaps: bool = False,
         bbox_path: str | None = None,
+        image_cache_mb: float = 0.0,
+        heatmaps_on_device: bool = False,
     ) -> None:
         """Initialize the Heatmap Dataset.
 
@@ -272,6 +410,11 @@ class HeatmapDataset(BaseTrackingDataset):
                 False will output all-zero heatmaps
             bbox_path: path to csv file that contains bounding box information; rows must be in
                 same order as csv file
+            image_cache_mb: memory budget (in MB) for caching decoded frames across epochs; 0
+                disables the cache
+            heatmaps_on_device: True to return only keypoints and leave the generation of target
+                heatmaps to the data module, which builds them for the whole batch on the training
+                device (see `BaseDataModule.on_after_batch_transfer`)
 
         """
         super().__init__(
@@ -284,6 +427,7 @@ class HeatmapDataset(BaseTrackingDataset):
             do_context=do_context,
             resize=resize,
             bbox_path=bbox_path,
+            image_cache_mb=image_cache_mb,
         )
 
         if self.height % 128 != 0 or self.height % 128 != 0:
@@ -294,6 +438,7 @@ class HeatmapDataset(BaseTrackingDataset):
         self.downsample_factor = downsample_factor
         self.output_sigma = 1.25  # should be sigma/2 ^downsample factor
         self.uniform_heatmaps = uniform_heatmaps
+        self.heatmaps_on_device = heatmaps_on_device
         self.num_targets = torch.numel(self.keypoints[0])
         self.num_keypoints = self.num_targets // 2
 
@@ -316,20 +461,35 @@ class HeatmapDataset(BaseTrackingDataset):
 
         # introduce nans where data augmentation has moved the keypoint out of the original frame
         if not ignore_nans:
-            new_nans = torch.logical_or(
-                torch.lt(keypoints[:, 0], torch.tensor(0)),
-                torch.lt(keypoints[:, 1], torch.tensor(0)),
-            )
-            new_nans = torch.logical_or(
-                new_nans, torch.ge(keypoints[:, 0], torch.tensor(self.width))
-            )
-            new_nans = torch.logical_or(
-                new_nans, torch.ge(keypoints[:, 1], torch.tensor(self.height))
-            )
-            keypoints[new_nans, :] = torch.nan
+            self.mask_out_of_frame_keypoints(keypoints)
+
+        return self.compute_batch_heatmaps(keypoints.unsqueeze(0))[0]  # add batch dim
+
+    def mask_out_of_frame_keypoints(
+        self,
+        keypoints: TensorType["num_keypoints", 2],
+    ) -> TensorType["num_keypoints", 2]:
+        """Set keypoints outside of the (resized) frame to nan, in place."""
+        new_nans = torch.logical_or(
+            torch.lt(keypoints[:, 0], torch.tensor(0)),
+            torch.lt(keypoints[:, 1], torch.tensor(0)),
+        )
+        new_nans = torch.logical_or(
+            new_nans, torch.ge(keypoints[:, 0], torch.tensor(self.width))
+        )
+        new_nans = torch.logical_or(
+            new_nans, torch.ge(keypoints[:, 1], torch.tensor(self.height))
+        )
+        keypoints[new_nans, :] = torch.nan
+        return keypoints
 
-        y_heatmap = generate_heatmaps(
-            keypoints=keypoints.unsqueeze(0),  # add batch dim
+    def compute_batch_heatmaps(
+        self,
+        keypoints: TensorType["batch", "num_keypoints", 2],
+    ) -> TensorType["batch", "num_keypoints", "heatmap_height", "heatmap_width"]:
+        """Compute 2D heatmaps for a batch of keypoints, on the device of the keypoints."""
+        return generate_heatmaps(
+            keypoints=keypoints,
             height=self.height,
             width=self.width,
             output_shape=self.output_shape,
@@ -337,8 +497,6 @@ class HeatmapDataset(BaseTrackingDataset):
             uniform_heatmaps=self.uniform_heatmaps,
         )
 
-        return y_heatmap[0]
-
     def compute_heatmaps(self):
         """Compute initial 2D heatmaps for all labeled data. Note this will apply augmentations.
 
@@ -360,8 +518,15 @@ class HeatmapDataset(BaseTrackingDataset):
         """Get an example from the dataset."""
         # call base dataset to get an image and labels
         example_dict: BaseLabeledExampleDict = super().__getitem__(idx)
-        # compute the corresponding heatmaps
-        example_dict["heatmaps"] = self.compute_heatmap(example_dict, ignore_nans)
+        if self.heatmaps_on_device:
+            # heatmaps are computed per batch by the data module; only mark out-of-frame keypoints
+            if not ignore_nans:
+                self.mask_out_of_frame_keypoints(
+                    example_dict["keypoints"].reshape(self.num_keypoints, 2)
+                )
+        else:
+            # compute the corresponding heatmaps
+            example_dict["heatmaps"] = self.compute_heatmap(example_dict, ignore_nans)
         return example_dict
 
 
@@ -383,6 +548,8 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
         uniform_heatmaps: bool = False,
         camera_params_path: str | None = None,
         bbox_paths: list[str] | None = None,
+        image_cache_mb: float = 0.0,
+        heatmaps_on_device: bool = False,
     ) -> None:
         """Initialize the MultiViewHeatmap Dataset.
 
@@ -413,6 +580,11 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
                 (image_path, x, h, height, width)
                 where (x, y) correspond to upper left corner of bbox.
                 These files should be in the same view order as the csv paths
+            image_cache_mb: memory budget (in MB) for caching decoded frames across epochs, split
+                evenly across views; 0 disables the cache
+            heatmaps_on_device: True to return only keypoints and leave the generation of target
+                heatmaps to the data module, which builds them for the whole batch on the training
+                device (see `BaseDataModule.on_after_batch_transfer`)
 
         """
 
@@ -436,6 +608,7 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
         self.imgaug_transform = imgaug_transform
 
         self.downsample_factor = downsample_factor
+        self.heatmaps_on_device = heatmaps_on_device
         self.dataset = {}
         self.keypoint_names = {}
         self.data_length = {}
@@ -453,6 +626,8 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
                 resize=False,  # handled above in L396
                 uniform_heatmaps=uniform_heatmaps,
                 bbox_path=bbox_path,
+                image_cache_mb=image_cache_mb / len(view_names),
+                heatmaps_on_device=heatmaps_on_device,
             )
             self.keypoint_names[view] = self.dataset[view].keypoint_names
             self.data_length[view] = len(self.dataset[view])
@@ -548,6 +723,14 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
     def num_views(self) -> int:
         return len(self.view_names)
 
+    def compute_batch_heatmaps(
+        self,
+        keypoints: TensorType["batch", "num_keypoints", 2],
+    ) -> TensorType["batch", "num_keypoints", "heatmap_height", "heatmap_width"]:
+        """Compute 2D heatmaps for a batch of keypoints concatenated across views."""
+        # all views share the same resized image and heatmap dimensions
+        return self.dataset[self.view_names[0]].compute_batch_heatmaps(keypoints)
+
     @staticmethod
     def _scale_translate_keypoints(
         keypoints_3d: np.ndarray,
@@ -761,7 +944,12 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
                 bbox=data_dict[view]["bbox"],
                 idxs=data_dict[view]["idxs"],
             )
-            example_dict["heatmaps"] = self.dataset[view].compute_heatmap(example_dict)
+            if self.heatmaps_on_device:
+                self.dataset[view].mask_out_of_frame_keypoints(
+                    example_dict["keypoints"].reshape(-1, 2)
+                )
+            else:
+                example_dict["heatmaps"] = self.dataset[view].compute_heatmap(example_dict)
             data_dict_aug[view] = example_dict
 
         return data_dict_aug, torch.tensor(keypoints_3d_aug)
@@ -785,7 +973,7 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
             tuple
                 - images
                 - keypoints
-                - heatmaps
+                - heatmaps (None if heatmaps are generated on device)
                 - bboxes
                 - concat order
 
@@ -799,13 +987,14 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
             images.append(data["images"].unsqueeze(0))
             data["keypoints"] = data["keypoints"].reshape(int(data["keypoints"].shape[0] / 2), 2)
             keypoints.append(data["keypoints"])
-            heatmaps.append(data["heatmaps"])
+            if not self.heatmaps_on_device:
+                heatmaps.append(data["heatmaps"])
             bboxes.append(data["bbox"])
             concat_order.append(view)
 
         images = torch.cat(images, dim=0)
         keypoints = torch.cat(keypoints, dim=0).reshape(-1)
-        heatmaps = torch.cat(heatmaps, dim=0)
+        heatmaps = None if self.heatmaps_on_device else torch.cat(heatmaps, dim=0)
         bboxes = torch.cat(bboxes, dim=0)
 
         assert keypoints.shape == (self.num_targets,)
@@ -831,16 +1020,11 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
             # select proper camera calibration parameters for this data point
             camgroup = self.cam_params_file_to_camgroup[self.cam_params_df.iloc[idx].file]
 
-            # load camera parameters
-            intrinsic_matrix = torch.stack([
-                torch.tensor(cam.get_camera_matrix()) for cam in camgroup.cameras
-            ], dim=0)
-            extrinsic_matrix = torch.stack([
-                torch.tensor(cam.get_extrinsics_mat()[:3]) for cam in camgroup.cameras
-            ], dim=0)
-            distortions = torch.stack([
-                torch.tensor(cam.get_distortions()) for cam in camgroup.cameras
-            ], dim=0)
+            # load camera parameters (stacked once per camera group and cached)
+            camera_arrays = camgroup.get_camera_arrays()
+            intrinsic_matrix = torch.tensor(camera_arrays["intrinsics"])
+            extrinsic_matrix = torch.tensor(camera_arrays["extrinsics"])
+            distortions = torch.tensor(camera_arrays["distortions"])
 
             # check if we should apply 3D augmentations (training) or just triangulate (validation)
             if self.imgaug_transform.__str__().find("Resize") == -1:
@@ -874,10 +1058,9 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
         assert np.all(concat_order == self.view_names)
         # images normal:[view, RGB, H, W] context:[view, context, RGB, H, W]
 
-        return MultiviewHeatmapLabeledExampleDict(
+        example_dict = MultiviewHeatmapLabeledExampleDict(
             images=images.clone(),  # shape (3, H, W) or (5, 3, H, W)
             keypoints=keypoints.clone(),  # shape (n_targets,)
-            heatmaps=heatmaps.clone(),
             bbox=bboxes.clone(),
             idxs=idx,
             num_views=self.num_views,  # int
@@ -888,3 +1071,6 @@ class MultiviewHeatmapDataset(torch.utils.data.Dataset):
             extrinsic_matrix=extrinsic_matrix.clone(),
             distortions=distortions.clone(),
         )
+        if heatmaps is not None:
+            example_dict["heatmaps"] = heatmaps.clone()
+        return example_dict
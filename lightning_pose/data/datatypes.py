@@ -43,6 +43,19 @@ class MultiviewPredictionResult:
     metrics: dict[str, ComputeMetricsSingleResult] | None = None
 
 
+@dataclass(frozen=True)
+class VideoMetadata:
+    """ """  # suppresses sphinx class doc from getting autogenerated from __init__.
+
+    frame_count: int
+    fps: float
+    width: int
+    height: int
+    codec: str
+    file_size: int
+    mtime_ns: int
+
+
 @dataclass
 class ComputeMetricsSingleResult:
     """ """  # suppresses sphinx class doc from getting autogenerated from __init__.
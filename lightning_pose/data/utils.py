@@ -1,5 +1,10 @@
 """Dataset/data module utilities."""
+import dataclasses
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Any, Literal, Tuple, Union
 
 import imgaug.augmenters as iaa
@@ -15,6 +20,7 @@ from lightning_pose.data.datatypes import (
     MultiviewUnlabeledBatchDict,
     SemiSupervisedDataLoaderDict,
     UnlabeledBatchDict,
+    VideoMetadata,
 )
 
 # to ignore imports for sphix-autoapidoc
@@ -23,6 +29,8 @@ __all__ = [
     "split_sizes_from_probabilities",
     "clean_any_nans",
     "count_frames",
+    "get_video_metadata",
+    "get_videos_metadata",
     "compute_num_train_frames",
     "generate_heatmaps",
     "evaluate_heatmaps_at_location",
@@ -47,7 +55,9 @@ class DataExtractor(object):
         self.extract_images = extract_images
         self.remove_augmentations = remove_augmentations
 
-        if self.remove_augmentations:
+        # augmentation-free keypoints can be computed directly from the labels without loading
+        # any images; in that case there is no need to rebuild the data module
+        if self.remove_augmentations and not self.use_keypoint_fast_path(data_module):
             imgaug_curr = data_module.dataset.imgaug_transform
             if len(imgaug_curr) == 1 and isinstance(imgaug_curr[0], iaa.Resize):
                 # current augmentation just resizes; keep this
@@ -139,6 +149,15 @@ class DataExtractor(object):
         else:
             self.data_module = data_module
 
+    def use_keypoint_fast_path(self, data_module: pl.LightningDataModule) -> bool:
+        """Return True if keypoints can be read from the dataset without iterating a loader."""
+        from lightning_pose.data.datasets import BaseTrackingDataset, MultiviewHeatmapDataset
+        return (
+            not self.extract_images
+            and self.remove_augmentations
+            and isinstance(data_module.dataset, (BaseTrackingDataset, MultiviewHeatmapDataset))
+        )
+
     @property
     def dataset_length(self) -> int:
         name = "%s_dataset" % self.cond
@@ -195,6 +214,65 @@ class DataExtractor(object):
         )
         return concat_keypoints, concat_images
 
+    def extract_keypoints(self) -> TensorType["num_examples", Any]:
+        """Compute resized, augmentation-free keypoints directly from the dataset labels.
+
+        Matches the keypoints returned by the data loader when the imgaug pipeline only resizes
+        frames, but only reads image headers (for the original frame size) rather than decoding
+        every image, applying augmentations and computing heatmaps.
+
+        """
+        from lightning_pose.data.datasets import HeatmapDataset, MultiviewHeatmapDataset
+
+        subset = getattr(self.data_module, "%s_dataset" % self.cond)
+        if isinstance(subset, torch.utils.data.Subset):
+            idxs = list(subset.indices)
+        else:
+            idxs = list(range(len(subset)))
+
+        dataset = self.data_module.dataset
+        if isinstance(dataset, MultiviewHeatmapDataset):
+            # 3D keypoints are triangulated without changing the 2D keypoints, so those heatmap
+            # datasets do not introduce nans
+            ignore_nans = True if dataset.cam_params_file_to_camgroup else False
+            keypoints = torch.cat([
+                self._resize_dataset_keypoints(
+                    dataset.dataset[view], idxs, ignore_nans=ignore_nans,
+                )
+                for view in dataset.view_names
+            ], dim=1)
+        else:
+            keypoints = self._resize_dataset_keypoints(
+                dataset, idxs, ignore_nans=not isinstance(dataset, HeatmapDataset),
+            )
+        return keypoints
+
+    @staticmethod
+    def _resize_dataset_keypoints(
+        dataset: torch.utils.data.Dataset,
+        idxs: list[int],
+        ignore_nans: bool = False,
+    ) -> TensorType["num_examples", Any]:
+        """Scale keypoints of a single view dataset from frame to resized coordinates."""
+        # (width, height) of the original frames; PIL only parses the image header here
+        frame_sizes = []
+        for idx in idxs:
+            with dataset.open_image(dataset.root_directory / dataset.image_names[idx]) as img:
+                frame_sizes.append(img.size)
+        frame_sizes = torch.tensor(frame_sizes, dtype=torch.float32)
+        resize_dims = torch.tensor([dataset.width, dataset.height], dtype=torch.float32)
+
+        # shape (num_examples, num_keypoints, 2)
+        keypoints = dataset.keypoints[idxs] / frame_sizes.unsqueeze(1) * resize_dims
+        if not ignore_nans:
+            # match HeatmapDataset.compute_heatmap: keypoints outside the frame become nans
+            out_of_frame = torch.logical_or(
+                torch.any(keypoints < 0, dim=-1),
+                torch.any(keypoints >= resize_dims, dim=-1),
+            )
+            keypoints[out_of_frame] = torch.nan
+        return keypoints.reshape(keypoints.shape[0], -1)
+
     def __call__(
         self,
     ) -> Tuple[
@@ -205,6 +283,8 @@ class DataExtractor(object):
             None,
         ],
     ]:
+        if self.use_keypoint_fast_path(self.data_module):
+            return self.extract_keypoints(), None
         loader = self.get_loader()
         loader = self.verify_labeled_loader(loader)
         return self.iterate_over_dataloader(loader)
@@ -281,20 +361,170 @@ def clean_any_nans(data: torch.Tensor, dim: int) -> torch.Tensor:
         return data[~nan_bool]
 
 
-@typechecked
-def count_frames(video_file: str) -> int:
+# absolute video path -> metadata, see `get_video_metadata`
+_video_metadata_cache: dict[str, VideoMetadata] = {}
+_video_metadata_lock = threading.Lock()
+_video_metadata_index_loaded = False
+
+
+def _default_video_metadata_index_file() -> Path | None:
+    """Path of the video metadata index, see `VIDEO_METADATA_INDEX_FILE`."""
+    index_file = os.environ.get("LIGHTNING_POSE_VIDEO_METADATA_INDEX")
+    if index_file is not None:
+        return Path(index_file) if index_file else None
+    cache_dir = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return cache_dir / "lightning_pose" / "video_metadata.jsonl"
+
+
+# persistent index of video metadata shared by all processes, with one json entry per line (later
+# entries supersede earlier ones); the `LIGHTNING_POSE_VIDEO_METADATA_INDEX` environment variable
+# sets the path of the index, or disables it if empty; set to None to only cache metadata
+# in-process
+VIDEO_METADATA_INDEX_FILE: Path | None = _default_video_metadata_index_file()
+
+# the index is rewritten with the latest entry of each existing video when it grows past this size
+_VIDEO_METADATA_INDEX_MAX_BYTES = 4 * 1024 * 1024
+
+
+def _read_video_metadata_index() -> dict[str, VideoMetadata]:
+    entries = {}
+    with open(VIDEO_METADATA_INDEX_FILE) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                video_file = entry.pop("path")
+                entries[video_file] = VideoMetadata(**entry)
+            except (ValueError, TypeError, KeyError):
+                # line partially written by a process that was killed
+                continue
+    return entries
+
+
+def _load_video_metadata_index() -> None:
+    global _video_metadata_index_loaded
+    if _video_metadata_index_loaded:
+        return
+    _video_metadata_index_loaded = True
+    if VIDEO_METADATA_INDEX_FILE is None or not VIDEO_METADATA_INDEX_FILE.exists():
+        return
+    try:
+        _video_metadata_cache.update(_read_video_metadata_index())
+    except OSError:
+        return
+
+
+def _compact_video_metadata_index() -> None:
+    """Rewrite the index with the latest entry of each video that still exists.
+
+    If that is still larger than half of `_VIDEO_METADATA_INDEX_MAX_BYTES`, the oldest entries are
+    dropped too, so that the index is only rewritten once in a while. Entries appended by other
+    processes during the rewrite may be lost; their videos are opened again the next time.
+
     """
-    Simple function to count the number of frames in a video.
+    entries = _read_video_metadata_index()
+    lines = [
+        json.dumps({"path": video_file, **dataclasses.asdict(metadata)}) + "\n"
+        for video_file, metadata in entries.items()
+        if os.path.isfile(video_file)
+    ]
+    n_bytes = 0
+    n_lines = 0
+    # dict order is the order in which videos were added; keep the most recent ones
+    for line in reversed(lines):
+        n_bytes += len(line)
+        if n_bytes > _VIDEO_METADATA_INDEX_MAX_BYTES // 2:
+            break
+        n_lines += 1
+    tmp_file = VIDEO_METADATA_INDEX_FILE.with_name(
+        f"{VIDEO_METADATA_INDEX_FILE.name}.{os.getpid()}.tmp"
+    )
+    with open(tmp_file, "w") as f:
+        f.writelines(lines[len(lines) - n_lines:])
+    os.replace(tmp_file, VIDEO_METADATA_INDEX_FILE)
+
+
+def _add_to_video_metadata_index(video_file: str, metadata: VideoMetadata) -> None:
+    if VIDEO_METADATA_INDEX_FILE is None:
+        return
+    entry = json.dumps({"path": video_file, **dataclasses.asdict(metadata)})
+    try:
+        VIDEO_METADATA_INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
+        # single appended lines do not interleave between processes
+        with open(VIDEO_METADATA_INDEX_FILE, "a") as f:
+            f.write(entry + "\n")
+        if VIDEO_METADATA_INDEX_FILE.stat().st_size > _VIDEO_METADATA_INDEX_MAX_BYTES:
+            _compact_video_metadata_index()
+    except OSError:
+        # e.g. read-only home directory; metadata stay cached in-process
+        pass
+
+
+@typechecked
+def get_video_metadata(video_file: str | Path) -> VideoMetadata:
+    """Frame count, fps, resolution and codec of a video.
+
+    Metadata are cached in-process and in a persistent index (`VIDEO_METADATA_INDEX_FILE`), so a
+    video is only opened the first time it is queried by any process, or after it was modified:
+    cache entries are keyed on the absolute path of the video and validated against the size and
+    modification time of the file.
+
     """
-    assert os.path.isfile(video_file)
+    video_file = os.path.abspath(video_file)
+    if not os.path.isfile(video_file):
+        raise FileNotFoundError(f"{video_file} is not a video file!")
+    stat = os.stat(video_file)
+    with _video_metadata_lock:
+        _load_video_metadata_index()
+        metadata = _video_metadata_cache.get(video_file)
+    if (
+        metadata is not None
+        and metadata.file_size == stat.st_size
+        and metadata.mtime_ns == stat.st_mtime_ns
+    ):
+        return metadata
 
     import cv2
 
     cap = cv2.VideoCapture(video_file)
-    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    metadata = VideoMetadata(
+        frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        fps=float(cap.get(cv2.CAP_PROP_FPS)),
+        width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        codec="".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip("\x00"),
+        file_size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+    )
     cap.release()
+    with _video_metadata_lock:
+        _video_metadata_cache[video_file] = metadata
+        _add_to_video_metadata_index(video_file, metadata)
+    return metadata
 
-    return num_frames
+
+@typechecked
+def get_videos_metadata(
+    video_files: list[str] | list[Path], num_threads: int = 8,
+) -> list[VideoMetadata]:
+    """Metadata of several videos; uncached videos are opened concurrently.
+
+    Opening a video mostly waits on the filesystem, so querying many videos (e.g. on a network
+    filesystem) is much faster with a few threads.
+
+    """
+    if len(video_files) <= 1 or num_threads <= 1:
+        return [get_video_metadata(f) for f in video_files]
+    with ThreadPoolExecutor(max_workers=min(num_threads, len(video_files))) as pool:
+        return list(pool.map(get_video_metadata, video_files))
+
+
+@typechecked
+def count_frames(video_file: str | Path) -> int:
+    """
+    Simple function to count the number of frames in a video.
+    """
+    return get_video_metadata(video_file).frame_count
 
 
 @typechecked
@@ -359,29 +589,22 @@ def generate_heatmaps(
         batch of 2D heatmaps
 
     """
-    keypoints = keypoints.detach().clone()
+    keypoints = keypoints.detach()
     out_height = output_shape[0]
     out_width = output_shape[1]
-    keypoints[:, :, 1] *= out_height / height
-    keypoints[:, :, 0] *= out_width / width
-    nan_idxs = torch.isnan(keypoints)[:, :, 0]
+    x = keypoints[:, :, 0] * (out_width / width)
+    y = keypoints[:, :, 1] * (out_height / height)
+    nan_idxs = torch.isnan(x)
     xv = torch.arange(out_width, device=keypoints.device)
     yv = torch.arange(out_height, device=keypoints.device)
-    # note flipped order because of pytorch's ij and numpy's xy indexing for meshgrid
-    xx, yy = torch.meshgrid(yv, xv, indexing="ij")
-    # adds batch and num_keypoints dimensions to grids
-    xx = xx.unsqueeze(0).unsqueeze(0)
-    yy = yy.unsqueeze(0).unsqueeze(0)
-    # adds dimension corresponding to the first dimension of the 2d grid
-    keypoints = keypoints.unsqueeze(2)
-    # evaluates 2d gaussian with mean equal to the keypoint and var equal to sigma^2
-    heatmaps = (yy - keypoints[:, :, :, :1]) ** 2  # also flipped order here
-    heatmaps += (xx - keypoints[:, :, :, 1:]) ** 2  # also flipped order here
-    heatmaps *= -1
-    heatmaps /= 2 * sigma**2
-    heatmaps = torch.exp(heatmaps)
-    # normalize all heatmaps to one
-    heatmaps = heatmaps / torch.sum(heatmaps, dim=(2, 3), keepdim=True)
+    # the 2d gaussian with mean equal to the keypoint and var equal to sigma^2 is the outer
+    # product of two 1d gaussians, and its sum over the grid is the product of their sums; evaluate
+    # and normalize each axis separately instead of the full (height, width) grid
+    gauss_x = torch.exp(-((xv - x.unsqueeze(-1)) ** 2) / (2 * sigma**2))
+    gauss_x = gauss_x / torch.sum(gauss_x, dim=-1, keepdim=True)
+    gauss_y = torch.exp(-((yv - y.unsqueeze(-1)) ** 2) / (2 * sigma**2))
+    gauss_y = gauss_y / torch.sum(gauss_y, dim=-1, keepdim=True)
+    heatmaps = gauss_y.unsqueeze(-1) * gauss_x.unsqueeze(-2)
     # replace nans with zeros heatmaps
     # (all zeros heatmaps are ignored in the supervised heatmap loss)
     if uniform_heatmaps:
@@ -407,36 +630,20 @@ def evaluate_heatmaps_at_location(
     spread across neighboring pixels. To account for this, confidence is computed by
     taking all pixels within two standard deviations of the predicted pixel."""
     pix_to_consider = int(np.floor(sigma * num_stds))  # get all pixels within num_stds.
-    num_pad = pix_to_consider
-    heatmaps_padded = torch.zeros(
-        (
-            heatmaps.shape[0],
-            heatmaps.shape[1],
-            heatmaps.shape[2] + num_pad * 2,
-            heatmaps.shape[3] + num_pad * 2,
-        ),
-        device=heatmaps.device,
-    )
-    heatmaps_padded[:, :, num_pad:-num_pad, num_pad:-num_pad] = heatmaps
-    i = torch.arange(heatmaps_padded.shape[0], device=heatmaps_padded.device).reshape(
-        -1, 1, 1, 1
-    )
-    j = torch.arange(heatmaps_padded.shape[1], device=heatmaps_padded.device).reshape(
-        1, -1, 1, 1
+    batch, num_keypoints, height, width = heatmaps.shape
+    offsets = torch.arange(-pix_to_consider, pix_to_consider + 1, device=heatmaps.device)
+    # rows/cols of every pixel in the window around each location, shape (batch, kps, win, win)
+    rows = locs[:, :, 1].type(torch.int64)[:, :, None, None] + offsets[:, None]
+    cols = locs[:, :, 0].type(torch.int64)[:, :, None, None] + offsets[None, :]
+    # pixels outside the heatmap contribute zero, as if the heatmap were zero-padded
+    in_bounds = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    idxs = rows.clamp(0, height - 1) * width + cols.clamp(0, width - 1)
+    # gather all window pixels in one pass instead of indexing once per offset
+    vals = torch.gather(
+        heatmaps.reshape(batch, num_keypoints, -1), 2, idxs.reshape(batch, num_keypoints, -1),
     )
-    k = locs[:, :, None, 1, None].type(torch.int64) + num_pad
-    m = locs[:, :, 0, None, None].type(torch.int64) + num_pad
-    offsets = list(np.arange(-pix_to_consider, pix_to_consider + 1))
-    vals_all = []
-    for offset in offsets:
-        k_offset = k + offset
-        for offset_2 in offsets:
-            m_offset = m + offset_2
-            # get rid of singleton dims
-            vals = heatmaps_padded[i, j, k_offset, m_offset].squeeze(-1).squeeze(-1)
-            vals_all.append(vals)
-    vals = torch.stack(vals_all, 0).sum(0)
-    return vals
+    vals = vals * in_bounds.reshape(batch, num_keypoints, -1)
+    return vals.sum(-1)
 
 
 # @typechecked
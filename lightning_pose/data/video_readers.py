@@ -0,0 +1,586 @@
+"""CPU video readers that mirror the DALI prediction pipelines without requiring a GPU."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Literal
+
+import cv2
+import numpy as np
+import torch
+from omegaconf import DictConfig
+
+from lightning_pose.data import _IMAGENET_MEAN, _IMAGENET_STD
+from lightning_pose.data.datatypes import (
+    MultiviewUnlabeledBatchDict,
+    UnlabeledBatchDict,
+)
+from lightning_pose.data.utils import get_videos_metadata
+
+# to ignore imports for sphix-autoapidoc
+__all__ = [
+    "ALLOWED_VIDEO_READERS",
+    "OpenCVVideoLoader",
+    "OpenCVFrameLoader",
+    "OpenCVCropLoader",
+    "PrepareOpenCV",
+    "get_video_reader",
+]
+
+ALLOWED_VIDEO_READERS = ("dali", "opencv")
+
+
+def get_video_reader(dali_config: dict | DictConfig) -> str:
+    """Return the video reader backend used for prediction on unlabeled videos.
+
+    Older configs do not contain the `dali.predict_reader` field; these default to DALI.
+
+    """
+    reader = dali_config.get("predict_reader", None) or "dali"
+    if reader not in ALLOWED_VIDEO_READERS:
+        raise ValueError(
+            f"dali.predict_reader must be one of {ALLOWED_VIDEO_READERS}, not '{reader}'"
+        )
+    return reader
+
+
+class _SingleVideoDecoder:
+    """Sequential frame decoder for a single video file using OpenCV."""
+
+    # skip ahead by seeking rather than decoding when the next frame is further away than this
+    max_grab = 64
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.cap = cv2.VideoCapture(filename)
+        if not self.cap.isOpened():
+            raise IOError(f"could not open {filename}")
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.exhausted = False
+        self.position = 0  # index of the frame returned by the next call to `read`
+
+    def read(self) -> np.ndarray | None:
+        """Return the next RGB uint8 frame, or None once the video is exhausted."""
+        if self.exhausted:
+            return None
+        ret, frame = self.cap.read()
+        if not ret:
+            self.exhausted = True
+            return None
+        self.position += 1
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def read_at(self, frame_idx: int) -> np.ndarray | None:
+        """Return frame `frame_idx`, which cannot precede frames that were already read."""
+        if frame_idx < self.position:
+            raise ValueError(f"frame {frame_idx} was already read from {self.filename}")
+        if frame_idx - self.position > self.max_grab:
+            self.seek(frame_idx)
+        else:
+            while self.position < frame_idx and self.cap.grab():
+                self.position += 1
+        return self.read()
+
+    def seek(self, frame_idx: int) -> None:
+        """Position the decoder so that the next call to `read` returns frame `frame_idx`."""
+        if frame_idx == self.position:
+            return
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        if int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) != frame_idx:
+            # inexact seek; decode from the beginning instead
+            self.cap.release()
+            self.cap = cv2.VideoCapture(self.filename)
+            for _ in range(frame_idx):
+                if not self.cap.grab():
+                    break
+        self.position = frame_idx
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+class OpenCVVideoLoader(object):
+    """Iterate over frame sequences of a video, decoded on the CPU with OpenCV.
+
+    Produces the same batches as the DALI prediction pipelines in
+    :class:`~lightning_pose.data.dali.LitDaliWrapper`: sequences of `sequence_length` frames that
+    start every `step` frames; frames past the end of the video are zero-padded before
+    normalization. Decoding of the next sequence happens in a background thread while the model
+    processes the current one, and resizing/normalization is spread across a thread pool (OpenCV
+    releases the GIL for both).
+
+    """
+
+    def __init__(
+        self,
+        filenames: list[str] | list[list[str]],
+        resize_dims: list[int],
+        sequence_length: int,
+        step: int,
+        num_iters: int,
+        num_threads: int | None = None,
+        normalization_mean: list[float] = _IMAGENET_MEAN,
+        normalization_std: list[float] = _IMAGENET_STD,
+        start_frame: int = 0,
+    ) -> None:
+        """
+
+        Args:
+            filenames: list containing a single video path, or for multiview a list of lists
+                (one single-video list per view, order matching cfg.data.view_names)
+            resize_dims: [height, width] to resize raw frames
+            sequence_length: number of frames per sequence
+            step: number of frames to advance between the starts of successive sequences
+            num_iters: number of sequences to return
+            num_threads: size of the resize/normalization thread pool; defaults to cpu count
+            normalization_mean: mean values in (0, 1) to subtract from each channel
+            normalization_std: standard deviation values to divide each channel by
+            start_frame: index of the first frame of the first sequence
+
+        """
+        if isinstance(filenames, list) and isinstance(filenames[0], list):
+            self.multiview = True
+        else:
+            self.multiview = False
+            filenames = [filenames]
+        for view_list in filenames:
+            if len(view_list) != 1:
+                raise NotImplementedError(
+                    "OpenCVVideoLoader only supports a single video per view"
+                )
+
+        self.filenames = [view_list[0] for view_list in filenames]
+        self.resize_dims = resize_dims
+        self.sequence_length = sequence_length
+        self.step = step
+        self.num_iters = num_iters
+        self.num_threads = num_threads or os.cpu_count() or 1
+        self.start_frame = start_frame
+        self.mean = np.array(normalization_mean, dtype=np.float32).reshape(3, 1, 1)
+        self.std = np.array(normalization_std, dtype=np.float32).reshape(3, 1, 1)
+
+    def __len__(self) -> int:
+        return self.num_iters
+
+    def _process_frame(self, frame: np.ndarray | None) -> np.ndarray:
+        """Resize and normalize a single uint8 RGB frame; returns float32 array (3, H, W)."""
+        height, width = self.resize_dims
+        if frame is None:
+            # zero-padded frame, matches dali `pad_sequences=True`
+            frame = np.zeros((height, width, 3), dtype=np.float32)
+        else:
+            if frame.shape[0] > height or frame.shape[1] > width:
+                interpolation = cv2.INTER_AREA  # antialias when downsampling, like dali
+            else:
+                interpolation = cv2.INTER_LINEAR
+            frame = cv2.resize(frame, (width, height), interpolation=interpolation)
+            frame = frame.astype(np.float32)
+        frame = frame.transpose(2, 0, 1) / 255.0
+        return (frame - self.mean) / self.std
+
+    def _read_frames(
+        self,
+        decoders: list[_SingleVideoDecoder],
+        buffers: list[list[np.ndarray | None]],
+        pool: ThreadPoolExecutor,
+    ) -> None:
+        """Decode and process frames until every view buffer holds a full sequence."""
+        n_missing = self.sequence_length - len(buffers[0])
+        if n_missing <= 0:
+            return
+        for decoder, buffer in zip(decoders, buffers):
+            raw = [decoder.read() for _ in range(n_missing)]
+            buffer.extend(pool.map(self._process_frame, raw))
+
+    def _make_batch(
+        self,
+        decoders: list[_SingleVideoDecoder],
+        buffers: list[list[np.ndarray]],
+    ) -> UnlabeledBatchDict | MultiviewUnlabeledBatchDict:
+        frames = [torch.from_numpy(np.stack(buffer[:self.sequence_length])) for buffer in buffers]
+        if not self.multiview:
+            # shape (sequence_length, 3, H, W)
+            frames = frames[0]
+            bbox = torch.tensor([0, 0, decoders[0].height, decoders[0].width]).repeat(
+                (frames.shape[0], 1)
+            )
+            return UnlabeledBatchDict(
+                frames=frames, transforms=torch.tensor([-1]), bbox=bbox, is_multiview=False,
+            )
+        else:
+            # shape (sequence_length, num_views, 3, H, W)
+            frames = torch.stack(frames, dim=1)
+            # shape (num_views, 1); no geometric transforms to undo
+            transforms = torch.tensor([[-1]] * len(decoders))
+            # shape (sequence_length, num_views * xyhw)
+            bbox = torch.cat(
+                [torch.tensor([0, 0, d.height, d.width]) for d in decoders], dim=0,
+            ).repeat(frames.shape[0], 1)
+            return MultiviewUnlabeledBatchDict(
+                frames=frames, transforms=transforms, bbox=bbox, is_multiview=True,
+            )
+
+    def __iter__(self) -> Iterator[UnlabeledBatchDict | MultiviewUnlabeledBatchDict]:
+        decoders = [_SingleVideoDecoder(f) for f in self.filenames]
+        for decoder in decoders:
+            decoder.seek(self.start_frame)
+        buffers = [[] for _ in decoders]
+        pool = ThreadPoolExecutor(max_workers=self.num_threads)
+        # single background thread so that sequences are decoded in order
+        prefetcher = ThreadPoolExecutor(max_workers=1)
+
+        def _next_batch():
+            self._read_frames(decoders, buffers, pool)
+            batch = self._make_batch(decoders, buffers)
+            # advance; frames shared between overlapping sequences are kept
+            for buffer in buffers:
+                del buffer[:self.step]
+            return batch
+
+        try:
+            future = prefetcher.submit(_next_batch) if self.num_iters > 0 else None
+            for i in range(self.num_iters):
+                batch = future.result()
+                if i < self.num_iters - 1:
+                    future = prefetcher.submit(_next_batch)
+                yield batch
+        finally:
+            prefetcher.shutdown(wait=True)
+            pool.shutdown(wait=True)
+            for decoder in decoders:
+                decoder.release()
+
+
+class OpenCVFrameLoader(OpenCVVideoLoader):
+    """Iterate over batches of selected frames of a video, decoded on the CPU with OpenCV.
+
+    Used to predict on a subset of the frames of a video, e.g. a frame range or every Nth frame.
+    For base models each batch holds `batch_size` of the selected frames. For context models each
+    selected frame is returned with its two preceding and two following frames, in the layout of
+    labeled context batches; windows are shifted inside the video at its first and last two
+    frames, so that these frames share the predictions of frames 2 and -3 as in full video
+    prediction. Frames that are shared between windows are only decoded once.
+
+    """
+
+    def __init__(
+        self,
+        filenames: list[str] | list[list[str]],
+        resize_dims: list[int],
+        frame_indices: np.ndarray,
+        frame_count: int,
+        batch_size: int,
+        context: bool = False,
+        num_threads: int | None = None,
+        normalization_mean: list[float] = _IMAGENET_MEAN,
+        normalization_std: list[float] = _IMAGENET_STD,
+    ) -> None:
+        """
+
+        Args:
+            filenames: list containing a single video path, or for multiview a list of lists
+                (one single-video list per view, order matching cfg.data.view_names)
+            resize_dims: [height, width] to resize raw frames
+            frame_indices: increasing indices of the frames to return
+            frame_count: number of frames in the video
+            batch_size: number of selected frames per batch
+            context: return each selected frame with its four context frames
+            num_threads: size of the resize/normalization thread pool; defaults to cpu count
+            normalization_mean: mean values in (0, 1) to subtract from each channel
+            normalization_std: standard deviation values to divide each channel by
+
+        """
+        super().__init__(
+            filenames=filenames,
+            resize_dims=resize_dims,
+            sequence_length=batch_size,
+            step=batch_size,
+            num_iters=int(np.ceil(len(frame_indices) / batch_size)),
+            num_threads=num_threads,
+            normalization_mean=normalization_mean,
+            normalization_std=normalization_std,
+        )
+        self.frame_indices = np.asarray(frame_indices, dtype=int)
+        if np.any(np.diff(self.frame_indices) <= 0):
+            raise ValueError("frame_indices must be strictly increasing")
+        self.frame_count = frame_count
+        self.batch_size = batch_size
+        self.context = context
+
+    def _windows(self, targets: np.ndarray) -> np.ndarray:
+        """Frame indices needed for each target frame, shape (num_targets, 1 or 5)."""
+        if not self.context:
+            return targets[:, None]
+        centers = np.clip(targets, 2, max(self.frame_count - 3, 2))
+        return np.clip(centers[:, None] + np.arange(-2, 3), 0, self.frame_count - 1)
+
+    def __iter__(self) -> Iterator[UnlabeledBatchDict | MultiviewUnlabeledBatchDict]:
+        decoders = [_SingleVideoDecoder(f) for f in self.filenames]
+        pool = ThreadPoolExecutor(max_workers=self.num_threads)
+        # single background thread so that frames are decoded in order
+        prefetcher = ThreadPoolExecutor(max_workers=1)
+        cache = {}  # frame index -> list of processed frames, one per view
+
+        def _next_batch(i):
+            targets = self.frame_indices[i * self.batch_size:(i + 1) * self.batch_size]
+            windows = self._windows(targets)
+            new_idxs = [idx for idx in np.unique(windows) if idx not in cache]
+            for view, decoder in enumerate(decoders):
+                raw = [decoder.read_at(idx) for idx in new_idxs]
+                for idx, frame in zip(new_idxs, pool.map(self._process_frame, raw)):
+                    cache.setdefault(idx, []).append(frame)
+            buffers = [
+                [np.stack([cache[idx][view] for idx in window]) for window in windows]
+                for view in range(len(decoders))
+            ]
+            # later windows never reach further back than the current last window
+            for idx in [idx for idx in cache if idx < windows[-1, 0]]:
+                del cache[idx]
+            if not self.context:
+                # (num_targets, 1, 3, H, W) -> (num_targets, 3, H, W)
+                buffers = [[frames[0] for frames in buffer] for buffer in buffers]
+            return self._make_batch(decoders, buffers)
+
+        try:
+            future = prefetcher.submit(_next_batch, 0) if self.num_iters > 0 else None
+            for i in range(self.num_iters):
+                batch = future.result()
+                if i < self.num_iters - 1:
+                    future = prefetcher.submit(_next_batch, i + 1)
+                yield batch
+        finally:
+            prefetcher.shutdown(wait=True)
+            pool.shutdown(wait=True)
+            for decoder in decoders:
+                decoder.release()
+
+
+class OpenCVCropLoader(OpenCVVideoLoader):
+    """Iterate over frame sequences of a video, cropped around a bounding box in every frame.
+
+    Each frame is cropped to its own bounding box (regions outside the frame are zero-filled) and
+    the crop is resized to `resize_dims`, so that a pose model trained on cropped labeled frames
+    can predict directly on the original video. The boxes are returned as the `bbox` of the batch,
+    which maps predicted keypoints back to the coordinates of the original frames.
+
+    """
+
+    def __init__(
+        self,
+        filenames: list[str],
+        resize_dims: list[int],
+        bboxes: np.ndarray,
+        sequence_length: int,
+        step: int,
+        num_iters: int,
+        num_threads: int | None = None,
+        normalization_mean: list[float] = _IMAGENET_MEAN,
+        normalization_std: list[float] = _IMAGENET_STD,
+        start_frame: int = 0,
+    ) -> None:
+        """
+
+        Args:
+            filenames: list containing a single video path
+            resize_dims: [height, width] to resize cropped frames
+            bboxes: shape (num_frames, 4); x, y, h, w of the bounding box of each frame, in pixels
+            sequence_length: number of frames per sequence
+            step: number of frames to advance between the starts of successive sequences
+            num_iters: number of sequences to return
+            num_threads: size of the crop/resize/normalization thread pool; defaults to cpu count
+            normalization_mean: mean values in (0, 1) to subtract from each channel
+            normalization_std: standard deviation values to divide each channel by
+            start_frame: index of the first frame of the first sequence
+
+        """
+        super().__init__(
+            filenames=filenames,
+            resize_dims=resize_dims,
+            sequence_length=sequence_length,
+            step=step,
+            num_iters=num_iters,
+            num_threads=num_threads,
+            normalization_mean=normalization_mean,
+            normalization_std=normalization_std,
+            start_frame=start_frame,
+        )
+        if self.multiview:
+            raise NotImplementedError("OpenCVCropLoader does not support multiview videos")
+        self.bboxes = np.asarray(bboxes, dtype=np.float32)
+        if self.bboxes.ndim != 2 or self.bboxes.shape[1] != 4:
+            raise ValueError(f"bboxes must have shape (num_frames, 4), not {self.bboxes.shape}")
+
+    def _crop_frame(
+        self, item: tuple[np.ndarray | None, np.ndarray],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Crop a single uint8 RGB frame to its bbox, then resize and normalize the crop."""
+        frame, bbox = item
+        if frame is None:
+            return self._process_frame(None), bbox
+        x, y, h, w = (int(v) for v in bbox)
+        h, w = max(h, 1), max(w, 1)
+        crop = np.zeros((h, w, 3), dtype=frame.dtype)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, frame.shape[1]), min(y + h, frame.shape[0])
+        if x1 > x0 and y1 > y0:
+            crop[y0 - y:y1 - y, x0 - x:x1 - x] = frame[y0:y1, x0:x1]
+        return self._process_frame(crop), np.array([x, y, h, w], dtype=np.float32)
+
+    def _read_frames(
+        self,
+        decoders: list[_SingleVideoDecoder],
+        buffers: list[list[tuple[np.ndarray, np.ndarray]]],
+        pool: ThreadPoolExecutor,
+    ) -> None:
+        """Decode, crop and process frames until the buffer holds a full sequence."""
+        n_missing = self.sequence_length - len(buffers[0])
+        if n_missing <= 0:
+            return
+        decoder = decoders[0]
+        items = []
+        for _ in range(n_missing):
+            idx = decoder.position
+            frame = decoder.read()
+            if frame is not None and idx < len(self.bboxes):
+                bbox = self.bboxes[idx]
+            else:
+                # zero-padded frame past the end of the video (or of the boxes)
+                frame = None
+                bbox = np.array([0, 0, decoder.height, decoder.width], dtype=np.float32)
+            items.append((frame, bbox))
+        buffers[0].extend(pool.map(self._crop_frame, items))
+
+    def _make_batch(
+        self,
+        decoders: list[_SingleVideoDecoder],
+        buffers: list[list[tuple[np.ndarray, np.ndarray]]],
+    ) -> UnlabeledBatchDict:
+        frames, bboxes = zip(*buffers[0][:self.sequence_length])
+        return UnlabeledBatchDict(
+            frames=torch.from_numpy(np.stack(frames)),
+            transforms=torch.tensor([-1]),
+            bbox=torch.from_numpy(np.stack(bboxes)),
+            is_multiview=False,
+        )
+
+
+class PrepareOpenCV(object):
+    """CPU counterpart of :class:`~lightning_pose.data.dali.PrepareDALI` for prediction.
+
+    Reads the same `dali` config fields as the DALI prediction pipelines so that sequence lengths,
+    context offsets and number of iterations are identical.
+
+    """
+
+    def __init__(
+        self,
+        model_type: Literal["base", "context"],
+        filenames: list[str] | list[list[str]],
+        resize_dims: list[int],
+        dali_config: dict | DictConfig,
+        num_threads: int | None = None,
+        sequence_range: tuple[int, int] | None = None,
+        frame_indices: np.ndarray | None = None,
+        bboxes: np.ndarray | None = None,
+    ) -> None:
+        """
+
+        Args:
+            model_type: "base" or "context"
+            filenames: list containing a single video path, or for multiview a list of lists
+            resize_dims: [height, width] to resize raw frames
+            dali_config: `dali` entry of the config file
+            num_threads: size of the resize/normalization thread pool; defaults to cpu count
+            sequence_range: (first, last) indices of the sequences to return, last excluded;
+                defaults to all `num_iters` sequences. Used to split a video into shards whose
+                sequences are identical to those of the full video.
+            frame_indices: only return these (increasing) frames of the video, see
+                :class:`OpenCVFrameLoader`; `sequence_range` then indexes batches of frames
+            bboxes: shape (num_frames, 4); crop every frame to its x, y, h, w bounding box before
+                resizing, see :class:`OpenCVCropLoader`
+
+        """
+        # make sure `filenames` is a list of existing video files
+        view_lists = filenames if isinstance(filenames[0], list) else [filenames]
+        for view_list in view_lists:
+            for vid in view_list:
+                if not os.path.exists(vid) or not os.path.isfile(vid):
+                    raise FileNotFoundError(f"{vid} is not a video file!")
+
+        self.model_type = model_type
+        self.filenames = filenames
+        self.resize_dims = resize_dims
+        self.dali_config = dali_config
+        self.num_threads = num_threads
+        self.sequence_range = sequence_range
+        self.frame_indices = frame_indices
+        self.bboxes = bboxes
+        if bboxes is not None and frame_indices is not None:
+            raise NotImplementedError("cannot crop frames to bboxes when predicting on a subset")
+        self.frame_count = sum(m.frame_count for m in get_videos_metadata(view_lists[0]))
+
+        if model_type == "base":
+            self.sequence_length = dali_config["base"]["predict"]["sequence_length"]
+            self.step = self.sequence_length
+        elif model_type == "context":
+            self.sequence_length = dali_config["context"]["predict"]["sequence_length"]
+            self.step = self.sequence_length - 4
+        else:
+            raise NotImplementedError
+
+    @property
+    def batch_size(self) -> int:
+        """Number of selected frames per batch when predicting on `frame_indices`."""
+        if self.model_type == "base":
+            return self.sequence_length
+        # each frame comes with four context frames; keep the number of frames per batch
+        return max(1, self.sequence_length // 5)
+
+    @property
+    def num_iters(self) -> int:
+        if self.frame_indices is not None:
+            return int(np.ceil(len(self.frame_indices) / self.batch_size))
+        if self.model_type == "base":
+            return int(np.ceil(self.frame_count / self.sequence_length))
+        else:
+            if self.step <= 0:
+                raise ValueError(
+                    "step cannot be 0, please modify "
+                    "cfg.dali.context.predict.sequence_length to be > 4"
+                )
+            # first sequence, then enough steps to reach the end of the video
+            data_except_first_batch = self.frame_count - self.sequence_length
+            return int(np.ceil(data_except_first_batch / self.step)) + 1
+
+    def __call__(self) -> OpenCVVideoLoader:
+        first, last = self.sequence_range or (0, self.num_iters)
+        if self.frame_indices is not None:
+            return OpenCVFrameLoader(
+                filenames=self.filenames,
+                resize_dims=self.resize_dims,
+                frame_indices=self.frame_indices[first * self.batch_size:last * self.batch_size],
+                frame_count=self.frame_count,
+                batch_size=self.batch_size,
+                context=self.model_type == "context",
+                num_threads=self.num_threads,
+            )
+        if self.bboxes is not None:
+            return OpenCVCropLoader(
+                filenames=self.filenames,
+                resize_dims=self.resize_dims,
+                bboxes=self.bboxes,
+                sequence_length=self.sequence_length,
+                step=self.step,
+                num_iters=last - first,
+                num_threads=self.num_threads,
+                start_frame=first * self.step,
+            )
+        return OpenCVVideoLoader(
+            filenames=self.filenames,
+            resize_dims=self.resize_dims,
+            sequence_length=self.sequence_length,
+            step=self.step,
+            num_iters=last - first,
+            num_threads=self.num_threads,
+            start_frame=first * self.step,
+        )
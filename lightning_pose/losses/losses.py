@@ -20,6 +20,7 @@ The general flow of each loss class is as follows:
 
 import os
 import warnings
+from pathlib import Path
 from typing import Literal, Tuple, Type
 
 import torch
@@ -285,6 +286,7 @@ class PCALoss(Loss):
         log_weight: float = 0.0,
         device: Literal["cuda", "cpu"] | torch.device = _DEFAULT_TORCH_DEVICE,
         centering_method: Literal["mean", "median"] | None = None,
+        cache_dir: str | Path | None = None,
         **kwargs,
     ) -> None:
         super().__init__(data_module=data_module, log_weight=log_weight)
@@ -312,8 +314,9 @@ class PCALoss(Loss):
             columns_for_singleview_pca=columns_for_singleview_pca,
             device=device,
             centering_method=centering_method,
+            cache_dir=cache_dir,
         )
-        # compute all the parameters needed for the loss
+        # compute all the parameters needed for the loss (or load them from the cache_dir)
         self.pca()
         # select epsilon based on constructor inputs
         if epsilon is not None:
@@ -411,13 +414,7 @@ class TemporalLoss(Loss):
         # get rid of unsupervised targets with extremely uncertain predictions or likely occlusions
         idxs_ignore = confidences < self.prob_threshold
         # ignore the loss values in the diff where one of the heatmaps is 'nan'
-        union_idxs_ignore = torch.zeros(
-            (confidences.shape[0] - 1, confidences.shape[1]),
-            dtype=torch.bool,
-            device=loss.device,
-        )
-        for i in range(confidences.shape[0] - 1):
-            union_idxs_ignore[i] = torch.logical_or(idxs_ignore[i], idxs_ignore[i + 1])
+        union_idxs_ignore = torch.logical_or(idxs_ignore[:-1], idxs_ignore[1:]).to(loss.device)
 
         # clone loss and zero out the nan values
         clean_loss = loss.clone()
@@ -511,11 +508,7 @@ class TemporalHeatmapLoss(Loss):
         # get rid of unsupervised targets with extremely uncertain predictions or likely occlusions
         idxs_ignore = confidences < self.prob_threshold
         # ignore the loss values in the diff where one of the heatmaps is 'nan'
-        union_idxs_ignore = torch.zeros(
-            (confidences.shape[0] - 1, confidences.shape[1]), dtype=torch.bool
-        ).to(loss.device)
-        for i in range(confidences.shape[0] - 1):
-            union_idxs_ignore[i] = torch.logical_or(idxs_ignore[i], idxs_ignore[i + 1])
+        union_idxs_ignore = torch.logical_or(idxs_ignore[:-1], idxs_ignore[1:]).to(loss.device)
 
         loss[union_idxs_ignore] = 0.0
         return loss
@@ -524,24 +517,18 @@ class TemporalHeatmapLoss(Loss):
         self,
         predictions: TensorType["batch", "num_valid_keypoints", "heatmap_height", "heatmap_width"],
     ) -> TensorType["batch_minus_one", "num_valid_keypoints"]:
-        # compute the differences between matching heatmaps for each keypoint
-
-        diffs = torch.zeros(
-            (predictions.shape[0] - 1, predictions.shape[1]), device=predictions.device
-        )
+        # compute the differences between matching heatmaps for each keypoint, comparing all
+        # frames 0..T-2 to frames 1..T-1 at once
 
-        for i in range(diffs.shape[0]):
-            if self.loss_name == "temporal_heatmap_mse":
-                curr_mse = F.mse_loss(
-                    predictions[i], predictions[i + 1], reduction="none"
-                ).reshape(predictions.shape[1], -1)
-                diffs[i] = torch.mean(curr_mse, dim=-1)
-            elif self.loss_name == "temporal_heatmap_kl":
-                diffs[i] = self.hmloss(
-                    predictions[i].unsqueeze(0) + 1e-10,
-                    predictions[i + 1].unsqueeze(0) + 1e-10,
-                    reduction="none",
-                )
+        if self.loss_name == "temporal_heatmap_mse":
+            diffs = F.mse_loss(predictions[:-1], predictions[1:], reduction="none")
+            diffs = torch.mean(diffs.flatten(start_dim=2), dim=-1)
+        elif self.loss_name == "temporal_heatmap_kl":
+            diffs = self.hmloss(
+                predictions[:-1] + 1e-10,
+                predictions[1:] + 1e-10,
+                reduction="none",
+            )
 
         return diffs
 
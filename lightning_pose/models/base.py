@@ -96,25 +96,32 @@ def get_context_from_sequence(
         TensorType["seq_len", "n_features", "rep_height", "rep_width"],
     ],
     context_length: int,
+    pad: bool = True,
 ) -> Union[
-        TensorType["seq_len", "context_length", "RGB": 3, "image_height", "image_width"],
-        TensorType["seq_len", "context_length", "n_features", "rep_height", "rep_width"],
+        TensorType["num_windows", "context_length", "RGB": 3, "image_height", "image_width"],
+        TensorType["num_windows", "context_length", "n_features", "rep_height", "rep_width"],
 ]:
-    # our goal is to extract 5-frame sequences from this sequence
-    img_shape = img_seq.shape[1:]  # e.g., (3, H, W)
-    seq_len = img_seq.shape[0]  # how many images in batch
-    train_seq = torch.zeros((seq_len, context_length, *img_shape), device=img_seq.device)
-    # define pads: start pad repeats the zeroth image twice. end pad repeats the last image twice.
-    # this is to give padding for the first and last frames of the sequence
-    pad_start = torch.tile(img_seq[0].unsqueeze(0), (2, 1, 1, 1))
-    pad_end = torch.tile(img_seq[-1].unsqueeze(0), (2, 1, 1, 1))
-    # pad the sequence
-    padded_seq = torch.cat((pad_start, img_seq, pad_end), dim=0)
-    # padded_seq = torch.cat((two_pad, img_seq, two_pad), dim=0)
-    for i in range(seq_len):
-        # extract 5-frame sequences from the padded sequence
-        train_seq[i] = padded_seq[i : i + context_length]
-    return train_seq
+    """Extract overlapping windows of `context_length` consecutive frames from a sequence.
+
+    The windows are a strided view into the sequence, so no data is copied until the windows are
+    consumed.
+
+    Args:
+        img_seq: sequence of frames or feature maps
+        context_length: number of frames in each window
+        pad: True to repeat the first and last frames so that there is one window centered on
+            every frame (num_windows = seq_len); False to only return windows that are fully
+            contained in the sequence (num_windows = seq_len - context_length + 1)
+
+    """
+    if pad:
+        # start pad repeats the zeroth frame, end pad repeats the last frame; this gives padding
+        # for the first and last frames of the sequence
+        pad_start = img_seq[:1].expand((context_length - 1) // 2, *img_seq.shape[1:])
+        pad_end = img_seq[-1:].expand(context_length // 2, *img_seq.shape[1:])
+        img_seq = torch.cat((pad_start, img_seq, pad_end), dim=0)
+    # unfold returns shape (num_windows, ..., context_length); move context next to batch dim
+    return img_seq.unfold(0, context_length, 1).movedim(-1, 1)
 
 
 class BaseFeatureExtractor(LightningModule):
@@ -179,6 +186,8 @@ class BaseFeatureExtractor(LightningModule):
             optimizer, optimizer_params
         )
         self.do_context = do_context
+        # number of frames in each context window, centered on the frame of interest
+        self.context_length = 5
 
     def get_representations(
         self,
@@ -289,14 +298,13 @@ class BaseFeatureExtractor(LightningModule):
                 ] = outputs.reshape(batch, -1, outputs.shape[-2], outputs.shape[-1])
 
                 # we need to tile the representations to make it into
-                # (num_valid_frames, features, rep_height, rep_width, num_context_frames)
-                tiled_representations = get_context_from_sequence(
-                    img_seq=outputs, context_length=5,
-                )
-                # get rid of first and last two frames
-                if tiled_representations.shape[0] < 5:
+                # (num_valid_frames, context_frames, features, rep_height, rep_width);
+                # only valid frames (with a full context window) are kept
+                if outputs.shape[0] < self.context_length:
                     raise RuntimeError("Not enough valid frames to make a context representation.")
-                outputs = tiled_representations[2:-2, :, :, :, :]
+                outputs = get_context_from_sequence(
+                    img_seq=outputs, context_length=self.context_length, pad=False,
+                )
 
             elif len(images.shape) == 4:
                 # we have a single sequence of frames from DALI (not a batch of sequences)
@@ -310,15 +318,13 @@ class BaseFeatureExtractor(LightningModule):
                     "sequence_length", "features", "rep_height", "rep_width"
                 ] = self.backbone(images)
                 # we need to tile the representations to make it into
-                # (num_valid_frames, features, rep_height, rep_width, num_context_frames)
-                # TODO: context frames should be configurable
-                tiled_representations = get_context_from_sequence(
-                    img_seq=representations, context_length=5,
-                )
-                # get rid of first and last two frames
-                if tiled_representations.shape[0] < 5:
+                # (num_valid_frames, context_frames, features, rep_height, rep_width);
+                # only valid frames (with a full context window) are kept
+                if representations.shape[0] < self.context_length:
                     raise RuntimeError("Not enough valid frames to make a context representation.")
-                outputs = tiled_representations[2:-2, :, :, :, :]
+                outputs = get_context_from_sequence(
+                    img_seq=representations, context_length=self.context_length, pad=False,
+                )
 
             # for both types of batches, we reshape in the same way
             # context is in the last dimension for the linear layer.
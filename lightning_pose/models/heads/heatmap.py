@@ -1,9 +1,8 @@
 """Heads that produce heatmap predictions for heatmap regression."""
 
-from typing import Tuple
+from typing import Literal, Tuple
 
 import torch
-from kornia.filters import filter2d
 from kornia.geometry.subpix import spatial_expectation2d, spatial_softmax2d
 from kornia.geometry.transform.pyramid import _get_pyramid_gaussian_kernel
 from torch import nn
@@ -82,8 +81,15 @@ def upsample(
     inputs_up = nn.functional.interpolate(
         inputs, size=(height * 2, width * 2), mode="bicubic", align_corners=False,
     )
-    inputs_up = filter2d(inputs_up, kernel, border_type="constant")
-    return inputs_up
+    # same as kornia's `filter2d(inputs_up, kernel, border_type="constant")`, but each keypoint is
+    # filtered as a separate image so that the kernel shape is static, which ONNX export requires
+    batch, num_keypoints, height_up, width_up = inputs_up.shape
+    kernel = kernel.to(inputs_up)[:, None]
+    padding = (kernel.shape[-2] // 2, kernel.shape[-1] // 2)
+    inputs_up = nn.functional.conv2d(
+        inputs_up.reshape(-1, 1, height_up, width_up), kernel, padding=padding,
+    )
+    return inputs_up.reshape(batch, num_keypoints, height_up, width_up)
 
 
 def run_subpixelmaxima(
@@ -130,6 +136,131 @@ def run_subpixelmaxima(
     return preds.reshape(-1, heatmaps.shape[1] * 2), confidences
 
 
+def run_subpixelmaxima_local(
+    heatmaps: TensorType["batch", "num_keypoints", "heatmap_height", "heatmap_width"],
+    downsample_factor: int,
+    temperature: torch.tensor,
+    window_radius: int = 2,
+) -> Tuple[TensorType["batch", "num_keypoints"], TensorType["batch", "num_keypoints"]]:
+    """Use soft argmax on heatmaps, upsampling only a window around each coarse maximum.
+
+    This approximates `run_subpixelmaxima` without upsampling the full heatmaps. For each keypoint
+    a window around the argmax of the low-resolution heatmap is upsampled; the window is padded
+    with enough context that upsampled values inside `window_radius` of the maximum are identical
+    to those of the full upsampling. The (small) softmax mass outside of this region is estimated
+    from the low-resolution heatmap, so that predictions and confidences of diffuse heatmaps remain
+    consistent with `run_subpixelmaxima`.
+
+    Args:
+        heatmaps: output of upsampling layers
+        downsample_factor: controls how many times upsampling needs to be performed
+        temperature: temperature parameter of softmax; higher leads to tighter peaks
+        window_radius: half-width (in low-resolution heatmap pixels) of the region around the
+            maximum that is evaluated at full resolution
+
+    Returns:
+        tuple
+            - soft argmax of shape (batch, num_targets)
+            - confidences of shape (batch, num_keypoints)
+
+    """
+    batch, num_keypoints, height, width = heatmaps.shape
+    device = heatmaps.device
+    scale = 2 ** downsample_factor
+    # low-resolution pixels near the window border that are affected by the border handling of
+    # the bicubic interpolation and gaussian smoothing in `upsample`
+    margin = 3 + downsample_factor
+    win_h = min(2 * (window_radius + margin) + 1, height)
+    win_w = min(2 * (window_radius + margin) + 1, width)
+
+    # find coarse maxima; shift windows so that they stay inside the heatmaps, which makes the
+    # upsampling exact at the heatmap borders too
+    heatmaps_flat = heatmaps.reshape(batch, num_keypoints, -1)
+    idxs_max = torch.argmax(heatmaps_flat, dim=-1)
+    top = torch.clamp(idxs_max // width - win_h // 2, 0, height - win_h)
+    left = torch.clamp(idxs_max % width - win_w // 2, 0, width - win_w)
+    rows = top.unsqueeze(-1) + torch.arange(win_h, device=device)
+    cols = left.unsqueeze(-1) + torch.arange(win_w, device=device)
+    idxs_window = rows.unsqueeze(-1) * width + cols.unsqueeze(-2)
+    idxs_window = idxs_window.reshape(batch, num_keypoints, -1)
+    windows = torch.gather(heatmaps_flat, 2, idxs_window).reshape(
+        batch, num_keypoints, win_h, win_w,
+    )
+
+    # upsample windows
+    for _ in range(downsample_factor):
+        windows = upsample(windows)
+
+    # low-resolution pixels of each window whose upsampled values are exact
+    r = torch.arange(win_h, device=device)
+    c = torch.arange(win_w, device=device)
+    exact_rows = ((r >= margin) | (top.unsqueeze(-1) == 0)) \
+        & ((r < win_h - margin) | (top.unsqueeze(-1) == height - win_h))
+    exact_cols = ((c >= margin) | (left.unsqueeze(-1) == 0)) \
+        & ((c < win_w - margin) | (left.unsqueeze(-1) == width - win_w))
+    exact = exact_rows.unsqueeze(-1) & exact_cols.unsqueeze(-2)
+    exact_up = exact.repeat_interleave(scale, dim=-2).repeat_interleave(scale, dim=-1)
+    # all other pixels are evaluated at low resolution, each standing in for scale^2 pixels
+    coarse = torch.ones_like(heatmaps_flat).scatter(
+        2, idxs_window, (~exact).reshape(batch, num_keypoints, -1).to(heatmaps.dtype),
+    )
+
+    # softmax over the exact region of the upsampled windows
+    weights_up = torch.exp(
+        windows * temperature - torch.amax(windows * temperature, dim=(-2, -1), keepdim=True)
+    ) * exact_up
+    softmaxes = weights_up / torch.sum(weights_up, dim=(-2, -1), keepdim=True)
+    # soft argmax in coordinates of the fully upsampled heatmaps
+    x_up = left.unsqueeze(-1) * scale + torch.arange(win_w * scale, device=device)
+    y_up = top.unsqueeze(-1) * scale + torch.arange(win_h * scale, device=device)
+    preds_in = torch.stack([
+        torch.sum(softmaxes.sum(dim=-2) * x_up, dim=-1),
+        torch.sum(softmaxes.sum(dim=-1) * y_up, dim=-1),
+    ], dim=-1)
+
+    # softmax mass and soft argmax of the remaining pixels, estimated at low resolution
+    softmaxes_coarse = torch.softmax(heatmaps_flat * temperature, dim=-1)
+    mass_out = torch.sum(softmaxes_coarse * coarse, dim=-1, keepdim=True)
+    idxs_flat = torch.arange(height * width, device=device)
+    xy_coarse = torch.stack([
+        (idxs_flat % width) * scale + (scale - 1) / 2,
+        torch.div(idxs_flat, width, rounding_mode="floor") * scale + (scale - 1) / 2,
+    ], dim=-1).to(heatmaps.dtype)
+    preds_out = torch.matmul(softmaxes_coarse * coarse, xy_coarse)
+    preds = (1 - mass_out) * preds_in + preds_out
+
+    # compute confidences as softmax value pooled around prediction
+    # (floor so that predictions just outside of a window are not pooled from its first pixel)
+    origin = torch.stack([left, top], dim=-1) * scale
+    confidences = evaluate_heatmaps_at_location(
+        heatmaps=softmaxes * (1 - mass_out).unsqueeze(-1), locs=torch.floor(preds - origin),
+    )
+    # fix grid offsets from upsampling
+    if downsample_factor == 1:
+        preds -= 0.5
+    elif downsample_factor == 2:
+        preds -= 1.5
+    elif downsample_factor == 3:
+        preds -= 2.5
+
+    return preds.reshape(-1, num_keypoints * 2), confidences
+
+
+def decode_heatmaps(
+    heatmaps: TensorType["batch", "num_keypoints", "heatmap_height", "heatmap_width"],
+    downsample_factor: int,
+    temperature: torch.tensor,
+    decoder: Literal["full", "local"] = "full",
+) -> Tuple[TensorType["batch", "num_targets"], TensorType["batch", "num_keypoints"]]:
+    """Compute subpixel keypoint locations and confidences with the selected decoder."""
+    if decoder == "full":
+        return run_subpixelmaxima(heatmaps, downsample_factor, temperature)
+    elif decoder == "local":
+        return run_subpixelmaxima_local(heatmaps, downsample_factor, temperature)
+    else:
+        raise NotImplementedError(f"{decoder} is not a valid heatmap decoder")
+
+
 class HeatmapHead(nn.Module):
     """Simple deconvolution head that converts 2D feature maps to per-keypoint heatmaps.
 
@@ -147,6 +278,7 @@ class HeatmapHead(nn.Module):
         deconv_out_channels: int | None = None,
         downsample_factor: int = 2,
         final_softmax: bool = True,
+        decoder: Literal["full", "local"] = "full",
     ):
         """
 
@@ -159,6 +291,9 @@ class HeatmapHead(nn.Module):
             downsample_factor: make heatmaps smaller than input frames by this factor; subpixel
                 operations are performed for increased precision
             final_softmax: pass final heatmaps through a 2D softmax with temperature 1.0
+            decoder: how to compute subpixel keypoint locations from heatmaps
+                "full": upsample full heatmaps before soft argmax (`run_subpixelmaxima`)
+                "local": only upsample a window around each maximum (`run_subpixelmaxima_local`)
 
         """
         super().__init__()
@@ -169,6 +304,7 @@ class HeatmapHead(nn.Module):
         self.deconv_out_channels = deconv_out_channels
         self.downsample_factor = downsample_factor
         self.final_softmax = final_softmax
+        self.decoder = decoder
         # TODO: temp=1000 works for 64x64 heatmaps, need to generalize to other shapes
         self.temperature = torch.tensor(1000.0)  # soft argmax temp
 
@@ -196,4 +332,4 @@ class HeatmapHead(nn.Module):
         return heatmaps
 
     def run_subpixelmaxima(self, heatmaps):
-        return run_subpixelmaxima(heatmaps, self.downsample_factor, self.temperature)
+        return decode_heatmaps(heatmaps, self.downsample_factor, self.temperature, self.decoder)
@@ -9,7 +9,7 @@ from torchtyping import TensorType
 from typing_extensions import Literal
 
 from lightning_pose.models.heads import HeatmapHead
-from lightning_pose.models.heads.heatmap import run_subpixelmaxima
+from lightning_pose.models.heads.heatmap import decode_heatmaps
 
 # to ignore imports for sphix-autoapidoc
 __all__ = []
@@ -36,6 +36,7 @@ class HeatmapMHCRNNHead(nn.Module):
         deconv_out_channels: int | None = None,
         downsample_factor: int = 2,
         upsampling_factor: int = 2,
+        decoder: Literal["full", "local"] = "full",
     ):
         """
 
@@ -48,6 +49,8 @@ class HeatmapMHCRNNHead(nn.Module):
             downsample_factor: make heatmaps smaller than input frames by this factor; subpixel
                 operations are performed for increased precision
             upsampling_factor: upsample features before feeding to crnn
+            decoder: how to compute subpixel keypoint locations from heatmaps; "full" or "local"
+                (see `lightning_pose.models.heads.heatmap.decode_heatmaps`)
 
         """
         super().__init__()
@@ -58,6 +61,7 @@ class HeatmapMHCRNNHead(nn.Module):
         self.deconv_out_channels = deconv_out_channels
         self.downsample_factor = downsample_factor
         self.upsampling_factor = upsampling_factor
+        self.decoder = decoder
         self.temperature = torch.tensor(1000.0)  # soft argmax temp
 
         # create single-frame head
@@ -121,7 +125,7 @@ class HeatmapMHCRNNHead(nn.Module):
         return heatmaps_sf, heatmaps_mf
 
     def run_subpixelmaxima(self, heatmaps):
-        return run_subpixelmaxima(heatmaps, self.downsample_factor, self.temperature)
+        return decode_heatmaps(heatmaps, self.downsample_factor, self.temperature, self.decoder)
 
 
 class UpsamplingCRNN(nn.Module):
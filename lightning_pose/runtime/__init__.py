@@ -0,0 +1,10 @@
+"""Lightweight inference runtime for models exported with ``litpose export``.
+
+This package only depends on torch, numpy and OpenCV (and onnxruntime for ONNX models); it does
+not import Lightning, so it can be deployed to inference hosts with a minimal environment.
+
+"""
+
+from lightning_pose.runtime.predictor import Predictor
+
+__all__ = ["Predictor"]
@@ -0,0 +1,234 @@
+"""Run exported models on frames and videos without Lightning or the training config."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import cv2
+import numpy as np
+import torch
+
+__all__ = ["Predictor"]
+
+# see `lightning_pose.utils.export`
+_METADATA_KEY = "lightning_pose.json"
+_SUPPORTED_FORMAT_VERSIONS = (1,)
+
+
+class Predictor:
+    """Predict keypoints with a model exported by ``litpose export``.
+
+    Frames are resized to the model input size as in ``litpose predict`` with the OpenCV video
+    reader, and keypoints are returned in pixel coordinates of the original frames. For context
+    models the first and last two frames of a sequence get the predictions of frames 2 and -3, as
+    in ``litpose predict``.
+
+    .. code-block:: python
+
+        from lightning_pose.runtime import Predictor
+
+        predictor = Predictor("exported_model.pt")
+        keypoints, confidences = predictor.predict_video("video.mp4")
+
+    """
+
+    def __init__(
+        self,
+        model_file: str | Path,
+        device: str = "cpu",
+        batch_size: int = 16,
+    ) -> None:
+        """
+
+        Args:
+            model_file: TorchScript (.pt) or ONNX (.onnx) file written by ``litpose export``;
+                ONNX models are run with onnxruntime
+            device: device to run TorchScript models on; ONNX models run on the cpu
+            batch_size: number of frames per forward pass
+
+        """
+        self.model_file = Path(model_file)
+        self.device = device
+        self.batch_size = batch_size
+        if self.model_file.suffix == ".onnx":
+            try:
+                import onnxruntime
+            except ImportError:
+                raise ImportError(
+                    "running ONNX models requires onnxruntime; install it with "
+                    "`pip install lightning-pose[export]`"
+                )
+            self._session = onnxruntime.InferenceSession(str(self.model_file))
+            self._module = None
+            metadata = self._session.get_modelmeta().custom_metadata_map.get(_METADATA_KEY)
+        else:
+            extra_files = {_METADATA_KEY: ""}
+            self._session = None
+            self._module = torch.jit.load(
+                str(self.model_file), map_location=device, _extra_files=extra_files,
+            )
+            self._module.eval()
+            metadata = extra_files[_METADATA_KEY]
+        if not metadata:
+            raise ValueError(f"{self.model_file} was not written by `litpose export`")
+        self.metadata = json.loads(metadata)
+        if self.metadata["format_version"] not in _SUPPORTED_FORMAT_VERSIONS:
+            raise ValueError(
+                f"{self.model_file} uses export format version "
+                f"{self.metadata['format_version']}; upgrade lightning-pose to run it"
+            )
+
+    @property
+    def keypoint_names(self) -> list[str]:
+        return self.metadata["keypoint_names"]
+
+    @property
+    def context(self) -> bool:
+        """True for context models, which see two frames on each side of every frame."""
+        return self.metadata["context"]
+
+    def predict_frames(
+        self,
+        frames: np.ndarray | Iterable[np.ndarray],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Predict on a sequence of frames of the same size.
+
+        Args:
+            frames: uint8 RGB frames of shape (height, width, 3); consecutive video frames for
+                context models
+
+        Returns:
+            tuple
+                - keypoints of shape (n_frames, n_keypoints, 2), in pixels of the input frames
+                - confidences of shape (n_frames, n_keypoints)
+
+        """
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            raise ValueError("no frames to predict on")
+
+        def _frames() -> Iterator[np.ndarray]:
+            yield first
+            yield from frames
+
+        return self._predict(_frames(), height=first.shape[0], width=first.shape[1])
+
+    def predict_video(self, video_file: str | Path) -> tuple[np.ndarray, np.ndarray]:
+        """Predict on every frame of a video, which is decoded with OpenCV.
+
+        Returns:
+            tuple
+                - keypoints of shape (n_frames, n_keypoints, 2), in pixels of the video frames
+                - confidences of shape (n_frames, n_keypoints)
+
+        """
+        cap = cv2.VideoCapture(str(video_file))
+        if not cap.isOpened():
+            raise IOError(f"could not open {video_file}")
+
+        def _frames() -> Iterator[np.ndarray]:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        try:
+            return self._predict(
+                _frames(),
+                height=int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                width=int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            )
+        finally:
+            cap.release()
+
+    def _predict(
+        self,
+        frames: Iterator[np.ndarray],
+        height: int,
+        width: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        n_frames = 0
+
+        def _resized() -> Iterator[np.ndarray]:
+            nonlocal n_frames
+            for frame in frames:
+                n_frames += 1
+                yield self._resize(frame)
+
+        outputs = list(self._predict_resized(_resized()))
+        if n_frames == 0:
+            raise ValueError("no frames to predict on")
+        keypoints = np.concatenate([output[0] for output in outputs])
+        confidences = np.concatenate([output[1] for output in outputs])
+        if self.context:
+            # no windows for the first and last two frames; copy the predictions of frames 2
+            # and -3
+            keypoints = np.concatenate(
+                [keypoints[:1], keypoints[:1], keypoints, keypoints[-1:], keypoints[-1:]]
+            )[:n_frames]
+            confidences = np.concatenate(
+                [confidences[:1], confidences[:1], confidences, confidences[-1:],
+                 confidences[-1:]]
+            )[:n_frames]
+        # resized frame coords -> original frame coords, see `convert_bbox_coords`
+        keypoints[:, :, 0] = keypoints[:, :, 0] / self.metadata["image_width"] * width
+        keypoints[:, :, 1] = keypoints[:, :, 1] / self.metadata["image_height"] * height
+        return keypoints, confidences
+
+    def _resize(self, frame: np.ndarray) -> np.ndarray:
+        """Resize a uint8 RGB frame to the model input; returns shape (3, height, width)."""
+        height, width = self.metadata["image_height"], self.metadata["image_width"]
+        if frame.shape[0] > height or frame.shape[1] > width:
+            interpolation = cv2.INTER_AREA  # antialias when downsampling, like dali
+        else:
+            interpolation = cv2.INTER_LINEAR
+        frame = cv2.resize(frame, (width, height), interpolation=interpolation)
+        return frame.transpose(2, 0, 1)
+
+    def _predict_resized(
+        self,
+        frames: Iterator[np.ndarray],
+    ) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """Predict on resized frames; yields batches of (keypoints, confidences)."""
+        buffer = []
+        if not self.context:
+            for frame in frames:
+                buffer.append(frame)
+                if len(buffer) == self.batch_size:
+                    yield self._run(np.stack(buffer))
+                    buffer = []
+            if buffer:
+                yield self._run(np.stack(buffer))
+            return
+
+        # context models predict on windows of five frames, centered on frames 2, ..., n - 3
+        def _windows(buffer: list[np.ndarray]) -> np.ndarray:
+            stacked = np.stack(buffer)
+            return np.stack([stacked[i:i + 5] for i in range(len(buffer) - 4)])
+
+        n_batches = 0
+        for frame in frames:
+            buffer.append(frame)
+            if len(buffer) == self.batch_size + 4:
+                yield self._run(_windows(buffer))
+                n_batches += 1
+                # the last four frames are shared with the next windows
+                del buffer[:self.batch_size]
+        if len(buffer) > 4:
+            yield self._run(_windows(buffer))
+        elif buffer and n_batches == 0:
+            # fewer than five frames; zero-pad a single window, like the video readers
+            buffer.extend([np.zeros_like(buffer[0])] * (5 - len(buffer)))
+            yield self._run(_windows(buffer))
+
+    def _run(self, images: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if self._session is not None:
+            keypoints, confidences = self._session.run(None, {"images": images})
+            return keypoints, confidences
+        with torch.no_grad():
+            keypoints, confidences = self._module(torch.from_numpy(images).to(self.device))
+        return keypoints.cpu().numpy(), confidences.cpu().numpy()
@@ -238,7 +238,10 @@ def _train(cfg: DictConfig) -> Model:
     data_module = get_data_module(cfg=cfg, dataset=dataset, video_dir=video_dir)
 
     # build loss factory which orchestrates different losses
-    loss_factories = get_loss_factories(cfg=cfg, data_module=data_module)
+    # pca parameters are cached in the model directory (the cwd) and reused for pca metrics
+    loss_factories = get_loss_factories(
+        cfg=cfg, data_module=data_module, pca_cache_dir=os.getcwd(),
+    )
 
     steps_per_epoch = calculate_steps_per_epoch(data_module)
 
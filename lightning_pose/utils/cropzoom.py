@@ -1,5 +1,11 @@
+from __future__ import annotations
+
 import multiprocessing
+import os
+import zipfile
+from io import BytesIO
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import cv2
 import numpy as np
@@ -10,12 +16,18 @@ from omegaconf import DictConfig
 from PIL import Image
 from typeguard import typechecked
 
+from lightning_pose.data.datasets import PACKED_IMAGES_FILENAME
 from lightning_pose.utils import io
+from lightning_pose.utils.predictions import generate_labeled_video, predict_video
+
+if TYPE_CHECKING:
+    from lightning_pose.api.model import Model
 
 __all__ = [
     "generate_cropped_labeled_frames",
     "generate_cropped_video",
     "generate_cropped_csv_file",
+    "predict_video_cropzoom",
 ]
 
 
@@ -101,70 +113,116 @@ def _compute_bbox_df(
     return pd.DataFrame(bboxes, index=index, columns=["x", "y", "h", "w"])
 
 
-def _crop_image(img_path, bbox, cropped_img_path):
-    img = Image.open(img_path)
-    img = img.crop(bbox)
-    cropped_img_path.parent.mkdir(parents=True, exist_ok=True)
-    img.save(cropped_img_path)
+def _crop_image_chunk(
+    root_directory: Path,
+    output_directory: Path | None,
+    chunk: list[tuple[str, tuple[int, int, int, int]]],
+) -> list[tuple[str, bytes]]:
+    """Crop a chunk of images; returns the encoded crops if `output_directory` is None."""
+    encoded = []
+    for img_path, bbox in chunk:
+        with Image.open(root_directory / img_path) as img:
+            cropped = img.crop(bbox)
+            if output_directory is not None:
+                cropped.save(output_directory / img_path)
+            else:
+                buffer = BytesIO()
+                cropped.save(buffer, format=img.format)
+                encoded.append((img_path, buffer.getvalue()))
+    return encoded
+
+
+def _star_crop_image_chunk(args):
+    return _crop_image_chunk(*args)
 
 
-def _star_crop_image(args):
-    return _crop_image(*args)
+def _list_image_dirs(root_directory: Path, img_paths: list[Path]) -> dict[Path, set[str]]:
+    """List every directory that contains one of `img_paths` once; missing dirs are empty."""
+    listings = {}
+    for img_dir in {img_path.parent for img_path in img_paths}:
+        try:
+            listings[img_dir] = set(os.listdir(root_directory / img_dir))
+        except FileNotFoundError:
+            listings[img_dir] = set()
+    return listings
 
 
 @typechecked
 def _crop_images(
-    bbox_df: pd.DataFrame, root_directory: Path, output_directory: Path
+    bbox_df: pd.DataFrame,
+    root_directory: Path,
+    output_directory: Path,
+    packed: bool = False,
+    num_workers: int | None = None,
+    chunk_size: int = 64,
 ) -> None:
     """Crops images according to their bboxes in `bbox_df`.
 
+    Context frames (n-2, ..., n+2) of every image are cropped with the bbox of the image, unless
+    they are labeled themselves. Image directories are listed once to find the context frames
+    that exist, and images are cropped in chunks of `chunk_size` per worker task.
+
     root_directory: root of img paths in bbox_df.
-    output_directory: where to save cropped images."""
-
-    _file_cache: dict[Path, bool] = {}
-
-    def _file_exists(path):
-        # Cache path.exists() as an easy way to speed up.
-        # TODO: This is still slow. Get all files in the dir and check if file is in the list.
-        if path in _file_cache:
-            return _file_cache[path]
-        exists = (root_directory / path).exists()
-        _file_cache[path] = exists
-        return exists
-
-    # img_path -> (abs_img_path, bbox, output_img_path)
-    crop_calls: dict[Path, tuple[Path, tuple[int, int, int, int], Path]] = {}
-
-    for center_img_path, row in tqdm.tqdm(
-        bbox_df.iterrows(), total=len(bbox_df), desc="Building crop tasks"
-    ):
-        # TODO Add unit tests for this logic.
-        center_img_path = Path(center_img_path)
-        for img_path in io.get_context_img_paths(center_img_path):
-            # If context frame:
-            if img_path != center_img_path:
-                # There is no context frame. Continue.
-                if not _file_exists(root_directory / img_path):
-                    continue
-                # The context frame is already in bbox_df as a center frame. Continue.
-                if str(img_path) in bbox_df.index:
-                    continue
-                # There is already a crop task for the context frame. Continue.
-                if img_path in crop_calls:
-                    continue
-            abs_img_path = root_directory / img_path
-            bbox = (row.x, row.y, row.x + row.w, row.y + row.h)
-            cropped_img_path = output_directory / img_path
-
-            crop_calls[img_path] = (abs_img_path, bbox, cropped_img_path)
-
-    with multiprocessing.Pool() as pool:
-        for _ in tqdm.tqdm(
-            pool.imap(_star_crop_image, crop_calls.values()),
-            total=len(crop_calls),
-            desc="Cropping images",
-        ):
-            pass
+    output_directory: where to save cropped images.
+    packed: save the cropped images to a single archive, `PACKED_IMAGES_FILENAME` in
+        `output_directory`, instead of one file per image; see `data.datasets.PackedImageStore`.
+    num_workers: number of worker processes; defaults to cpu count."""
+
+    center_img_paths = [Path(p) for p in bbox_df.index]
+    # (left, upper, right, lower) crop boxes as expected by PIL
+    x, y = bbox_df["x"].to_numpy(), bbox_df["y"].to_numpy()
+    boxes = np.column_stack([x, y, x + bbox_df["w"].to_numpy(), y + bbox_df["h"].to_numpy()])
+    boxes = [tuple(box) for box in boxes.astype(int).tolist()]
+
+    context_img_paths = [io.get_context_img_paths(p) for p in center_img_paths]
+    listings = _list_image_dirs(
+        root_directory, [p for paths in context_img_paths for p in paths]
+    )
+
+    # img_path -> bbox; labeled frames are cropped with their own bbox
+    crop_tasks: dict[str, tuple[int, int, int, int]] = {
+        p.as_posix(): box for p, box in zip(center_img_paths, boxes)
+    }
+    for img_paths, box in zip(context_img_paths, boxes):
+        for img_path in img_paths:
+            # the first context frame with a bbox wins; skip frames that do not exist
+            if img_path.as_posix() in crop_tasks or img_path.name not in listings[img_path.parent]:
+                continue
+            crop_tasks[img_path.as_posix()] = box
+
+    tasks = list(crop_tasks.items())
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+    if packed:
+        output_directory.mkdir(parents=True, exist_ok=True)
+        packed_file = output_directory / PACKED_IMAGES_FILENAME
+        tmp_file = packed_file.with_name(packed_file.name + ".tmp")
+        chunk_args = [(root_directory, None, chunk) for chunk in chunks]
+        archive = zipfile.ZipFile(tmp_file, "w", compression=zipfile.ZIP_STORED)
+        if packed_file.exists():
+            # keep the crops of other label files
+            with zipfile.ZipFile(packed_file) as previous:
+                for info in previous.infolist():
+                    if info.filename not in crop_tasks:
+                        archive.writestr(info, previous.read(info))
+    else:
+        for img_dir in {Path(img_path).parent for img_path in crop_tasks}:
+            (output_directory / img_dir).mkdir(parents=True, exist_ok=True)
+        chunk_args = [(root_directory, output_directory, chunk) for chunk in chunks]
+        archive = None
+
+    with multiprocessing.Pool(num_workers) as pool, tqdm.tqdm(
+        total=len(tasks), desc="Cropping images"
+    ) as progress:
+        for chunk, encoded in zip(chunks, pool.imap(_star_crop_image_chunk, chunk_args)):
+            if archive is not None:
+                for img_path, data in encoded:
+                    archive.writestr(img_path, data)
+            progress.update(len(chunk))
+
+    if archive is not None:
+        archive.close()
+        os.replace(tmp_file, packed_file)
 
 
 @typechecked
@@ -224,13 +282,16 @@ def generate_cropped_labeled_frames(
     output_data_dir: Path,
     output_bbox_file: Path,
     output_csv_file: Path,
+    packed: bool = False,
 ) -> None:
     """Given model predictions, generates a bbox.csv, crops frames,
-    and a cropped csv file."""
+    and a cropped csv file.
+
+    If `packed`, cropped frames are saved to a single archive in `output_data_dir` rather than
+    to one file per frame."""
     # Use predictions rather than CollectedData.csv because collected data can sometimes have NaNs.
     # load predictions
-    pred_df = pd.read_csv(input_preds_file, header=[0, 1, 2], index_col=0)
-    pred_df = io.fix_empty_first_row(pred_df)
+    pred_df = io.load_predictions(input_preds_file)
 
     # compute and save bbox_df
     bbox_df = _compute_bbox_df(
@@ -240,7 +301,7 @@ def generate_cropped_labeled_frames(
     output_bbox_file.parent.mkdir(parents=True, exist_ok=True)
     bbox_df.to_csv(output_bbox_file)
 
-    _crop_images(bbox_df, input_data_dir, output_data_dir)
+    _crop_images(bbox_df, input_data_dir, output_data_dir, packed=packed)
 
     generate_cropped_csv_file(
         input_csv_file=input_csv_file,
@@ -260,8 +321,7 @@ def generate_cropped_video(
     """TODO make consistent with generate_cropped_labeled_frames"""
 
     # Given the predictions, compute cropping bboxes
-    pred_df = pd.read_csv(input_preds_file, header=[0, 1, 2], index_col=0)
-    pred_df = io.fix_empty_first_row(pred_df)
+    pred_df = io.load_predictions(input_preds_file)
 
     # Save cropping bboxes
     bbox_df = _compute_bbox_df(
@@ -274,6 +334,60 @@ def generate_cropped_video(
     _crop_video_moviepy(input_video_file, bbox_df, output_file)
 
 
+def predict_video_cropzoom(
+    input_video_file: Path,
+    detector_model: Model,
+    pose_model: Model,
+    detector_cfg: DictConfig,
+    output_bbox_file: Path,
+    output_pred_file: Path,
+    output_labeled_video_file: Path | None = None,
+) -> pd.DataFrame:
+    """Predict on a video with a detector model and then a pose model, in a single pass.
+
+    Bboxes are computed from the detector model's predictions as in `generate_cropped_video`, but
+    instead of predicting on a cropped video, the pose model crops every frame of the original
+    video to its bbox on the fly. Pose predictions are returned (and saved) in the coordinates of
+    the original video, so they do not need to be remapped.
+
+    """
+    # detector predictions are saved to the detector model's video_preds dir, as with
+    # `litpose predict`
+    detector_result = detector_model.predict_on_video_file(
+        input_video_file, compute_metrics=False,
+    )
+
+    bbox_df = _compute_bbox_df(
+        detector_result.predictions,
+        list(detector_cfg.anchor_keypoints),
+        crop_ratio=detector_cfg.crop_ratio,
+    )
+    output_bbox_file.parent.mkdir(parents=True, exist_ok=True)
+    bbox_df.to_csv(output_bbox_file)
+
+    output_pred_file.parent.mkdir(parents=True, exist_ok=True)
+    with pose_model.inference_session() as session:
+        preds_df = predict_video(
+            video_file=str(input_video_file),
+            model=pose_model,
+            output_pred_file=str(output_pred_file),
+            session=session,
+            bboxes=bbox_df[["x", "y", "h", "w"]].to_numpy(),
+        )
+
+    if output_labeled_video_file is not None:
+        generate_labeled_video(
+            video_file=str(input_video_file),
+            preds_df=preds_df,
+            output_mp4_file=str(output_labeled_video_file),
+            confidence_thresh_for_vid=pose_model.cfg.eval.confidence_thresh_for_vid,
+            colormap=pose_model.cfg.eval.get("colormap", "cool"),
+            num_workers=pose_model.cfg.eval.get("labeled_video_num_workers", 1),
+        )
+
+    return preds_df
+
+
 def generate_cropped_csv_file(
     input_csv_file: str | Path,
     input_bbox_file: str | Path,
@@ -289,8 +403,7 @@ def generate_cropped_csv_file(
         raise ValueError(f"{mode} is not a valid mode")
     # Read csv file from pose_model.cfg.data.csv_file
     # TODO: reuse header_rows logic from datasets.py
-    csv_data = pd.read_csv(input_csv_file, header=[0, 1, 2], index_col=0)
-    csv_data = io.fix_empty_first_row(csv_data)
+    csv_data = io.load_predictions(input_csv_file)
 
     bbox_data = pd.read_csv(input_bbox_file, index_col=0)
 
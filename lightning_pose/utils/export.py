@@ -0,0 +1,241 @@
+"""Export trained models to self-contained TorchScript or ONNX graphs.
+
+The exported graph maps a batch of uint8 RGB frames, already resized to the model input size, to
+keypoints and confidences. It contains the image normalization, the backbone, the head and the
+heatmap decoder (`run_subpixelmaxima`), so that it can be run with
+:class:`lightning_pose.runtime.Predictor` without Lightning, hydra or the training data.
+
+"""
+
+from __future__ import annotations
+
+import contextlib
+import inspect
+import json
+import warnings
+from pathlib import Path
+from typing import Iterator
+
+import lightning.pytorch as pl
+import torch
+from omegaconf import DictConfig
+from torch import nn
+
+import lightning_pose
+from lightning_pose.data import _IMAGENET_MEAN, _IMAGENET_STD
+from lightning_pose.models import HeatmapTracker, HeatmapTrackerMHCRNN
+
+__all__ = [
+    "ALLOWED_EXPORT_FORMATS",
+    "ExportedPoseModel",
+    "export_model",
+]
+
+ALLOWED_EXPORT_FORMATS = ("torchscript", "onnx")
+
+# name of the json metadata in the TorchScript extra files and the ONNX metadata props; must
+# match `lightning_pose.runtime.predictor`
+_METADATA_KEY = "lightning_pose.json"
+
+# bump when the inputs/outputs of the exported graph change
+_EXPORT_FORMAT_VERSION = 1
+
+
+class ExportedPoseModel(nn.Module):
+    """Wrap a heatmap model so that a single forward pass maps frames to keypoints.
+
+    Inputs are uint8 RGB frames of shape (batch, 3, height, width) for base models, and
+    (batch, 5, 3, height, width) for context models, where frame 2 of each window of five is the
+    frame to predict on. Outputs are keypoints of shape (batch, num_keypoints, 2) in pixel
+    coordinates of the resized frames, and confidences of shape (batch, num_keypoints).
+
+    """
+
+    def __init__(
+        self,
+        model: HeatmapTracker | HeatmapTrackerMHCRNN,
+        normalization_mean: list[float] = _IMAGENET_MEAN,
+        normalization_std: list[float] = _IMAGENET_STD,
+    ) -> None:
+        super().__init__()
+        self.model = model
+        self.do_context = model.do_context
+        self.register_buffer("mean", torch.tensor(normalization_mean).reshape(3, 1, 1))
+        self.register_buffer("std", torch.tensor(normalization_std).reshape(3, 1, 1))
+
+    def forward(self, images: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        images = (images.float() / 255.0 - self.mean) / self.std
+        if self.do_context:
+            heatmaps_sf, heatmaps_mf = self.model(images)
+            keypoints_sf, confidence_sf = self.model.head.run_subpixelmaxima(heatmaps_sf)
+            keypoints_mf, confidence_mf = self.model.head.run_subpixelmaxima(heatmaps_mf)
+            keypoints_sf = keypoints_sf.reshape(keypoints_sf.shape[0], -1, 2)
+            keypoints_mf = keypoints_mf.reshape(keypoints_mf.shape[0], -1, 2)
+            # keep the more confident of the single-frame and multi-frame predictions, as in
+            # `HeatmapTrackerMHCRNN.predict_step`
+            mf_conf_gt = torch.gt(confidence_mf, confidence_sf)
+            keypoints = torch.where(mf_conf_gt.unsqueeze(-1), keypoints_mf, keypoints_sf)
+            confidences = torch.where(mf_conf_gt, confidence_mf, confidence_sf)
+        else:
+            heatmaps = self.model(images)
+            keypoints, confidences = self.model.head.run_subpixelmaxima(heatmaps)
+            keypoints = keypoints.reshape(keypoints.shape[0], -1, 2)
+        return keypoints, confidences
+
+
+def _make_metadata(cfg: DictConfig, model: HeatmapTracker | HeatmapTrackerMHCRNN) -> dict:
+    return {
+        "format_version": _EXPORT_FORMAT_VERSION,
+        "lightning_pose_version": lightning_pose.__version__,
+        "model_type": cfg.model.model_type,
+        "context": bool(model.do_context),
+        "keypoint_names": list(cfg.data.keypoint_names),
+        "image_height": int(cfg.data.image_resize_dims.height),
+        "image_width": int(cfg.data.image_resize_dims.width),
+        "heatmap_decoder": cfg.model.get("heatmap_decoder", "full"),
+    }
+
+
+def export_model(
+    model: HeatmapTracker | HeatmapTrackerMHCRNN,
+    cfg: DictConfig,
+    output_file: str | Path,
+    export_format: str = "torchscript",
+    device: str = "cpu",
+) -> Path:
+    """Trace a model and save it, together with the metadata needed to run it.
+
+    The keypoint names, input size and context flag are stored inside the exported file (as a
+    TorchScript extra file, or as ONNX metadata), see :class:`lightning_pose.runtime.Predictor`.
+
+    Args:
+        model: single-view heatmap model in eval mode, e.g. `Model.model`; it is moved to `device`
+        cfg: model config; `model.heatmap_decoder` selects the decoder in the exported graph
+        output_file: path of the exported graph
+        export_format: "torchscript" or "onnx"; ONNX export requires the `onnx` package
+        device: device to trace the model on; TorchScript graphs should be run on the same type
+            of device they were traced on
+
+    Returns:
+        path of the exported graph
+
+    """
+    if export_format not in ALLOWED_EXPORT_FORMATS:
+        raise ValueError(
+            f"export_format must be one of {ALLOWED_EXPORT_FORMATS}, not {export_format}"
+        )
+    if not isinstance(model, (HeatmapTracker, HeatmapTrackerMHCRNN)):
+        raise NotImplementedError(
+            f"exporting {type(model).__name__} is not supported; only single-view heatmap "
+            "models (heatmap, heatmap_mhcrnn) can be exported"
+        )
+    if cfg.data.get("view_names") and len(cfg.data.view_names) > 1:
+        raise NotImplementedError("exporting multiview models is not supported")
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    metadata = _make_metadata(cfg, model)
+
+    model.to(device)
+    model.eval()
+    # the decoder is traced into the graph; models are always trained with the full decoder
+    decoder_orig = model.head.decoder
+    model.head.decoder = metadata["heatmap_decoder"]
+    wrapper = ExportedPoseModel(model).to(device).eval()
+    # the batch dimension stays dynamic in the traced graph; the frame size is fixed
+    height, width = metadata["image_height"], metadata["image_width"]
+    shape = (2, 5, 3, height, width) if metadata["context"] else (2, 3, height, width)
+    example = torch.zeros(shape, dtype=torch.uint8, device=device)
+
+    with _allow_tracing(model), warnings.catch_warnings():
+        # the tracer warns about values that depend on the frame size, which is fixed
+        warnings.simplefilter("ignore", category=torch.jit.TracerWarning)
+        try:
+            if export_format == "torchscript":
+                _export_torchscript(wrapper, example, output_file, metadata)
+            else:
+                _export_onnx(wrapper, example, output_file, metadata)
+        finally:
+            model.head.decoder = decoder_orig
+
+    return output_file
+
+
+@contextlib.contextmanager
+def _allow_tracing(model: pl.LightningModule) -> Iterator[None]:
+    """Let the tracer read the `trainer` property of LightningModules.
+
+    The property raises outside of a Trainer, unless the module is being scripted or traced as in
+    `LightningModule.to_torchscript`. Lightning does not expose the context manager that it uses
+    there, so fall back to attaching a Trainer if it is removed.
+
+    """
+    try:
+        from lightning.pytorch.core.module import _jit_is_scripting
+    except ImportError:
+        _jit_is_scripting = None
+    if _jit_is_scripting is not None:
+        with _jit_is_scripting():
+            yield
+        return
+    try:
+        trainer = model.trainer
+    except RuntimeError:
+        trainer = None
+    model.trainer = pl.Trainer(
+        accelerator="cpu",
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+        enable_model_summary=False,
+    )
+    try:
+        yield
+    finally:
+        model.trainer = trainer
+
+
+def _export_torchscript(
+    wrapper: ExportedPoseModel, example: torch.Tensor, output_file: Path, metadata: dict,
+) -> None:
+    with torch.no_grad():
+        traced = torch.jit.trace(wrapper, example, check_trace=False)
+    torch.jit.save(traced, str(output_file), _extra_files={_METADATA_KEY: json.dumps(metadata)})
+
+
+def _export_onnx(
+    wrapper: ExportedPoseModel, example: torch.Tensor, output_file: Path, metadata: dict,
+) -> None:
+    try:
+        import onnx
+    except ImportError:
+        raise ImportError(
+            "ONNX export requires the onnx package; install it with "
+            "`pip install lightning-pose[export]`"
+        )
+    # use the TorchScript-based exporter, like `_export_torchscript`; torch >= 2.9 exports with
+    # dynamo by default, and torch < 2.5 has no `dynamo` argument
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            (example,),
+            str(output_file),
+            input_names=["images"],
+            output_names=["keypoints", "confidences"],
+            dynamic_axes={
+                "images": {0: "batch"},
+                "keypoints": {0: "batch"},
+                "confidences": {0: "batch"},
+            },
+            opset_version=17,
+            **kwargs,
+        )
+    # store the metadata in the graph, like the extra files of TorchScript models
+    onnx_model = onnx.load(str(output_file))
+    entry = onnx_model.metadata_props.add()
+    entry.key = _METADATA_KEY
+    entry.value = json.dumps(metadata)
+    onnx.save(onnx_model, str(output_file))
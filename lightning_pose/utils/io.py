@@ -27,8 +27,17 @@ __all__ = [
     "check_video_paths",
     "get_context_img_paths",
     "split_video_files_by_view",
+    "PREDICTION_FORMATS",
+    "save_predictions",
+    "load_predictions",
 ]
 
+# binary formats that can be written alongside the dlc-style prediction csv files
+PREDICTION_FORMATS = ("csv", "npz", "h5")
+
+# rows of the prediction csv file formatted at once
+_CSV_CHUNK_SIZE = 10_000
+
 
 @typechecked
 def ckpt_path_from_base_path(
@@ -516,3 +525,146 @@ def find_video_files_for_views(
         raise FileNotFoundError(f"No video files found in {video_dir}")
 
     return split_video_files_by_view(all_video_files, view_names)
+
+
+def _prediction_sidecar_path(preds_file: str | Path, prediction_format: str) -> Path:
+    return Path(preds_file).with_suffix(f".{prediction_format}")
+
+
+def save_predictions(
+    df: pd.DataFrame,
+    preds_file: str | Path,
+    prediction_format: str = "csv",
+) -> None:
+    """Save a prediction dataframe as a dlc-style csv file, plus an optional binary copy.
+
+    The binary copy stores the keypoint columns as a single float32 array together with the
+    (scorer, bodyparts, coords) column schema and the frame index, and is written next to the
+    csv file with the extension changed (e.g. `predictions.csv` -> `predictions.npz`).
+    :func:`load_predictions` reads the binary copy when it is present and up to date, which is
+    much faster than parsing the csv file.
+
+    Args:
+        df: prediction dataframe with a (scorer, bodyparts, coords) column multiindex and an
+            optional final "set" column
+        preds_file: path of the csv file
+        prediction_format: "csv" | "npz" | "h5"; binary formats are written in addition to csv
+
+    The csv file is written in chunks of rows, and the binary copy straight from the underlying
+    array, so that dataframes backed by memory-mapped arrays (streaming video predictions) are
+    never loaded into memory at once.
+
+    """
+    if prediction_format not in PREDICTION_FORMATS:
+        raise ValueError(
+            f"prediction_format must be one of {PREDICTION_FORMATS}, not '{prediction_format}'"
+        )
+    # float32 predictions are written with the same precision as float64 ones
+    float64_cols = {col: np.float64 for col, dtype in df.dtypes.items() if dtype == np.float32}
+    with open(preds_file, "w", newline="", encoding="utf-8") as f:
+        for beg in range(0, max(len(df), 1), _CSV_CHUNK_SIZE):
+            df.iloc[beg:beg + _CSV_CHUNK_SIZE].astype(float64_cols).to_csv(f, header=beg == 0)
+    if prediction_format == "csv":
+        return
+
+    if df.columns[-1][0] == "set":
+        set_arr = df.iloc[:, -1].to_numpy().astype(str)
+        df = df.iloc[:, :-1]
+    else:
+        set_arr = None
+    data = df.to_numpy(dtype=np.float32)
+    columns = np.array([list(col) for col in df.columns], dtype=str)
+    index = df.index.to_numpy()
+    if index.dtype == object:
+        index = index.astype(str)
+
+    # write the binary copy after the csv so that its mtime marks it as up to date
+    binary_file = _prediction_sidecar_path(preds_file, prediction_format)
+    if prediction_format == "npz":
+        arrays = {"data": data, "columns": columns, "index": index}
+        if set_arr is not None:
+            arrays["set"] = set_arr
+        with open(binary_file, "wb") as f:
+            np.savez(f, **arrays)
+    elif prediction_format == "h5":
+        import h5py
+
+        with h5py.File(binary_file, "w") as f:
+            f.create_dataset("data", data=data)
+            f.create_dataset("columns", data=columns.astype(object), dtype=h5py.string_dtype())
+            if index.dtype.kind == "U":
+                f.create_dataset("index", data=index.astype(object), dtype=h5py.string_dtype())
+            else:
+                f.create_dataset("index", data=index)
+            if set_arr is not None:
+                f.create_dataset(
+                    "set", data=set_arr.astype(object), dtype=h5py.string_dtype(),
+                )
+
+
+def _load_binary_predictions(binary_file: Path) -> pd.DataFrame:
+    if binary_file.suffix == ".npz":
+        with np.load(binary_file, allow_pickle=False) as f:
+            data = f["data"]
+            columns = f["columns"]
+            index = f["index"]
+            set_arr = f["set"] if "set" in f else None
+    elif binary_file.suffix == ".h5":
+        import h5py
+
+        with h5py.File(binary_file, "r") as f:
+            data = f["data"][()]
+            columns = f["columns"].asstr()[()]
+            if h5py.check_string_dtype(f["index"].dtype):
+                index = f["index"].asstr()[()]
+            else:
+                index = f["index"][()]
+            set_arr = f["set"].asstr()[()] if "set" in f else None
+    else:
+        raise ValueError(f"{binary_file} is not a supported prediction file")
+
+    df = pd.DataFrame(
+        data.astype(np.float64),
+        index=index,
+        columns=pd.MultiIndex.from_arrays(
+            columns.T.tolist(), names=["scorer", "bodyparts", "coords"],
+        ),
+    )
+    if set_arr is not None:
+        df["set"] = set_arr
+    return df
+
+
+def load_predictions(preds_file: str | Path) -> pd.DataFrame:
+    """Load a prediction dataframe with a (scorer, bodyparts, coords) column multiindex.
+
+    If `preds_file` is a csv file and a binary copy written by :func:`save_predictions` exists
+    next to it and is not older than the csv file, the binary copy is loaded instead.
+
+    Args:
+        preds_file: path to a .csv, .npz or .h5 prediction file
+
+    Returns:
+        prediction dataframe
+
+    """
+    preds_file = Path(preds_file)
+    if preds_file.suffix != ".csv":
+        return _load_binary_predictions(preds_file)
+
+    for prediction_format in PREDICTION_FORMATS:
+        if prediction_format == "csv":
+            continue
+        binary_file = _prediction_sidecar_path(preds_file, prediction_format)
+        if (
+            binary_file.exists()
+            and binary_file.stat().st_mtime >= preds_file.stat().st_mtime
+        ):
+            try:
+                return _load_binary_predictions(binary_file)
+            except KeyError:
+                # same name but not written by save_predictions (e.g. a dlc .h5 label file)
+                continue
+
+    df = pd.read_csv(preds_file, header=[0, 1, 2], index_col=0)
+    return fix_empty_first_row(df)
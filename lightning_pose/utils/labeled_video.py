@@ -0,0 +1,312 @@
+"""Render videos annotated with keypoint predictions.
+
+Frames are decoded with OpenCV, annotated, and streamed to an ffmpeg process that encodes them
+with h.264, so that only one frame is held in memory at a time. Long videos can be split into
+chunks that are rendered and encoded in parallel processes and then concatenated.
+
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import matplotlib.pyplot as plt
+import numpy as np
+
+from lightning_pose.data.utils import get_video_metadata
+from lightning_pose.data.video_readers import _SingleVideoDecoder
+
+__all__ = [
+    "render_labeled_video",
+]
+
+# timestamp text box
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+_FONT_SCALE = 0.5
+_FONT_THICKNESS = 1
+_TEXT_OFFSET = 6
+
+# encoding dominates rendering time; "faster" is ~25% faster than the "medium" preset used by
+# moviepy, with similar quality and file size (faster presets visibly blur the marker colors)
+_X264_PRESET = "faster"
+
+
+def _make_cmap(number_colors: int, cmap: str) -> np.ndarray:
+    color_class = plt.cm.ScalarMappable(cmap=cmap)
+    C = color_class.to_rgba(np.linspace(0, 1, number_colors))
+    colors = (C[:, :3] * 255).astype(np.uint8)
+    return colors
+
+
+def _get_ffmpeg_exe() -> str | None:
+    """Path of the ffmpeg binary shipped with imageio-ffmpeg (a moviepy dependency), if any."""
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return shutil.which("ffmpeg")
+
+
+def _get_upsample_factor(width: int, height: int) -> float:
+    # upsample low resolution videos so that markers and text look nice
+    if width <= 100 or height <= 100:
+        return 2.5
+    elif width <= 192 or height <= 192:
+        return 2
+    return 1
+
+
+def _seconds_to_hms(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+class _VideoEncoder:
+    """Encode RGB frames to an h.264 mp4 file through an ffmpeg pipe.
+
+    Falls back to `cv2.VideoWriter` (mpeg-4 part 2) if no ffmpeg binary is available.
+
+    """
+
+    def __init__(self, output_file: str, width: int, height: int, fps: float) -> None:
+        self.output_file = output_file
+        ffmpeg = _get_ffmpeg_exe()
+        self.proc = None
+        self.writer = None
+        if ffmpeg is not None:
+            cmd = [
+                ffmpeg, "-y", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+                "-r", str(fps), "-i", "-",
+                # yuv420p requires even frame dimensions
+                "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                "-an", "-c:v", "libx264", "-preset", _X264_PRESET, "-pix_fmt", "yuv420p",
+                output_file,
+            ]
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        else:
+            self.writer = cv2.VideoWriter(
+                output_file, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height),
+            )
+
+    def write(self, frame: np.ndarray) -> None:
+        if self.proc is not None:
+            # ffmpeg's bgr24 -> yuv420p conversion shifts the colors; pipe rgb frames
+            self.proc.stdin.write(frame.tobytes())
+        else:
+            self.writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+    def close(self) -> None:
+        if self.proc is not None:
+            self.proc.stdin.close()
+            if self.proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed to encode {self.output_file}")
+        else:
+            self.writer.release()
+
+
+class _FrameAnnotator:
+    """Draw keypoint markers and a timestamp on frames of a single video."""
+
+    def __init__(
+        self,
+        xs_arr: np.ndarray,
+        ys_arr: np.ndarray,
+        mask_array: np.ndarray,
+        colors: np.ndarray,
+        dotsize: int,
+        upsample_factor: float,
+        width: int,
+        height: int,
+        fps: float,
+        start_time: float,
+    ) -> None:
+        # marker centers in (upsampled) pixels, as in `cv2.circle(center=(int(x), int(y)))`
+        finite = np.isfinite(xs_arr) & np.isfinite(ys_arr)
+        self.visible = mask_array & finite
+        self.xcs = np.minimum(
+            (upsample_factor * np.where(finite, xs_arr, 0)).astype(int), width - 1
+        )
+        self.ycs = np.minimum(
+            (upsample_factor * np.where(finite, ys_arr, 0)).astype(int), height - 1
+        )
+        # colors and frames are rgb
+        self.colors = colors
+        # pixel offsets of a filled disk
+        dy, dx = np.mgrid[-dotsize:dotsize + 1, -dotsize:dotsize + 1]
+        inside = dx ** 2 + dy ** 2 <= (dotsize + 0.5) ** 2
+        self.dx, self.dy = dx[inside], dy[inside]
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.start_time = start_time
+
+    def draw_markers(self, frame: np.ndarray, index: int) -> None:
+        """Draw the markers of all visible keypoints with a single scatter into the frame."""
+        if index >= self.visible.shape[0]:
+            return
+        visible = self.visible[index]
+        if not visible.any():
+            return
+        xs = (self.xcs[index, visible][:, None] + self.dx).ravel()
+        ys = (self.ycs[index, visible][:, None] + self.dy).ravel()
+        colors = np.repeat(self.colors[visible], len(self.dx), axis=0)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        # later keypoints are drawn on top of earlier ones
+        frame[ys[inside], xs[inside]] = colors[inside]
+
+    def draw_timestamp(self, frame: np.ndarray, index: int) -> None:
+        seconds_from_start = index / self.fps + self.start_time
+        idx_from_start = int(np.round(seconds_from_start * self.fps))
+        text = f"t={_seconds_to_hms(seconds_from_start)}, frame={idx_from_start}"
+        text_size = cv2.getTextSize(text, _FONT, _FONT_SCALE, _FONT_THICKNESS)[0]
+        text_x = _TEXT_OFFSET
+        text_y = text_size[1] + _TEXT_OFFSET
+        pad = _TEXT_OFFSET // 2
+        # black box with a small padding around the text, in the upper-left corner
+        cv2.rectangle(
+            frame,
+            (text_x - pad, text_y + pad),
+            (text_x + text_size[0] + pad, text_y - text_size[1] - pad),
+            (0, 0, 0),
+            cv2.FILLED,
+        )
+        cv2.putText(
+            frame, text, (text_x, text_y), _FONT, _FONT_SCALE, (255, 255, 255), _FONT_THICKNESS,
+            lineType=cv2.LINE_AA,
+        )
+
+
+def _render_frames(
+    video_file: str,
+    output_file: str,
+    annotator: _FrameAnnotator,
+    output_fps: float,
+    frame_range: tuple[int, int | None],
+) -> int:
+    """Annotate and encode frames [start, end) of a video; returns the number of frames."""
+    start, end = frame_range
+    decoder = _SingleVideoDecoder(video_file)
+    # falls back to decoding from the beginning if the seek is inexact, so that the markers of
+    # frame `index` are drawn on frame `index`
+    decoder.seek(start)
+    encoder = _VideoEncoder(output_file, annotator.width, annotator.height, output_fps)
+    index = start
+    try:
+        while end is None or index < end:
+            frame = decoder.read()
+            if frame is None:
+                break
+            if frame.shape[1] != annotator.width or frame.shape[0] != annotator.height:
+                frame = cv2.resize(
+                    frame, (annotator.width, annotator.height), interpolation=cv2.INTER_CUBIC,
+                )
+            annotator.draw_markers(frame, index)
+            annotator.draw_timestamp(frame, index)
+            encoder.write(frame)
+            index += 1
+    finally:
+        decoder.release()
+        encoder.close()
+    return index - start
+
+
+def render_labeled_video(
+    video_file: str,
+    xs_arr: np.ndarray,
+    ys_arr: np.ndarray,
+    mask_array: np.ndarray | None = None,
+    dotsize: int = 4,
+    colormap: str | None = "cool",
+    fps: float | None = None,
+    output_video_path: str = "movie.mp4",
+    start_time: float = 0.0,
+    num_workers: int = 1,
+) -> None:
+    """Save a copy of a video with keypoint markers and timestamps drawn on every frame.
+
+    Args:
+        video_file: video to annotate
+        xs_arr: shape T x n_joints; row i holds the x coordinates for frame i
+        ys_arr: shape T x n_joints
+        mask_array: shape T x n_joints; timepoints/joints with a False entry will not be plotted
+        dotsize: size of marker dot on labeled video
+        colormap: matplotlib color map for markers
+        fps: frame rate of the labeled video; None to default to fps of original video
+        output_video_path: video file name
+        start_time: time (in seconds) of video start
+        num_workers: split the video into this many chunks that are rendered and encoded in
+            parallel processes, then concatenated; requires ffmpeg
+
+    """
+    if mask_array is None:
+        mask_array = ~np.isnan(xs_arr)
+    n_keypoints = xs_arr.shape[1]
+    colors = _make_cmap(n_keypoints, cmap=colormap)
+
+    metadata = get_video_metadata(video_file)
+    nx, ny = metadata.width, metadata.height
+    fps_og = metadata.fps or 20.0
+    frame_count = metadata.frame_count
+    print(
+        f"Duration of video [s]: {np.round(frame_count / fps_og, 2)}, "
+        f"recorded at {np.round(fps_og, 2)} fps!"
+    )
+
+    upsample_factor = _get_upsample_factor(nx, ny)
+    annotator = _FrameAnnotator(
+        xs_arr=xs_arr,
+        ys_arr=ys_arr,
+        mask_array=mask_array,
+        colors=colors,
+        dotsize=dotsize,
+        upsample_factor=upsample_factor,
+        width=int(upsample_factor * nx),
+        height=int(upsample_factor * ny),
+        fps=fps_og,
+        start_time=start_time,
+    )
+    output_fps = fps or fps_og
+
+    num_workers = min(num_workers, max(1, frame_count // 100))
+    if num_workers <= 1 or _get_ffmpeg_exe() is None:
+        _render_frames(video_file, output_video_path, annotator, output_fps, (0, None))
+        return
+
+    bounds = np.linspace(0, frame_count, num_workers + 1).round().astype(int)
+    # the final chunk reads until the end of the video, in case the frame count is inexact
+    frame_ranges = [(int(b), int(e)) for b, e in zip(bounds[:-2], bounds[1:-1])]
+    frame_ranges.append((int(bounds[-2]), None))
+    output_dir = os.path.dirname(os.path.abspath(output_video_path))
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir:
+        part_files = [os.path.join(tmp_dir, f"part{i}.mp4") for i in range(len(frame_ranges))]
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx) as pool:
+            futures = [
+                pool.submit(
+                    _render_frames, video_file, part_file, annotator, output_fps, frame_range,
+                )
+                for part_file, frame_range in zip(part_files, frame_ranges)
+            ]
+            for future in futures:
+                future.result()
+        list_file = os.path.join(tmp_dir, "parts.txt")
+        with open(list_file, "w") as f:
+            f.writelines(f"file '{part_file}'\n" for part_file in part_files)
+        # every part starts with a keyframe, so the streams are concatenated without re-encoding
+        subprocess.run(
+            [
+                _get_ffmpeg_exe(), "-y", "-loglevel", "error",
+                "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy",
+                output_video_path,
+            ],
+            check=True,
+        )
@@ -1,11 +1,15 @@
 """PCA class to assist with computing PCA losses."""
 
+import hashlib
+import json
+import os
 import warnings
+from pathlib import Path
 from typing import Literal
 
 import numpy as np
 import torch
-from omegaconf import ListConfig
+from omegaconf import ListConfig, OmegaConf
 from sklearn.decomposition import PCA
 from sklearn.decomposition._pca import _infer_dimension
 from sklearn.utils._array_api import _convert_to_numpy, get_namespace
@@ -42,7 +46,26 @@ class KeypointPCA(object):
         columns_for_singleview_pca: ListConfig | list | None = None,
         device: Literal["cuda", "cpu"] | torch.device = "cpu",
         centering_method: Literal["mean", "median"] | None = None,
+        cache_dir: str | Path | None = None,
     ) -> None:
+        """
+
+        Args:
+            loss_type: pca loss to compute parameters for
+            data_module: data module whose training labels are used to fit the pca
+            components_to_keep: number of components (int) or fraction of explained variance
+                (float) to keep; ignored for multiview pca, which always keeps 3 components
+            empirical_epsilon_percentile: percentile of the reprojection error on the training
+                labels used as epsilon
+            mirrored_column_matches: keypoint indices matched across views for multiview pca
+            columns_for_singleview_pca: keypoint indices used for singleview pca
+            device: device on which to store the pca parameters
+            centering_method: optionally center each pose before fitting singleview pca
+            cache_dir: if not None, fitted parameters are saved to (and loaded from) a
+                `pca_cache` directory inside `cache_dir`, keyed by a hash of the training labels
+                and the pca arguments
+
+        """
         self.loss_type = loss_type
         self.data_module = data_module
         self.components_to_keep = components_to_keep
@@ -66,6 +89,8 @@ class KeypointPCA(object):
         self.pca_object = None
         self.device = device
         self.centering_method = centering_method
+        self.cache_dir = cache_dir
+        self.data_arr = None
 
     def _get_data(self) -> None:
         self.data_arr, _ = DataExtractor(
@@ -231,8 +256,95 @@ class KeypointPCA(object):
 
         return reprojection_loss
 
+    def cache_key(self) -> str:
+        """Hash of the training labels and pca arguments that determine the fitted parameters."""
+        from lightning_pose.data.datasets import MultiviewHeatmapDataset
+
+        def _to_builtin(value):
+            if isinstance(value, ListConfig):
+                return OmegaConf.to_container(value)
+            return value
+
+        # epsilon is recomputed from the cached reprojection errors, so its percentile is not part
+        # of the key; multiview pca always keeps 3 components
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps({
+            "loss_type": self.loss_type,
+            "components_to_keep": (
+                self.components_to_keep if self.loss_type == "pca_singleview" else None
+            ),
+            "mirrored_column_matches": _to_builtin(self.mirrored_column_matches),
+            "columns_for_singleview_pca": _to_builtin(self.columns_for_singleview_pca),
+            "centering_method": self.centering_method,
+        }, sort_keys=True).encode())
+
+        # labels, image names and resize dims of each view
+        dataset = self.data_module.dataset
+        if isinstance(dataset, MultiviewHeatmapDataset):
+            datasets = [dataset.dataset[view] for view in dataset.view_names]
+        else:
+            datasets = [dataset]
+        for dset in datasets:
+            hasher.update(dset.keypoints.numpy().tobytes())
+            hasher.update("\n".join(map(str, dset.image_names)).encode())
+            hasher.update(f"{dset.height}x{dset.width}".encode())
+
+        # training split
+        train_dataset = self.data_module.train_dataset
+        if isinstance(train_dataset, torch.utils.data.Subset):
+            train_idxs = list(train_dataset.indices)
+        else:
+            train_idxs = list(range(len(train_dataset)))
+        hasher.update(np.asarray(train_idxs, dtype=np.int64).tobytes())
+
+        return hasher.hexdigest()[:16]
+
+    @property
+    def cache_file(self) -> Path | None:
+        if self.cache_dir is None:
+            return None
+        return Path(self.cache_dir) / "pca_cache" / f"{self.loss_type}_{self.cache_key()}.pt"
+
+    def _load_cached_parameters(self) -> bool:
+        cache_file = self.cache_file
+        if cache_file is None or not cache_file.is_file():
+            return False
+        cached = torch.load(cache_file, map_location="cpu", weights_only=True)
+        self._n_components_kept = cached["n_components_kept"]
+        self.parameters = {
+            key: val.to(self.device) for key, val in cached["parameters"].items()
+        }
+        self.parameters["epsilon"] = EmpiricalEpsilon(
+            percentile=self.empirical_epsilon_percentile
+        )(loss=cached["reprojection_error"])
+        print(f"Loaded cached {self.loss_type} parameters from {cache_file}")
+        return True
+
+    def _save_cached_parameters(self) -> None:
+        cache_file = self.cache_file
+        if cache_file is None:
+            return
+        cached = {
+            "n_components_kept": self._n_components_kept,
+            "parameters": {
+                key: self.parameters[key].cpu()
+                for key in ["mean", "kept_eigenvectors", "discarded_eigenvectors"]
+            },
+            # reprojection errors on the training labels, to compute epsilon for any percentile
+            "reprojection_error": self.compute_reprojection_error().cpu(),
+        }
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so that concurrent readers never see partial files
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        torch.save(cached, tmp_file)
+        os.replace(tmp_file, cache_file)
+
     def __call__(self) -> None:
 
+        # reuse parameters fit on the same labels with the same arguments
+        if self._load_cached_parameters():
+            return
+
         # save training data in self.data_arr
         self._get_data()
 
@@ -248,6 +360,7 @@ class KeypointPCA(object):
 
         # save all the meaningful quantities
         self._set_parameter_dict()
+        self._save_cached_parameters()
 
 
 class NaNPCA(PCA):
@@ -2,19 +2,23 @@
 
 from __future__ import annotations
 
-import datetime
+import copy
 import gc
+import multiprocessing
 import os
+import tempfile
 import warnings
+import weakref
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import TYPE_CHECKING, Tuple, Type
+from typing import TYPE_CHECKING, Any, Iterable, Tuple, Type
 
-import cv2
 import lightning.pytorch as pl
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import torch
+from lightning.fabric.utilities import move_data_to_device
+from lightning.pytorch.callbacks import BasePredictionWriter
 from moviepy import VideoFileClip
 from omegaconf import DictConfig, OmegaConf
 from torchtyping import TensorType
@@ -22,8 +26,11 @@ from typeguard import typechecked
 
 from lightning_pose.data.dali import PrepareDALI
 from lightning_pose.data.datamodules import BaseDataModule, UnlabeledDataModule
-from lightning_pose.data.utils import count_frames
+from lightning_pose.data.utils import get_video_metadata
+from lightning_pose.data.video_readers import PrepareOpenCV, get_video_reader
 from lightning_pose.models import ALLOWED_MODELS
+from lightning_pose.utils.io import save_predictions
+from lightning_pose.utils.labeled_video import render_labeled_video
 
 if TYPE_CHECKING:
     from lightning_pose.api.model import Model
@@ -31,6 +38,10 @@ if TYPE_CHECKING:
 # to ignore imports for sphix-autoapidoc
 __all__ = [
     "PredictionHandler",
+    "StreamingPredictionWriter",
+    "InferenceSession",
+    "get_default_devices",
+    "select_frames",
     "predict_dataset",
     "predict_single_video",
     "make_dlc_pandas_index",
@@ -81,12 +92,14 @@ class PredictionHandler:
         self.cfg = cfg
         self.data_module = data_module
         self.video_file = video_file
+        # the frame count is used several times while unpacking predictions; read it once
+        self.video_metadata = get_video_metadata(video_file) if video_file is not None else None
 
     @property
     def frame_count(self) -> int:
         """Returns the number of frames in the video or the labeled dataset"""
-        if self.video_file is not None:
-            return count_frames(self.video_file)
+        if self.video_metadata is not None:
+            return self.video_metadata.frame_count
         else:
             return len(self.data_module.dataset)
 
@@ -255,6 +268,51 @@ class PredictionHandler:
 
         """
         stacked_preds, stacked_confs = self.unpack_preds(preds=preds)
+        return self.make_prediction_dfs(
+            stacked_preds, stacked_confs, is_multiview_video=is_multiview_video,
+        )
+
+    def make_prediction_dfs(
+        self,
+        stacked_preds: TensorType["num_frames", "two_times_num_keypoints"],
+        stacked_confs: TensorType["num_frames", "num_keypoints"],
+        is_multiview_video: bool = False,
+    ) -> pd.DataFrame | dict[str, pd.DataFrame]:
+        """Build the prediction dataframe(s) from already unpacked predictions and confidences.
+
+        Args:
+            stacked_preds: one row of (x, y) coordinates per frame
+            stacked_confs: one row of confidences per frame
+            is_multiview_video: specify True when you are using multiview video prediction
+                dataloader, i.e. for heatmap_multiview.
+
+        Returns:
+            pd.DataFrame: index is (frame, bodypart, x, y, likelihood)
+
+        """
+        pred_arr = self.make_pred_arr_undo_resize(
+            stacked_preds.cpu().numpy(), stacked_confs.cpu().numpy()
+        )
+        return self.make_prediction_dfs_from_array(pred_arr, is_multiview_video=is_multiview_video)
+
+    def make_prediction_dfs_from_array(
+        self,
+        pred_arr: np.ndarray,
+        is_multiview_video: bool = False,
+    ) -> pd.DataFrame | dict[str, pd.DataFrame]:
+        """Build the prediction dataframe(s) on top of an array of predictions, without copying it.
+
+        Args:
+            pred_arr: output of :meth:`make_pred_arr_undo_resize`, or of
+                :meth:`StreamingPredictionWriter.finalize`; for multiview models the columns of
+                the views are concatenated in the order of `cfg.data.view_names`
+            is_multiview_video: specify True when you are using multiview video prediction
+                dataloader, i.e. for heatmap_multiview.
+
+        Returns:
+            pd.DataFrame: index is (frame, bodypart, x, y, likelihood)
+
+        """
         if (
             self.cfg.data.get("view_names", None)
             and len(self.cfg.data.view_names) > 1
@@ -268,13 +326,10 @@ class PredictionHandler:
             for view_idx, view_name in enumerate(self.cfg.data.view_names):
                 idx_beg = view_idx * num_keypoints
                 idx_end = idx_beg + num_keypoints
-                stacked_preds_single = stacked_preds[:, idx_beg * 2:idx_end * 2]
-                stacked_confs_single = stacked_confs[:, idx_beg:idx_end]
-                pred_arr = self.make_pred_arr_undo_resize(
-                    stacked_preds_single.cpu().numpy(), stacked_confs_single.cpu().numpy()
-                )
                 pdindex = self.make_dlc_pandas_index(self.keypoint_names)
-                df = pd.DataFrame(pred_arr, columns=pdindex)
+                df = pd.DataFrame(
+                    pred_arr[:, idx_beg * 3:idx_end * 3], columns=pdindex, copy=False,
+                )
                 view_to_df[view_name] = df
                 if self.video_file is None:
                     # specify which image is train/test/val/unused
@@ -282,11 +337,8 @@ class PredictionHandler:
                     df.index = self.data_module.dataset.dataset[view_name].image_names
             retval = view_to_df
         else:
-            pred_arr = self.make_pred_arr_undo_resize(
-                stacked_preds.cpu().numpy(), stacked_confs.cpu().numpy()
-            )
             pdindex = self.make_dlc_pandas_index()
-            df = pd.DataFrame(pred_arr, columns=pdindex)
+            df = pd.DataFrame(pred_arr, columns=pdindex, copy=False)
             if self.video_file is None:
                 # specify which image is train/test/val/unused
                 df = self.add_split_indices_to_df(df)
@@ -296,6 +348,217 @@ class PredictionHandler:
         return retval
 
 
+class StreamingPredictionWriter(BasePredictionWriter):
+    """Write video predictions to an on-disk array as each batch is predicted.
+
+    Replaces `trainer.predict(..., return_predictions=True)` for long videos: instead of keeping
+    every batch output until the end of the video, each batch of keypoints and confidences is
+    written into a float32 memory-mapped array with one row per video frame, in the column order
+    of :meth:`PredictionHandler.make_pred_arr_undo_resize`. For context models the two-frame
+    shift of :meth:`PredictionHandler.fix_context_preds_confs` is applied while writing, and the
+    edge frames are filled in by :meth:`finalize`.
+
+    """
+
+    def __init__(
+        self,
+        array_file: str,
+        frame_count: int,
+        do_context: bool = False,
+        zero_pad_confidence: bool = False,
+    ) -> None:
+        """
+
+        Args:
+            array_file: path of the temporary .npy file that backs the memory-mapped array
+            frame_count: number of frames in the video
+            do_context: True for context models, whose outputs are shifted by two frames
+            zero_pad_confidence: zero out confidences of the first and last two frames of
+                context models
+
+        """
+        super().__init__(write_interval="batch")
+        self.array_file = array_file
+        self.frame_count = frame_count
+        self.do_context = do_context
+        self.zero_pad_confidence = zero_pad_confidence
+        self.num_keypoints = None
+        self.rows_seen = 0
+        self._arr = None
+        self._first_row = None
+
+    def write_on_batch_end(
+        self,
+        trainer: pl.Trainer,
+        pl_module: pl.LightningModule,
+        prediction: Tuple[torch.Tensor, torch.Tensor],
+        batch_indices: list[int] | None,
+        batch: Any,
+        batch_idx: int,
+        dataloader_idx: int,
+    ) -> None:
+        preds = prediction[0].float().cpu().numpy()
+        confs = prediction[1].float().cpu().numpy()
+        if self._arr is None:
+            self.num_keypoints = confs.shape[1]
+            self._arr = np.lib.format.open_memmap(
+                self.array_file,
+                mode="w+",
+                dtype=np.float32,
+                shape=(self.frame_count, 3 * self.num_keypoints),
+            )
+        rows = np.empty((preds.shape[0], 3 * self.num_keypoints), dtype=np.float32)
+        rows[:, 0::3] = preds[:, 0::2]
+        rows[:, 1::3] = preds[:, 1::2]
+        rows[:, 2::3] = confs
+        if self._first_row is None:
+            self._first_row = rows[0].copy()
+        # in the context model, output row 0 is associated with frame 2
+        beg = self.rows_seen + (2 if self.do_context else 0)
+        end = min(beg + rows.shape[0], self.frame_count)
+        if end > beg:
+            self._arr[beg:end] = rows[:end - beg]
+        self.rows_seen += rows.shape[0]
+
+    def finalize(self) -> np.ndarray:
+        """Fill in the edge frames and return the memory-mapped array without loading it.
+
+        Returns:
+            float32 array of shape (n_frames, 3 * n_keypoints); cols are
+            (bp0_x, bp0_y, bp0_likelihood, bp1_x, bp1_y, ...)
+
+        """
+        if self._arr is None:
+            raise RuntimeError("no predictions were written")
+        # chop extra rows from the padded final sequence
+        n_rows = min(self.rows_seen, self.frame_count)
+        if self.do_context:
+            # no valid predictions for the first two frames; copy the prediction for frame 2
+            self._arr[:2] = self._first_row
+            if n_rows == self.frame_count:
+                # no valid predictions for the last two frames; copy the third to last frame
+                self._arr[-2:] = self._arr[-3]
+            else:
+                # fewer predictions than frames; pad with the first valid prediction
+                self._arr[n_rows:] = self._first_row
+            n_rows = self.frame_count
+            if self.zero_pad_confidence:
+                self._arr[:2, 2::3] = 0.0
+                self._arr[-2:, 2::3] = 0.0
+        self._arr.flush()
+        return self._arr[:n_rows]
+
+    def cleanup(self) -> None:
+        """Remove the on-disk array.
+
+        Arrays returned by :meth:`finalize` stay readable: the file is unlinked while mapped, or
+        on Windows, where mapped files cannot be removed, once the last reference is dropped.
+
+        """
+        arr, self._arr = self._arr, None
+        if not os.path.exists(self.array_file):
+            return
+        try:
+            os.remove(self.array_file)
+        except PermissionError:
+            if arr is None:
+                raise
+            weakref.finalize(arr, _remove_file, self.array_file)
+
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def get_default_devices() -> list[str]:
+    """All visible gpus, or the cpu if there are none."""
+    if torch.cuda.is_available():
+        return [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+    return ["cpu"]
+
+
+class InferenceSession:
+    """Run prediction with a model that stays on its device, without a Lightning Trainer.
+
+    Constructing a `pl.Trainer` and tearing down the model after every call dominates the run
+    time when predicting on many short videos. A session moves the model to the device once,
+    keeps it in eval mode, and runs `predict_step` directly on each batch. Objects that only
+    depend on the model (e.g. the data modules used to compute PCA metrics) can be stored in
+    `data_modules` and reused across calls.
+
+    Sessions are usually created through :meth:`lightning_pose.api.model.Model.inference_session`.
+
+    """
+
+    def __init__(
+        self,
+        model: ALLOWED_MODELS,
+        device: str | torch.device | None = None,
+        decoder: str | None = None,
+    ) -> None:
+        """
+
+        Args:
+            model: Lightning Module used for prediction
+            device: device to run the model on; defaults to the first gpu if available
+            decoder: heatmap decoder used by the model head during the session, "full" or
+                "local"; defaults to the decoder the model was loaded with
+
+        """
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
+        self.model = model.to(self.device)
+        self.model.eval()
+        self.has_decoder = hasattr(getattr(self.model, "head", None), "decoder")
+        self._decoder_orig = self.model.head.decoder if self.has_decoder else None
+        if decoder is not None:
+            if not self.has_decoder:
+                raise ValueError(f"{type(model).__name__} does not use a heatmap decoder")
+            self.model.head.decoder = decoder
+        # per-model objects reused across calls, keyed by the caller
+        self.data_modules: dict[str, BaseDataModule] = {}
+
+    def predict(
+        self,
+        dataloader: Iterable,
+        writer: StreamingPredictionWriter | None = None,
+        return_predictions: bool = True,
+    ) -> list[Tuple[torch.Tensor, torch.Tensor]] | None:
+        """Predict on all batches of a data loader; mirrors `trainer.predict`.
+
+        Args:
+            dataloader: labeled image data loader, or a DALI/OpenCV video loader
+            writer: optional writer that receives the outputs of each batch
+            return_predictions: return the list of batch outputs
+
+        Returns:
+            list of (keypoints, confidences) tuples, one per batch, if `return_predictions`
+
+        """
+        predictions = []
+        with torch.inference_mode():
+            for batch_idx, batch in enumerate(dataloader):
+                batch = move_data_to_device(batch, self.device)
+                outputs = self.model.predict_step(batch, batch_idx)
+                if writer is not None:
+                    writer.write_on_batch_end(
+                        None, self.model, outputs, None, batch, batch_idx, 0,
+                    )
+                if return_predictions:
+                    predictions.append(outputs)
+        return predictions if return_predictions else None
+
+    def close(self) -> None:
+        """Restore the model decoder and release cached objects and device memory."""
+        if self.has_decoder:
+            self.model.head.decoder = self._decoder_orig
+        self.data_modules.clear()
+        gc.collect()
+        torch.cuda.empty_cache()
+
+
 @typechecked
 def predict_dataset(
     cfg: DictConfig,
@@ -304,6 +567,7 @@ def predict_dataset(
     ckpt_file: str | None = None,
     trainer: pl.Trainer | None = None,
     model: ALLOWED_MODELS | None = None,
+    session: InferenceSession | None = None,
 ) -> pd.DataFrame | dict[str, pd.DataFrame]:
     """Save predicted keypoints for a labeled dataset.
 
@@ -314,6 +578,8 @@ def predict_dataset(
         ckpt_file: absolute path to the checkpoint of your trained model; requires .ckpt suffix
         trainer: pl.Trainer object
         model: Lightning Module
+        session: predict with the session model instead of a trainer; `ckpt_file`, `trainer`
+            and `model` are ignored
 
     Returns:
         pandas dataframe with predictions or dict with dataframe of predictions for each view
@@ -321,30 +587,36 @@ def predict_dataset(
     """
 
     delete_model = False
-    if model is None:
-        model = load_model_from_checkpoint(
-            cfg=cfg, ckpt_file=ckpt_file, eval=True, data_module=data_module,
-        )
-        delete_model = True
-
     delete_trainer = False
-    if trainer is None:
-        trainer = pl.Trainer(devices=1, accelerator="auto", logger=False)
-        delete_trainer = True
+    if session is not None:
+        labeled_preds = session.predict(data_module.full_labeled_dataloader())
+    else:
+        if model is None:
+            model = load_model_from_checkpoint(
+                cfg=cfg, ckpt_file=ckpt_file, eval=True, data_module=data_module,
+            )
+            delete_model = True
 
-    labeled_preds = trainer.predict(
-        model=model,
-        dataloaders=data_module.full_labeled_dataloader(),
-        return_predictions=True,
-    )
+        if trainer is None:
+            trainer = pl.Trainer(devices=1, accelerator="auto", logger=False)
+            delete_trainer = True
+
+        labeled_preds = trainer.predict(
+            model=model,
+            dataloaders=data_module.full_labeled_dataloader(),
+            return_predictions=True,
+        )
 
     pred_handler = PredictionHandler(cfg=cfg, data_module=data_module, video_file=None)
     labeled_preds_df = pred_handler(preds=labeled_preds)
+    prediction_format = cfg.eval.get("prediction_format", "csv")
     if isinstance(labeled_preds_df, dict):
         if isinstance(preds_file, str):
             # old logic used to save to <predictions>_<view_name>.csv
             for view_name, df in labeled_preds_df.items():
-                df.to_csv(preds_file.replace(".csv", f"_{view_name}.csv"))
+                save_predictions(
+                    df, preds_file.replace(".csv", f"_{view_name}.csv"), prediction_format,
+                )
         elif isinstance(preds_file, list):
             # preds_file is a list of views corresponding to cfg.data.view_names.
             # this allows the caller to specify the output locations more flexibly.
@@ -353,18 +625,19 @@ def predict_dataset(
             assert list(labeled_preds_df.keys()) == list(cfg.data.view_names)
 
             for (view_name, df), _pred_file in zip(labeled_preds_df.items(), preds_file):
-                df.to_csv(_pred_file)
+                save_predictions(df, _pred_file, prediction_format)
 
     else:
-        labeled_preds_df.to_csv(preds_file)
+        save_predictions(labeled_preds_df, preds_file, prediction_format)
 
-    # clear up memory
+    # clear up memory; sessions keep the model warm until they are closed
     if delete_model:
         del model
     if delete_trainer:
         del trainer
-    gc.collect()
-    torch.cuda.empty_cache()
+    if session is None:
+        gc.collect()
+        torch.cuda.empty_cache()
 
     return labeled_preds_df
 
@@ -456,7 +729,7 @@ def predict_single_video(
     preds_df = pred_handler(preds=preds)
     # save the predictions to a csv; create directory if it doesn't exist
     os.makedirs(os.path.dirname(preds_file), exist_ok=True)
-    preds_df.to_csv(preds_file)
+    save_predictions(preds_df, preds_file, cfg.eval.get("prediction_format", "csv"))
 
     # clear up memory
     if delete_model:
@@ -634,6 +907,10 @@ def load_model_from_checkpoint(
         import os
         os.unlink(fixed_ckpt_file)
 
+    # the heatmap decoder is not stored in the checkpoint, so it can be changed for inference
+    if hasattr(getattr(model, "head", None), "decoder"):
+        model.head.decoder = cfg.model.get("heatmap_decoder", "full")
+
     if eval:
         model.eval()
 
@@ -648,17 +925,9 @@ def load_model_from_checkpoint(
     return model
 
 
-@typechecked
-def _make_cmap(number_colors: int, cmap: str):
-    color_class = plt.cm.ScalarMappable(cmap=cmap)
-    C = color_class.to_rgba(np.linspace(0, 1, number_colors))
-    colors = (C[:, :3] * 255).astype(np.uint8)
-    return colors
-
-
 @typechecked
 def create_labeled_video(
-    clip: VideoFileClip,
+    clip: VideoFileClip | str,
     xs_arr: np.ndarray,
     ys_arr: np.ndarray,
     mask_array: np.ndarray | None = None,
@@ -667,10 +936,11 @@ def create_labeled_video(
     fps: float | None = None,
     output_video_path: str = "movie.mp4",
     start_time: float = 0.0,
+    num_workers: int = 1,
 ) -> None:
     """Helper function for creating annotated videos.
     Args
-        clip
+        clip: path of the video, or a moviepy clip of it
         xs_arr: shape T x n_joints
         ys_arr: shape T x n_joints
         mask_array: shape T x n_joints; timepoints/joints with a False entry will not be plotted
@@ -679,115 +949,20 @@ def create_labeled_video(
         fps: None to default to fps of original video
         output_video_path: video file name
         start_time: time (in seconds) of video start
+        num_workers: number of processes that render and encode chunks of the video
     """
-
-    if mask_array is None:
-        mask_array = ~np.isnan(xs_arr)
-
-    n_frames, n_keypoints = xs_arr.shape
-
-    # set colormap for each color
-    colors = _make_cmap(n_keypoints, cmap=colormap)
-
-    # extract info from clip
-    nx, ny = clip.size
-    dur = int(clip.duration - clip.start)
-    fps_og = clip.fps
-
-    # upsample clip if low resolution; need to do this for dots and text to look nice
-    if nx <= 100 or ny <= 100:
-        upsample_factor = 2.5
-    elif nx <= 192 or ny <= 192:
-        upsample_factor = 2
-    else:
-        upsample_factor = 1
-
-    if upsample_factor > 1:
-        clip = clip.resized((upsample_factor * nx, upsample_factor * ny))
-        nx, ny = clip.size
-
-    print(f"Duration of video [s]: {np.round(dur, 2)}, recorded at {np.round(fps_og, 2)} fps!")
-
-    def seconds_to_hms(seconds):
-        # Convert seconds to a timedelta object
-        td = datetime.timedelta(seconds=seconds)
-
-        # Extract hours, minutes, and seconds from the timedelta object
-        hours = td // datetime.timedelta(hours=1)
-        minutes = (td // datetime.timedelta(minutes=1)) % 60
-        seconds = td % datetime.timedelta(minutes=1)
-
-        # Format the hours, minutes, and seconds into a string
-        hms_str = f"{hours:02}:{minutes:02}:{seconds.seconds:02}"
-
-        return hms_str
-
-    # add marker to each frame t, where t is in sec
-    def add_marker_and_timestamps(get_frame, t):
-        image = get_frame(t)
-        # frame [ny x ny x 3]
-        frame = image.copy()
-        # convert from sec to indices
-        index = int(np.round(t * fps_og))
-        # ----------------
-        # markers
-        # ----------------
-        if index >= n_frames:
-            print(f"add_marker_and_timestamps: Skipped frame {index}")
-        else:
-            for bpindex in range(n_keypoints):
-                if mask_array[index, bpindex]:
-                    xc = min(int(upsample_factor * xs_arr[index, bpindex]), nx - 1)
-                    yc = min(int(upsample_factor * ys_arr[index, bpindex]), ny - 1)
-                    frame = cv2.circle(
-                        frame,
-                        center=(xc, yc),
-                        radius=dotsize,
-                        color=colors[bpindex].tolist(),
-                        thickness=-1,
-                    )
-        # ----------------
-        # timestamps
-        # ----------------
-        seconds_from_start = t + start_time
-        time_from_start = seconds_to_hms(seconds_from_start)
-        idx_from_start = int(np.round(seconds_from_start * fps_og))
-        text = f"t={time_from_start}, frame={idx_from_start}"
-        # define text info
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.5
-        font_thickness = 1
-        # calculate the size of the text
-        text_size = cv2.getTextSize(text, font, font_scale, font_thickness)[0]
-        # calculate the position of the text in the upper-left corner
-        offset = 6
-        text_x = offset  # offset from the left
-        text_y = text_size[1] + offset  # offset from the bottom
-        # make black rectangle with a small padding of offset / 2 pixels
-        cv2.rectangle(
-            frame,
-            (text_x - int(offset / 2), text_y + int(offset / 2)),
-            (text_x + text_size[0] + int(offset / 2), text_y - text_size[1] - int(offset / 2)),
-            (0, 0, 0),  # rectangle color
-            cv2.FILLED,
-        )
-        cv2.putText(
-            frame,
-            text,
-            (text_x, text_y),
-            font,
-            font_scale,
-            (255, 255, 255),  # font color
-            font_thickness,
-            lineType=cv2.LINE_AA,
-        )
-        return frame
-
-    clip_marked = clip.transform(add_marker_and_timestamps)
-    clip_marked.write_videofile(
-        output_video_path, codec="libx264", fps=fps or fps_og or 20.0
+    render_labeled_video(
+        video_file=clip if isinstance(clip, str) else clip.filename,
+        xs_arr=xs_arr,
+        ys_arr=ys_arr,
+        mask_array=mask_array,
+        dotsize=dotsize,
+        colormap=colormap,
+        fps=fps,
+        output_video_path=output_video_path,
+        start_time=start_time,
+        num_workers=num_workers,
     )
-    clip_marked.close()
 
 
 @typechecked
@@ -830,7 +1005,8 @@ def export_predictions_and_labeled_video(
             preds_df=preds_df,
             output_mp4_file=labeled_mp4_file,
             confidence_thresh_for_vid=cfg.eval.confidence_thresh_for_vid,
-            colormap=cfg.eval.get("colormap", "cool")
+            colormap=cfg.eval.get("colormap", "cool"),
+            num_workers=cfg.eval.get("labeled_video_num_workers", 1),
         )
     return preds_df
 
@@ -841,22 +1017,25 @@ def generate_labeled_video(
     output_mp4_file: str,
     confidence_thresh_for_vid: float,
     colormap: str,
+    num_workers: int = 1,
 ):
     os.makedirs(os.path.dirname(output_mp4_file), exist_ok=True)
+    # predictions on a subset of frames: frames without predictions get no markers (nan)
+    preds_df = preds_df.reindex(range(preds_df.index.max() + 1))
     # transform df to numpy array
     keypoints_arr = np.reshape(preds_df.to_numpy(), [preds_df.shape[0], -1, 3])
     xs_arr = keypoints_arr[:, :, 0]
     ys_arr = keypoints_arr[:, :, 1]
     mask_array = keypoints_arr[:, :, 2] > confidence_thresh_for_vid
     # video generation
-    video_clip = VideoFileClip(video_file)
-    create_labeled_video(
-        clip=video_clip,
+    render_labeled_video(
+        video_file=video_file,
         xs_arr=xs_arr,
         ys_arr=ys_arr,
         mask_array=mask_array,
         output_video_path=output_mp4_file,
         colormap=colormap,
+        num_workers=num_workers,
     )
 
 
@@ -864,6 +1043,14 @@ def predict_video(
     video_file: str | list[str],
     model: Model,
     output_pred_file: str | list[str] | None = None,
+    streaming: bool | None = None,
+    session: InferenceSession | None = None,
+    num_shards: int = 1,
+    devices: list[str] | None = None,
+    start_frame: int = 0,
+    end_frame: int | None = None,
+    stride: int = 1,
+    bboxes: np.ndarray | None = None,
 ) -> pd.DataFrame | list[pd.DataFrame]:
     """
     Args:
@@ -872,6 +1059,28 @@ def predict_video(
         model: The model to predict with.
         output_pred_file: (optional) File to save predictions in.
             For multiview, a list of files (1-1 correspondance to cfg.data.view_names).
+        streaming: write each batch of predictions to disk as it is computed rather than
+            accumulating all batch outputs in memory; recommended for long videos.
+            Defaults to `cfg.eval.streaming_predictions` (False if missing).
+        session: (optional) predict with a persistent inference session instead of constructing
+            a Lightning Trainer; see `Model.inference_session`.
+        num_shards: split the video into this many frame ranges that are predicted in parallel
+            worker processes, then stitched; predictions are identical to those of a single
+            process. Requires the OpenCV video reader (`dali.predict_reader: opencv`); batch
+            outputs of the shards are always gathered in memory.
+        devices: devices assigned round-robin to the shard workers, e.g. ["cuda:0", "cuda:1"];
+            defaults to all visible gpus, or the cpu if there are none
+        start_frame: first frame to predict on
+        end_frame: predict on frames before this one; defaults to the end of the video
+        stride: predict on every `stride`-th frame from `start_frame`
+            When predicting on a subset of frames, the rows of the returned dataframe(s) are
+            indexed by frame number, frames are always read with OpenCV, and predictions are
+            gathered in memory; context models see the same neighboring frames as in full
+            video prediction.
+        bboxes: shape (num_frames, 4); crop every frame to its x, y, h, w bounding box (e.g.
+            computed from the predictions of a detector model) before resizing, and return
+            keypoints in the coordinates of the original frames. Frames are always read with
+            OpenCV. Single view videos only; cannot be combined with a subset of frames.
     """
 
     is_multiview = not isinstance(video_file, str)
@@ -893,24 +1102,11 @@ def predict_video(
                 view_name in Path(single_video_file).stem
             ), "expected video_file to correspond 1-1 with cfg.data.view_name"
 
-    trainer = pl.Trainer(accelerator="gpu", devices=1, logger=False)
-    model_type = "context" if model.config.cfg.model.model_type == "heatmap_mhcrnn" else "base"
+    if streaming is None:
+        streaming = model.config.cfg.eval.get("streaming_predictions", False)
 
-    filenames = [video_file] if not is_multiview else [[f] for f in video_file]
-    vid_pred_class = PrepareDALI(
-        train_stage="predict",
-        model_type=model_type,
-        dali_config=model.config.cfg.dali,
-        # Important: This will be a list of lists for multiview.
-        # This will trigger dali to return multiview batches to predict_step.
-        filenames=filenames,
-        resize_dims=[
-            model.config.cfg.data.image_resize_dims.height,
-            model.config.cfg.data.image_resize_dims.width,
-        ],
-    )
-    # get loader
-    predict_loader = vid_pred_class()
+    if bboxes is not None and is_multiview:
+        raise ValueError("cropping frames to bboxes is not supported for multiview videos")
 
     # initialize prediction handler class
     pred_handler = PredictionHandler(
@@ -918,14 +1114,99 @@ def predict_video(
         video_file=video_file[0] if is_multiview else video_file,
     )
 
-    # compute predictions
-    preds = trainer.predict(
-        model=model.model,
-        dataloaders=predict_loader,
-        return_predictions=True,
+    frame_indices = select_frames(pred_handler.frame_count, start_frame, end_frame, stride)
+    if frame_indices is not None:
+        if bboxes is not None:
+            raise ValueError("cropping frames to bboxes is not supported for a subset of frames")
+        # subsets of frames are read with opencv, and are small enough to gather in memory
+        video_reader = "opencv"
+        streaming = False
+    elif bboxes is not None:
+        # frames are cropped on the cpu
+        video_reader = "opencv"
+    else:
+        video_reader = get_video_reader(model.config.cfg.dali)
+    if num_shards > 1 and video_reader != "opencv":
+        raise ValueError("sharded video prediction requires `dali.predict_reader: opencv`")
+
+    filenames = [video_file] if not is_multiview else [[f] for f in video_file]
+    vid_pred_class = _get_video_pred_class(
+        model.config.cfg, filenames, frame_indices=frame_indices, bboxes=bboxes,
     )
+    # get loader
+    predict_loader = vid_pred_class()
+
+    # the opencv reader decodes on the cpu, so the model can run on whatever device is available
+    accelerator = "gpu" if video_reader == "dali" else "auto"
 
-    preds_df = pred_handler(preds=preds, is_multiview_video=is_multiview)
+    # compute predictions
+    trainer = None
+    preds = None  # batch outputs gathered in memory; unused when streaming
+    if num_shards > 1:
+        preds = predict_video_shards(
+            cfg=model.config.cfg,
+            model=session.model if session is not None else model.model,
+            filenames=filenames,
+            num_shards=num_shards,
+            devices=devices,
+            frame_indices=frame_indices,
+            bboxes=bboxes,
+        )
+    elif streaming:
+        first_video = video_file[0] if is_multiview else video_file
+        if output_pred_file is not None:
+            first_output = output_pred_file[0] if is_multiview else output_pred_file
+            os.makedirs(os.path.dirname(first_output), exist_ok=True)
+            array_file = first_output + ".tmp.npy"
+        else:
+            array_file = os.path.join(
+                tempfile.gettempdir(), f"{Path(first_video).stem}_{os.getpid()}.tmp.npy"
+            )
+        writer = StreamingPredictionWriter(
+            array_file=array_file,
+            frame_count=pred_handler.frame_count,
+            do_context=pred_handler.do_context,
+            zero_pad_confidence=model.config.cfg.model.model_type != "heatmap_mhcrnn",
+        )
+        try:
+            if session is not None:
+                session.predict(predict_loader, writer=writer, return_predictions=False)
+            else:
+                trainer = pl.Trainer(
+                    accelerator=accelerator, devices=1, logger=False, callbacks=[writer]
+                )
+                trainer.predict(
+                    model=model.model,
+                    dataloaders=predict_loader,
+                    return_predictions=False,
+                )
+            # the dataframes are views of the memory-mapped array, which is never loaded at once;
+            # `save_predictions` writes it in chunks
+            preds_df = pred_handler.make_prediction_dfs_from_array(
+                writer.finalize(), is_multiview_video=is_multiview,
+            )
+        finally:
+            writer.cleanup()
+    else:
+        if session is not None:
+            preds = session.predict(predict_loader)
+        else:
+            trainer = pl.Trainer(accelerator=accelerator, devices=1, logger=False)
+            preds = trainer.predict(
+                model=model.model,
+                dataloaders=predict_loader,
+                return_predictions=True,
+            )
+    if preds is not None:
+        if frame_indices is None:
+            preds_df = pred_handler(preds=preds, is_multiview_video=is_multiview)
+        else:
+            # one output row per selected frame; no edges or padding to fix
+            preds_df = pred_handler.make_prediction_dfs(
+                torch.vstack([p[0] for p in preds]),
+                torch.vstack([p[1] for p in preds]),
+                is_multiview_video=is_multiview,
+            )
 
     # Convert to a 1-1 correspondence list similar to video_files, for multiview.
     if isinstance(preds_df, dict):
@@ -933,21 +1214,185 @@ def predict_video(
             preds_df[view_name] for view_name in model.config.cfg.data.view_names
         ]
 
+    if frame_indices is not None:
+        for df in preds_df if is_multiview else [preds_df]:
+            df.index = frame_indices
+
     if output_pred_file is not None:
         # save the predictions to a csv; create directory if it doesn't exist
-
+        prediction_format = model.config.cfg.eval.get("prediction_format", "csv")
         if is_multiview:
             for df, output_file in zip(preds_df, output_pred_file):
                 os.makedirs(os.path.dirname(output_file), exist_ok=True)
-                df.to_csv(output_file)
+                save_predictions(df, output_file, prediction_format)
         else:
-            preds_df.to_csv(output_pred_file)
+            save_predictions(preds_df, output_pred_file, prediction_format)
 
-    # clear up memory
-    del model
-    del trainer
+    # clear up memory; sessions keep the model warm until they are closed
     del predict_loader
-    gc.collect()
-    torch.cuda.empty_cache()
+    if session is None:
+        del model
+        del trainer
+        gc.collect()
+        torch.cuda.empty_cache()
 
     return preds_df
+
+
+def select_frames(
+    frame_count: int,
+    start_frame: int = 0,
+    end_frame: int | None = None,
+    stride: int = 1,
+) -> np.ndarray | None:
+    """Indices of the frames in `range(start_frame, end_frame, stride)`.
+
+    Returns:
+        increasing frame indices, or None if all frames of the video are selected
+
+    """
+    end_frame = frame_count if end_frame is None else min(end_frame, frame_count)
+    if stride < 1:
+        raise ValueError(f"stride must be a positive integer, not {stride}")
+    if not 0 <= start_frame < end_frame:
+        raise ValueError(
+            f"invalid frame range [{start_frame}, {end_frame}) for a video with {frame_count} "
+            "frames"
+        )
+    if start_frame == 0 and end_frame == frame_count and stride == 1:
+        return None
+    return np.arange(start_frame, end_frame, stride)
+
+
+def _get_video_pred_class(
+    cfg: DictConfig,
+    filenames: list[str] | list[list[str]],
+    sequence_range: tuple[int, int] | None = None,
+    frame_indices: np.ndarray | None = None,
+    bboxes: np.ndarray | None = None,
+) -> PrepareDALI | PrepareOpenCV:
+    """Build the video loader factory for the reader selected by `cfg.dali.predict_reader`.
+
+    Subsets of frames (`frame_indices`) and frames cropped to `bboxes` are always read with
+    OpenCV.
+
+    """
+    model_type = "context" if cfg.model.model_type == "heatmap_mhcrnn" else "base"
+    resize_dims = [cfg.data.image_resize_dims.height, cfg.data.image_resize_dims.width]
+    if frame_indices is None and bboxes is None and get_video_reader(cfg.dali) == "dali":
+        if sequence_range is not None:
+            raise NotImplementedError("the DALI reader does not support sequence ranges")
+        return PrepareDALI(
+            train_stage="predict",
+            model_type=model_type,
+            dali_config=cfg.dali,
+            # Important: This will be a list of lists for multiview.
+            # This will trigger dali to return multiview batches to predict_step.
+            filenames=filenames,
+            resize_dims=resize_dims,
+        )
+    return PrepareOpenCV(
+        model_type=model_type,
+        dali_config=cfg.dali,
+        filenames=filenames,
+        resize_dims=resize_dims,
+        num_threads=cfg.dali.get("predict_num_threads", None),
+        sequence_range=sequence_range,
+        frame_indices=frame_indices,
+        bboxes=bboxes,
+    )
+
+
+def predict_video_shards(
+    cfg: DictConfig,
+    model: ALLOWED_MODELS,
+    filenames: list[str] | list[list[str]],
+    num_shards: int,
+    devices: list[str] | None = None,
+    frame_indices: np.ndarray | None = None,
+    bboxes: np.ndarray | None = None,
+) -> list[Tuple[torch.Tensor, torch.Tensor]]:
+    """Predict on a video split into contiguous shards of frame sequences, one per process.
+
+    Shard boundaries fall on the starts of the sequences that a single video loader would
+    produce, so every shard builds exactly the same batches (including the overlapping context
+    frames of context models, and the zero-padded final sequence). The concatenated batch outputs
+    are therefore identical to those of the serial loader, and can be unpacked with a single
+    `PredictionHandler`, which handles the edges of the video.
+
+    Args:
+        cfg: model config
+        model: Lightning Module; copied to every worker process
+        filenames: list containing a single video path, or for multiview a list of lists
+        num_shards: number of shards (and worker processes)
+        devices: devices assigned round-robin to the workers; defaults to all visible gpus, or
+            the cpu if there are none
+        frame_indices: only predict on these frames; shards are then split into batches of
+            selected frames
+        bboxes: crop every frame to its x, y, h, w bounding box before resizing
+
+    Returns:
+        list of (keypoints, confidences) batch outputs on the cpu, in video order
+
+    """
+    num_sequences = _get_video_pred_class(
+        cfg, filenames, frame_indices=frame_indices, bboxes=bboxes,
+    ).num_iters
+    bounds = np.linspace(0, num_sequences, min(num_shards, num_sequences) + 1).round()
+    shards = [(int(b), int(e)) for b, e in zip(bounds[:-1], bounds[1:])]
+    devices = devices or get_default_devices()
+
+    # cuda cannot be re-initialized in forked processes
+    ctx = multiprocessing.get_context("spawn")
+    device_queue = ctx.Queue()
+    for i in range(len(shards)):
+        device_queue.put(devices[i % len(devices)])
+    model_cpu = copy.deepcopy(model).cpu()
+    with ProcessPoolExecutor(
+        max_workers=len(shards),
+        mp_context=ctx,
+        initializer=_init_shard_worker,
+        initargs=(model_cpu, cfg, device_queue, len(shards)),
+    ) as pool:
+        futures = [
+            pool.submit(_predict_shard, filenames, shard, frame_indices, bboxes)
+            for shard in shards
+        ]
+        preds = []
+        for future in futures:
+            preds.extend(future.result())
+    return preds
+
+
+# session and config of the current shard worker process, set by _init_shard_worker
+_shard_session: InferenceSession | None = None
+_shard_cfg: DictConfig | None = None
+
+
+def _init_shard_worker(
+    model: ALLOWED_MODELS,
+    cfg: DictConfig,
+    device_queue: multiprocessing.Queue,
+    num_workers: int,
+) -> None:
+    global _shard_session, _shard_cfg
+    device = device_queue.get()
+    if torch.device(device).type == "cpu":
+        # split the cores between the workers rather than oversubscribing them
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // num_workers))
+    _shard_cfg = cfg
+    _shard_session = InferenceSession(model, device=device)
+
+
+def _predict_shard(
+    filenames: list[str] | list[list[str]],
+    sequence_range: tuple[int, int],
+    frame_indices: np.ndarray | None = None,
+    bboxes: np.ndarray | None = None,
+) -> list[Tuple[torch.Tensor, torch.Tensor]]:
+    loader = _get_video_pred_class(
+        _shard_cfg, filenames, sequence_range=sequence_range, frame_indices=frame_indices,
+        bboxes=bboxes,
+    )()
+    preds = _shard_session.predict(loader)
+    return [(p[0].cpu(), p[1].cpu()) for p in preds]
@@ -129,6 +129,7 @@ def get_dataset(
                 image_resize_width=cfg.data.image_resize_dims.width,
                 imgaug_transform=imgaug_transform,
                 do_context=False,  # no context for regression models
+                image_cache_mb=cfg.training.get("image_cache_mb", 0),
             )
     elif cfg.model.model_type.find("heatmap") > -1:
         if cfg.data.get("view_names", None) and len(cfg.data.view_names) > 1:
@@ -159,6 +160,8 @@ def get_dataset(
                 uniform_heatmaps=cfg.training.get("uniform_heatmaps_for_nan_keypoints", False),
                 camera_params_path=cfg.data.get("camera_params_file", None),
                 bbox_paths=cfg.data.get("bbox_file", None),
+                image_cache_mb=cfg.training.get("image_cache_mb", 0),
+                heatmaps_on_device=cfg.training.get("heatmaps_on_device", False),
             )
         else:
             dataset = HeatmapDataset(
@@ -170,6 +173,8 @@ def get_dataset(
                 downsample_factor=cfg.data.get("downsample_factor", 2),
                 do_context=cfg.model.model_type == "heatmap_mhcrnn",  # context only for mhcrnn
                 uniform_heatmaps=cfg.training.get("uniform_heatmaps_for_nan_keypoints", False),
+                image_cache_mb=cfg.training.get("image_cache_mb", 0),
+                heatmaps_on_device=cfg.training.get("heatmaps_on_device", False),
             )
 
     else:
@@ -268,8 +273,17 @@ def get_data_module(
 def get_loss_factories(
     cfg: DictConfig,
     data_module: BaseDataModule | UnlabeledDataModule,
+    pca_cache_dir: str | Path | None = None,
 ) -> dict:
-    """Create loss factory that orchestrates different losses during training."""
+    """Create loss factory that orchestrates different losses during training.
+
+    Args:
+        cfg: standard config file that carries around dataset info
+        data_module: data module used to fit pca losses
+        pca_cache_dir: directory (usually the model directory) in which fitted pca parameters are
+            cached for reuse when computing pca metrics
+
+    """
 
     cfg_loss_dict = OmegaConf.to_object(cfg.losses)
 
@@ -361,6 +375,8 @@ def get_loss_factories(
                     loss_params_dict["unsupervised"][loss_name][
                         "columns_for_singleview_pca"
                     ] = cfg.data.get('columns_for_singleview_pca', None)
+            if loss_name[:3] == "pca":
+                loss_params_dict["unsupervised"][loss_name]["cache_dir"] = pca_cache_dir
 
     # build supervised loss factory, which orchestrates all supervised losses
     loss_factory_sup = LossFactory(
@@ -673,6 +689,7 @@ def compute_metrics(
     cfg: DictConfig,
     preds_file: str | list[str] | Path | list[Path],
     data_module: BaseDataModule | UnlabeledDataModule | None = None,
+    pca_cache_dir: str | Path | None = None,
 ) -> None:
     """Compute various metrics on predictions csv file, potentially for multiple views.
     Saves metrics to files next to predictions file, in the convention of:
@@ -684,6 +701,8 @@ def compute_metrics(
         preds_file: Path to model predictions used to compute metrics.
             For multiview, a list of prediction files corresponding to the csv_files.
         data_module: for computing PCA metrics
+        pca_cache_dir: directory in which fitted PCA parameters are cached, usually the model
+            directory; PCA is refit on every call if None
 
     """
     if not isinstance(cfg.data.csv_file, str):
@@ -699,6 +718,7 @@ def compute_metrics(
                 labels_file=labels_file,
                 preds_file=preds_file_,
                 data_module=data_module,
+                pca_cache_dir=pca_cache_dir,
             )
     else:
         assert isinstance(cfg.data.csv_file, str)
@@ -711,6 +731,7 @@ def compute_metrics(
             labels_file=labels_file,
             preds_file=preds_file,
             data_module=data_module,
+            pca_cache_dir=pca_cache_dir,
         )
 
 
@@ -720,12 +741,17 @@ def compute_metrics_single(
     labels_file: str | Path | None,
     preds_file: str | Path,
     data_module: BaseDataModule | UnlabeledDataModule | None = None,
+    pca_cache_dir: str | Path | None = None,
 ) -> ComputeMetricsSingleResult:
-    """Compute various metrics on a predictions csv file from a single view."""
+    """Compute various metrics on a predictions csv file from a single view.
+
+    PCA metrics reuse parameters cached in `pca_cache_dir` (if provided) that were fit on the same
+    labels, e.g. by the PCA losses during training, instead of refitting PCA on every call.
+
+    """
     # load predictions
-    pred_df = pd.read_csv(preds_file, header=[0, 1, 2], index_col=0)
-    keypoint_names = io_utils.get_keypoint_names(
-        cfg, csv_file=str(preds_file), header_rows=[0, 1, 2])
+    pred_df = io_utils.load_predictions(preds_file)
+    keypoint_names = [c[1] for c in pred_df.columns if c[2] == "x"]
     xyl_mask = pred_df.columns.get_level_values("coords").isin(["x", "y", "likelihood"])
     tmp = pred_df.loc[:, xyl_mask].to_numpy().reshape(pred_df.shape[0], -1, 3)
 
@@ -745,7 +771,12 @@ def compute_metrics_single(
 
     # hard-code metrics for now
     if is_video:
-        metrics_to_compute = ["temporal"]
+        # temporal norms are only defined between consecutive frames; predictions on every n-th
+        # frame are indexed by frame number
+        if np.all(np.diff(index.to_numpy()) == 1):
+            metrics_to_compute = ["temporal"]
+        else:
+            metrics_to_compute = []
     else:  # labeled data
         assert labels_file is not None
         metrics_to_compute = ["pixel_error"]
@@ -810,8 +841,9 @@ def compute_metrics_single(
                     "empirical_epsilon_percentile", 1.0),
                 columns_for_singleview_pca=cfg.data.columns_for_singleview_pca,
                 centering_method=cfg.losses.pca_singleview.get("centering_method", None),
+                cache_dir=pca_cache_dir,
             )
-            # re-fit pca on the labeled data to get params
+            # re-fit pca on the labeled data to get params (or load them from the cache)
             pca()
             # compute reprojection error
             pcasv_error_per_keypoint = pca_singleview_reprojection_error(keypoints_pred, pca)
@@ -841,8 +873,9 @@ def compute_metrics_single(
             empirical_epsilon_percentile=cfg.losses.pca_singleview.get(
                 "empirical_epsilon_percentile", 1.0),
             mirrored_column_matches=cfg.data.mirrored_column_matches,
+            cache_dir=pca_cache_dir,
         )
-        # re-fit pca on the labeled data to get params
+        # re-fit pca on the labeled data to get params (or load them from the cache)
         pca()
         # compute reprojection error
         pcamv_error_per_keypoint = pca_multiview_reprojection_error(keypoints_pred, pca)
@@ -108,6 +108,7 @@ def predict_videos_in_dir(cfg: DictConfig):
                     cfg=cfg,
                     preds_file=prediction_csv_file,
                     data_module=data_module,
+                    pca_cache_dir=absolute_cfg_path,
                 )
             except Exception as e:
                 print(f"Error predicting on video {video_file}:\n{e}")
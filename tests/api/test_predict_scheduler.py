@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from lightning_pose.api.predict_scheduler import (
+    PredictionManifest,
+    PredictionScheduler,
+    _dali_device,
+    _pin_worker_device,
+)
+
+
+def test_prediction_manifest(tmp_path):
+    manifest_file = tmp_path / "video_preds" / "predict_manifest.json"
+    videos = [tmp_path / f"vid{i}.mp4" for i in range(3)]
+    outputs = [tmp_path / "video_preds" / f"vid{i}.csv" for i in range(3)]
+
+    manifest = PredictionManifest(manifest_file)
+    job_ids = [manifest.add([v], [o]) for v, o in zip(videos, outputs)]
+    assert job_ids[0] == str(videos[0].absolute())
+    # nothing predicted yet
+    assert not any(manifest.is_complete(j) for j in job_ids)
+
+    # outputs written by a run without a manifest count as complete
+    outputs[0].parent.mkdir(parents=True)
+    outputs[0].touch()
+    assert manifest.is_complete(job_ids[0])
+
+    # job 1 finishes, job 2 is interrupted after writing its predictions
+    manifest.set_status(job_ids[1], PredictionManifest.RUNNING)
+    outputs[1].touch()
+    manifest.set_status(job_ids[1], PredictionManifest.DONE, elapsed=1.0)
+    manifest.set_status(job_ids[2], PredictionManifest.RUNNING)
+    outputs[2].touch()
+
+    # resume from disk
+    manifest = PredictionManifest(manifest_file)
+    for v, o in zip(videos, outputs):
+        manifest.add([v], [o])
+    assert manifest.jobs[job_ids[1]]["elapsed"] == 1.0
+    assert manifest.is_complete(job_ids[1])
+    assert not manifest.is_complete(job_ids[2])
+
+    # finished jobs whose outputs were removed are predicted again
+    outputs[1].unlink()
+    assert not manifest.is_complete(job_ids[1])
+
+    # jobs predicted on other frames are predicted again; jobs without recorded frame options
+    # were predicted on full videos
+    options = {"start_frame": 0, "end_frame": None, "stride": 1}
+    assert manifest.is_complete(job_ids[0], options)
+    assert not manifest.is_complete(job_ids[0], dict(options, stride=2))
+    outputs[1].touch()
+    manifest.set_status(job_ids[1], PredictionManifest.DONE, options=dict(options, stride=2))
+    assert manifest.is_complete(job_ids[1], dict(options, stride=2))
+    assert not manifest.is_complete(job_ids[1], options)
+
+    # failed jobs are predicted again
+    manifest.set_status(job_ids[2], PredictionManifest.FAILED, error="error")
+    assert not manifest.is_complete(job_ids[2])
+    assert not manifest_file.with_suffix(".json.tmp").exists()
+
+
+def test_prediction_manifest_multiview(tmp_path):
+    videos = [tmp_path / "session0_top.mp4", tmp_path / "session0_bot.mp4"]
+    outputs = [tmp_path / "session0_top.csv", tmp_path / "session0_bot.csv"]
+    manifest = PredictionManifest(tmp_path / "predict_manifest.json")
+    job_id = manifest.add(videos, outputs)
+    # a session is complete only if the predictions for all views exist
+    outputs[0].touch()
+    assert not manifest.is_complete(job_id)
+    outputs[1].touch()
+    assert manifest.is_complete(job_id)
+
+
+def test_pin_worker_device(monkeypatch):
+    monkeypatch.delenv("CUDA_VISIBLE_DEVICES", raising=False)
+    monkeypatch.delenv("LOCAL_RANK", raising=False)
+    assert _pin_worker_device("cpu") == "cpu"
+    assert "CUDA_VISIBLE_DEVICES" not in os.environ
+
+    # each worker only sees its own gpu, which DALI decodes on
+    assert _pin_worker_device("cuda:1") == "cuda:0"
+    assert os.environ["CUDA_VISIBLE_DEVICES"] == "1"
+    assert os.environ["LOCAL_RANK"] == "0"
+
+    # indices are relative to the gpus visible to the parent process
+    monkeypatch.setenv("CUDA_VISIBLE_DEVICES", "2,5")
+    assert _pin_worker_device("cuda:1") == "cuda:0"
+    assert os.environ["CUDA_VISIBLE_DEVICES"] == "5"
+
+
+def test_dali_device(monkeypatch):
+    monkeypatch.delenv("LOCAL_RANK", raising=False)
+    with _dali_device("cuda:1"):
+        assert os.environ["LOCAL_RANK"] == "1"
+    assert "LOCAL_RANK" not in os.environ
+    with _dali_device("cpu"):
+        assert "LOCAL_RANK" not in os.environ
+
+
+def test_prediction_scheduler_rejects_workers_with_shards(tmp_path):
+    with pytest.raises(ValueError):
+        PredictionScheduler(tmp_path, num_workers=2, num_shards=2)
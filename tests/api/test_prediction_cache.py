@@ -0,0 +1,63 @@
+import os
+import shutil
+
+from lightning_pose.api.prediction_cache import PredictionCache, file_fingerprint
+
+
+def test_file_fingerprint(tmp_path, video_list):
+    video_file = tmp_path / "vid.mp4"
+    shutil.copy(video_list[0], video_file)
+    # renamed copies share a fingerprint
+    copy_file = tmp_path / "renamed.mp4"
+    shutil.copy(video_file, copy_file)
+    assert file_fingerprint(video_file) == file_fingerprint(copy_file)
+    # a change anywhere in a sampled block changes it
+    with open(copy_file, "r+b") as f:
+        f.seek(copy_file.stat().st_size // 2)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 1]))
+    assert file_fingerprint(video_file) != file_fingerprint(copy_file)
+
+
+def test_prediction_cache(tmp_path, video_list):
+    cache = PredictionCache(tmp_path / "cache")
+    key = cache.key(video_list[:1], model_fp="model0")
+    assert cache.key(video_list[:1], model_fp="model1") != key
+    assert cache.key(video_list[:1], model_fp="model0", options={"stride": 2}) != key
+    assert not cache.restore(key, [tmp_path / "out" / "vid.csv"])
+
+    preds_dir = tmp_path / "video_preds"
+    preds_dir.mkdir()
+    (preds_dir / "vid.csv").write_text("preds")
+    (preds_dir / "vid_temporal_norm.csv").write_text("temporal")
+    (preds_dir / "vid_other.csv").write_text("predictions of another video")
+    labeled_video = tmp_path / "labeled_videos" / "vid_labeled.mp4"
+    labeled_video.parent.mkdir()
+    labeled_video.write_bytes(b"video")
+    cache.store(
+        key, [preds_dir / "vid.csv"], labeled_video_files=[labeled_video], videos=video_list[:1],
+    )
+    assert cache.contains(key)
+    # outputs are hard-linked into the cache
+    assert os.path.samefile(preds_dir / "vid.csv", cache.entry_dir(key) / "0.csv")
+
+    # outputs are restored under the name of the (renamed) video
+    assert cache.restore(key, [tmp_path / "out" / "renamed.csv"])
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == [
+        "renamed.csv", "renamed_temporal_norm.csv",
+    ]
+    assert (tmp_path / "out" / "renamed.csv").read_text() == "preds"
+
+    # labeled videos are restored on request
+    assert cache.restore(
+        key, [tmp_path / "out" / "renamed.csv"],
+        labeled_video_files=[tmp_path / "out" / "renamed_labeled.mp4"],
+    )
+    assert (tmp_path / "out" / "renamed_labeled.mp4").read_bytes() == b"video"
+
+    # outputs rewritten in place through a hard link invalidate the entry
+    with open(preds_dir / "vid.csv", "w") as f:
+        f.write("predictions of another model")
+    assert not cache.restore(key, [tmp_path / "out" / "renamed.csv"])
+    assert not cache.contains(key)
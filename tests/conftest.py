@@ -42,6 +42,19 @@ TOY_DATA_ROOT_DIR = str(lp.LP_ROOT_PATH / "data" / "mirror-mouse-example")
 TOY_MDATA_ROOT_DIR = str(lp.LP_ROOT_PATH / "data" / "mirror-mouse-example_split")
 
 
+@pytest.fixture(autouse=True, scope="session")
+def video_metadata_index(tmp_path_factory) -> str:
+    """Keep the video metadata index of the tests out of the user's cache directory."""
+    from lightning_pose.data import utils
+
+    index_file = tmp_path_factory.mktemp("cache") / "video_metadata.jsonl"
+    with pytest.MonkeyPatch.context() as mp:
+        # subprocesses, e.g. CLI tests, read the environment variable
+        mp.setenv("LIGHTNING_POSE_VIDEO_METADATA_INDEX", str(index_file))
+        mp.setattr(utils, "VIDEO_METADATA_INDEX_FILE", index_file)
+        yield str(index_file)
+
+
 @pytest.fixture
 def video_list() -> list[str]:
     return get_videos_in_dir(os.path.join(TOY_DATA_ROOT_DIR, "videos"))
@@ -1,6 +1,16 @@
+import itertools
+import warnings
+
+import cv2
+import numpy as np
+import pytest
 import torch
+from aniposelib.cameras import Camera, FisheyeCamera
+from kornia.geometry.calibration import undistort_points
+from kornia.geometry.epipolar import triangulate_points
 
 from lightning_pose.data.cameras import (
+    CameraGroup,
     get_valid_projection_masks,
     project_camera_pairs_to_3d,
 )
@@ -94,6 +104,75 @@ def test_project_camera_pairs_to_3d():
     assert torch.allclose(p3d[0, 2], target[0, 2], rtol=1e-3)
 
 
+def test_project_camera_pairs_to_3d_batched():
+
+    torch.manual_seed(0)
+    n_batch = 4
+    n_views = 4
+    n_keypoints = 6
+
+    # cameras placed around the origin, looking at the origin
+    intrinsics = []
+    extrinsics = []
+    for v in range(n_views):
+        angle = torch.tensor(2 * torch.pi * v / n_views)
+        R = torch.tensor([
+            [torch.cos(angle), 0.0, -torch.sin(angle)],
+            [0.0, 1.0, 0.0],
+            [torch.sin(angle), 0.0, torch.cos(angle)],
+        ])
+        t = torch.tensor([[0.0], [0.0], [10.0]])
+        extrinsics.append(torch.cat([R, t], dim=1))
+        intrinsics.append(torch.tensor([[500.0, 0, 320], [0, 500.0, 240], [0, 0, 1]]))
+    intrinsics = torch.stack(intrinsics).expand(n_batch, -1, -1, -1)
+    extrinsics = torch.stack(extrinsics).expand(n_batch, -1, -1, -1)
+    dist = torch.zeros(n_batch, n_views, 5)
+
+    # project random 3d points into each view
+    p3d_true = torch.rand(n_batch, n_keypoints, 3) - 0.5
+    p3d_h = torch.cat([p3d_true, torch.ones(n_batch, n_keypoints, 1)], dim=-1)
+    proj = torch.einsum("bvij,bvjk,bnk->bvni", intrinsics, extrinsics, p3d_h)
+    points = proj[..., :2] / proj[..., 2:]
+    points[0, 1, 2] = float("nan")
+    points[2, 0] = float("nan")
+    points[3, :, 5] = float("nan")
+
+    p3d = project_camera_pairs_to_3d(
+        points=points, intrinsics=intrinsics, extrinsics=extrinsics, dist=dist,
+    )
+    assert p3d.shape == (n_batch, 6, n_keypoints, 3)  # 6 = 4 choose 2
+
+    # reference: triangulate each batch element and camera pair separately
+    points_ud = undistort_points(
+        points=points,
+        K=intrinsics,
+        dist=dist,
+        new_K=torch.eye(3).expand(n_batch, n_views, 3, 3),
+    )
+    for b in range(n_batch):
+        for p, (j1, j2) in enumerate(itertools.combinations(range(n_views), 2)):
+            valid = ~(points[b, j1].isnan().any(-1) | points[b, j2].isnan().any(-1))
+            assert torch.all(torch.isnan(p3d[b, p, ~valid]))
+            if valid.any():
+                tri = triangulate_points(
+                    P1=extrinsics[b, j1],
+                    P2=extrinsics[b, j2],
+                    points1=points_ud[b, j1][valid],
+                    points2=points_ud[b, j2][valid],
+                )
+                assert torch.allclose(p3d[b, p, valid], tri, atol=1e-4)
+                assert torch.allclose(p3d[b, p, valid], p3d_true[b, valid], atol=1e-3)
+
+    # missing keypoints do not propagate nans to the gradients of observed keypoints
+    points.requires_grad_(True)
+    p3d = project_camera_pairs_to_3d(
+        points=points, intrinsics=intrinsics, extrinsics=extrinsics, dist=dist,
+    )
+    torch.nan_to_num(p3d).sum().backward()
+    observed = ~torch.isnan(points)
+    assert torch.all(torch.isfinite(points.grad[observed]))
+
+
 def test_get_valid_projection_masks():
 
     n_batch = 2
@@ -127,3 +206,82 @@ def test_get_valid_projection_masks():
 
     # test others
     assert torch.all(masks)
+
+
+@pytest.mark.parametrize("camera_model", ["pinhole", "fisheye", "mixed"])
+def test_camera_group_triangulate_fast(camera_model):
+
+    n_views = 3
+    n_keypoints = 8
+    rng = np.random.default_rng(0)
+
+    cameras = []
+    for v in range(n_views):
+        angle = 2 * np.pi * v / (2 * n_views)
+        kwargs = dict(
+            name=f"cam{v}",
+            matrix=[[500.0, 0, 320], [0, 500.0, 240], [0, 0, 1]],
+            rvec=[0.0, angle, 0.0],
+            tvec=[0.0, 0.0, 10.0],
+            size=[640, 480],
+        )
+        if camera_model == "fisheye" or (camera_model == "mixed" and v == 1):
+            cameras.append(FisheyeCamera(dist=[0.05 * (v + 1), -0.01, 0.0, 0.0], **kwargs))
+        else:
+            cameras.append(Camera(dist=[0.05 * v, -0.01, 0.0, 0.0, 0.0], **kwargs))
+    camgroup = CameraGroup(cameras)
+
+    if camera_model == "mixed":
+        # fisheye and pinhole cameras have different numbers of distortion parameters
+        with pytest.raises(ValueError):
+            camgroup.get_camera_arrays()
+    else:
+        # cached arrays match the per-camera parameters
+        camera_arrays = camgroup.get_camera_arrays()
+        assert camgroup.get_camera_arrays() is camera_arrays
+        assert camera_arrays["intrinsics"].shape == (n_views, 3, 3)
+        assert camera_arrays["extrinsics"].shape == (n_views, 3, 4)
+        n_params = 4 if camera_model == "fisheye" else 5
+        assert camera_arrays["distortions"].shape == (n_views, n_params)
+        for cam, Rt in zip(cameras, camera_arrays["extrinsics"]):
+            assert np.allclose(cam.get_extrinsics_mat()[:3], Rt)
+        # new cameras invalidate the cache
+        new_group = camgroup.copy_with_new_cameras(cameras[:2])
+        assert new_group.get_camera_arrays()["intrinsics"].shape == (2, 3, 3)
+
+    p3d_true = rng.uniform(-0.5, 0.5, size=(n_keypoints, 3))
+    points = camgroup.project(p3d_true)
+    points[0, 1] = np.nan
+    points[:2, 2] = np.nan
+    points[:, 3] = np.nan
+
+    p3d = camgroup.triangulate_fast(points)
+    assert p3d.shape == (n_keypoints, 3)
+    assert np.all(np.isnan(p3d[[2, 3]]))
+
+    # reference: undistort with the model of each camera (cv2.undistortPoints or
+    # cv2.fisheye.undistortPoints), triangulate each camera pair with opencv, take the median
+    points_ud = np.stack([
+        cam.undistort_points(np.copy(points[c])) for c, cam in enumerate(cameras)
+    ])
+    tri_pairs = []
+    for j1, j2 in itertools.combinations(range(n_views), 2):
+        tri = cv2.triangulatePoints(
+            cameras[j1].get_extrinsics_mat()[:3],
+            cameras[j2].get_extrinsics_mat()[:3],
+            points_ud[j1].T,
+            points_ud[j2].T,
+        )
+        tri = (tri[:3] / tri[3]).T
+        tri[np.isnan(points_ud[j1]).any(-1) | np.isnan(points_ud[j2]).any(-1)] = np.nan
+        tri_pairs.append(tri)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        p3d_ref = np.nanmedian(np.stack(tri_pairs), axis=0)
+
+    assert np.allclose(p3d, p3d_ref, atol=1e-6, equal_nan=True)
+    valid = ~np.isnan(p3d).any(-1)
+    assert np.allclose(p3d[valid], p3d_true[valid], atol=1e-4)
+
+    # single point
+    assert np.allclose(camgroup.triangulate_fast(points[:, 0]), p3d[0])
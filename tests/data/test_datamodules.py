@@ -1,7 +1,10 @@
 """Test datamodule functionality."""
 
+import copy
+
 import numpy as np
 import pytest
+import torch
 from lightning.pytorch.utilities import CombinedLoader
 from torch.utils.data import RandomSampler
 
@@ -137,6 +140,45 @@ def test_multiview_heatmap_datamodule(cfg_multiview, multiview_heatmap_data_modu
     assert np.allclose(b1["keypoints"], b2["keypoints"], equal_nan=True)
 
 
+@pytest.mark.parametrize("multiview", [False, True])
+def test_heatmaps_on_device(
+    cfg, cfg_multiview, imgaug_transform, toy_data_dir, toy_mdata_dir, multiview,
+):
+
+    from lightning_pose.utils.scripts import get_data_module, get_dataset
+
+    cfg_tmp = copy.deepcopy(cfg_multiview if multiview else cfg)
+    cfg_tmp.model.model_type = "heatmap"
+    cfg_tmp.model.losses_to_use = []
+    data_dir = toy_mdata_dir if multiview else toy_data_dir
+
+    data_modules = {}
+    for on_device in [False, True]:
+        cfg_tmp.training.heatmaps_on_device = on_device
+        dataset = get_dataset(
+            cfg_tmp, data_dir=data_dir, imgaug_transform=copy.deepcopy(imgaug_transform),
+        )
+        data_modules[on_device] = get_data_module(cfg_tmp, dataset=dataset, video_dir=None)
+
+    # datasets only return keypoints; heatmaps are added once the batch is on device
+    example = data_modules[True].val_dataset[0]
+    assert "heatmaps" not in example
+    batch = next(iter(data_modules[True].val_dataloader()))
+    assert "heatmaps" not in batch
+    batch = data_modules[True].on_after_batch_transfer(batch, dataloader_idx=0)
+
+    # val data is not augmented, so targets must match the heatmaps computed in the workers
+    batch_ref = next(iter(data_modules[False].val_dataloader()))
+    assert torch.allclose(batch["keypoints"], batch_ref["keypoints"], equal_nan=True)
+    assert batch["heatmaps"].shape == batch_ref["heatmaps"].shape
+    assert torch.allclose(batch["heatmaps"], batch_ref["heatmaps"], atol=1e-6)
+
+    # labeled part of semi-supervised batches is handled too
+    batch = next(iter(data_modules[True].val_dataloader()))
+    batch = data_modules[True].on_after_batch_transfer({"labeled": batch}, dataloader_idx=0)
+    assert torch.allclose(batch["labeled"]["heatmaps"], batch_ref["heatmaps"], atol=1e-6)
+
+
 def test_heatmap_datamodule_context(cfg, heatmap_data_module_context):
 
     im_height = cfg.data.image_resize_dims.height
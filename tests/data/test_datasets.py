@@ -27,6 +27,109 @@ def test_base_dataset(cfg, base_dataset):
     assert isinstance(batch["keypoints"], torch.Tensor)
 
 
+def test_decoded_image_cache(cfg, heatmap_dataset):
+
+    from lightning_pose.data.datasets import DecodedImageCache, HeatmapDataset
+    from lightning_pose.utils.scripts import get_imgaug_transform
+
+    paths = [heatmap_dataset.root_directory / name for name in heatmap_dataset.image_names[:3]]
+    frame = heatmap_dataset.read_image(paths[0])
+    assert frame.dtype == np.uint8 and frame.shape[-1] == 3
+
+    # budget for two frames: least recently used frame is evicted
+    cache = DecodedImageCache(max_bytes=2 * frame.nbytes)
+    assert np.array_equal(cache(paths[0]), frame)
+    assert not cache(paths[0]).flags.writeable
+    cache(paths[1])
+    cache(paths[0])  # paths[1] is now least recently used
+    cache(paths[2])
+    assert len(cache) == 2 and cache.num_bytes == 2 * frame.nbytes
+    assert str(paths[1]) not in cache._frames
+    assert str(paths[0]) in cache._frames
+
+    # deep copies share the cache
+    assert copy.deepcopy(cache) is cache
+
+    # dataset with cache, including a full augmentation pipeline (frames are read-only)
+    cfg_tmp = copy.deepcopy(cfg)
+    dataset = HeatmapDataset(
+        root_directory=str(heatmap_dataset.root_directory),
+        csv_path=heatmap_dataset.csv_path,
+        image_resize_height=heatmap_dataset.height,
+        image_resize_width=heatmap_dataset.width,
+        imgaug_transform=get_imgaug_transform(cfg_tmp),
+        image_cache_mb=100,
+    )
+    for _ in range(2):
+        batch = dataset[0]
+    assert len(dataset.image_cache) == 1
+    assert batch["images"].shape == (3, dataset.height, dataset.width)
+    assert torch.equal(batch["bbox"], torch.tensor([0, 0, frame.shape[0], frame.shape[1]]))
+
+    # cached frames give the same outputs as frames decoded from disk
+    cfg_tmp.training.imgaug = "default"
+    kwargs = dict(
+        root_directory=str(heatmap_dataset.root_directory),
+        csv_path=heatmap_dataset.csv_path,
+        image_resize_height=heatmap_dataset.height,
+        image_resize_width=heatmap_dataset.width,
+    )
+    dataset_nocache = HeatmapDataset(imgaug_transform=get_imgaug_transform(cfg_tmp), **kwargs)
+    dataset_cache = HeatmapDataset(
+        imgaug_transform=get_imgaug_transform(cfg_tmp), image_cache_mb=100, **kwargs,
+    )
+    for _ in range(2):
+        batch_cache = dataset_cache[1]
+    batch_nocache = dataset_nocache[1]
+    assert torch.equal(batch_cache["images"], batch_nocache["images"])
+    assert torch.allclose(batch_cache["keypoints"], batch_nocache["keypoints"], equal_nan=True)
+
+
+def test_packed_image_store(cfg, heatmap_dataset, tmp_path):
+
+    import zipfile
+
+    from lightning_pose.data.datasets import (
+        PACKED_IMAGES_FILENAME,
+        HeatmapDataset,
+        PackedImageStore,
+    )
+    from lightning_pose.utils.scripts import get_imgaug_transform
+
+    # pack the labeled frames (and their context frames) of the first two labels
+    root = heatmap_dataset.root_directory
+    with zipfile.ZipFile(tmp_path / PACKED_IMAGES_FILENAME, "w") as archive:
+        for img_dir in {(root / name).parent for name in heatmap_dataset.image_names[:2]}:
+            for path in img_dir.iterdir():
+                archive.write(path, path.relative_to(root).as_posix())
+    store = PackedImageStore(tmp_path / PACKED_IMAGES_FILENAME)
+    assert heatmap_dataset.image_names[0] in store
+    with store.open(heatmap_dataset.image_names[0]) as img:
+        assert np.array_equal(
+            np.asarray(img.convert("RGB")),
+            heatmap_dataset.read_image(root / heatmap_dataset.image_names[0]),
+        )
+
+    # a data directory with only the archive gives the same examples
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.training.imgaug = "default"
+    kwargs = dict(
+        csv_path=str(root / heatmap_dataset.csv_path),
+        image_resize_height=heatmap_dataset.height,
+        image_resize_width=heatmap_dataset.width,
+        imgaug_transform=get_imgaug_transform(cfg_tmp),
+    )
+    for do_context in [False, True]:
+        dataset = HeatmapDataset(root_directory=str(root), do_context=do_context, **kwargs)
+        dataset_packed = HeatmapDataset(
+            root_directory=str(tmp_path), do_context=do_context, **kwargs,
+        )
+        assert dataset_packed.image_store is not None
+        for idx in range(2):
+            assert torch.equal(dataset[idx]["images"], dataset_packed[idx]["images"])
+            assert torch.equal(dataset[idx]["bbox"], dataset_packed[idx]["bbox"])
+
+
 class TestHeatmapDataset:
 
     def test_heatmap_dataset(self, cfg, heatmap_dataset):
@@ -1,6 +1,9 @@
 """Test data utils functionality."""
 
 import copy
+import json
+import os
+from unittest.mock import patch
 
 import numpy as np
 import pytest
@@ -44,6 +47,23 @@ def test_data_extractor(base_data_module_combined, multiview_heatmap_data_module
     assert keypoint_tensor.shape == (num_frames, 28)  # 72 = 0.8 * 90 images, 7 * 2 * 2 coords
 
 
+def test_data_extractor_keypoint_fast_path(heatmap_data_module, multiview_heatmap_data_module):
+
+    from lightning_pose.data.utils import DataExtractor
+
+    for data_module in [heatmap_data_module, multiview_heatmap_data_module]:
+        extractor = DataExtractor(data_module=data_module, cond="val")
+        assert extractor.use_keypoint_fast_path(data_module)
+        keypoints_fast, images = extractor()
+        assert images is None
+        # val loader is not shuffled, so rows are in the same order as the fast path
+        keypoints_loader, _ = DataExtractor(
+            data_module=data_module, cond="val", extract_images=True,
+        )()
+        assert keypoints_fast.shape == keypoints_loader.shape
+        assert torch.allclose(keypoints_fast, keypoints_loader, atol=1e-4, equal_nan=True)
+
+
 def test_split_sizes_from_probabilities():
 
     from lightning_pose.data.utils import split_sizes_from_probabilities
@@ -122,6 +142,82 @@ def test_count_frames(video_list):
     assert num_frames == 994
 
 
+def test_get_video_metadata(video_list, tmp_path):
+    import shutil
+
+    import cv2
+
+    from lightning_pose.data.utils import get_video_metadata, get_videos_metadata
+
+    video_file = tmp_path / "vid.mp4"
+    shutil.copy(video_list[0], video_file)
+    metadata = get_video_metadata(video_file)
+    assert metadata.frame_count == 994
+    assert (metadata.width, metadata.height) == (396, 406)
+    assert metadata.fps > 0
+    assert metadata.codec == "h264"
+    assert metadata.file_size == video_file.stat().st_size
+
+    # cached until the file changes
+    assert get_video_metadata(str(video_file)) is metadata
+    assert get_videos_metadata([video_file, video_list[0]])[0] is metadata
+    writer = cv2.VideoWriter(str(video_file), cv2.VideoWriter_fourcc(*"mp4v"), 30, (64, 48))
+    for _ in range(5):
+        writer.write(np.zeros((48, 64, 3), dtype=np.uint8))
+    writer.release()
+    metadata = get_video_metadata(video_file)
+    assert (metadata.frame_count, metadata.width, metadata.height) == (5, 64, 48)
+
+    with pytest.raises(FileNotFoundError):
+        get_video_metadata(tmp_path / "missing.mp4")
+
+
+def test_video_metadata_index(video_list, tmp_path, monkeypatch):
+    import shutil
+
+    from lightning_pose.data import utils
+
+    index_file = tmp_path / "cache" / "video_metadata.jsonl"
+    monkeypatch.setattr(utils, "VIDEO_METADATA_INDEX_FILE", index_file)
+    monkeypatch.setattr(utils, "_video_metadata_cache", {})
+    monkeypatch.setattr(utils, "_video_metadata_index_loaded", False)
+
+    video_file = tmp_path / "vid.mp4"
+    shutil.copy(video_list[0], video_file)
+    metadata = utils.get_video_metadata(video_file)
+    assert index_file.exists()
+
+    # a new process reads the metadata from the index instead of opening the video
+    monkeypatch.setattr(utils, "_video_metadata_cache", {})
+    monkeypatch.setattr(utils, "_video_metadata_index_loaded", False)
+    with open(index_file, "a") as f:
+        f.write('{"path": "partially written')
+    with patch("cv2.VideoCapture", side_effect=AssertionError("video was opened")):
+        assert utils.get_video_metadata(video_file) == metadata
+
+    # entries of modified videos are not used
+    os.utime(video_file, ns=(metadata.mtime_ns, metadata.mtime_ns + 1))
+    assert utils.get_video_metadata(video_file).mtime_ns == metadata.mtime_ns + 1
+
+    # a large index is rewritten with the latest entry of each existing video
+    other_file = tmp_path / "other.mp4"
+    shutil.copy(video_list[0], other_file)
+    utils.get_video_metadata(other_file)
+    os.remove(other_file)
+    monkeypatch.setattr(utils, "_VIDEO_METADATA_INDEX_MAX_BYTES", index_file.stat().st_size)
+    os.utime(video_file, ns=(metadata.mtime_ns, metadata.mtime_ns + 2))
+    utils.get_video_metadata(video_file)
+    lines = index_file.read_text().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["mtime_ns"] == metadata.mtime_ns + 2
+
+    # the environment variable sets the path of the index, or disables it if empty
+    monkeypatch.setenv("LIGHTNING_POSE_VIDEO_METADATA_INDEX", str(index_file))
+    assert utils._default_video_metadata_index_file() == index_file
+    monkeypatch.setenv("LIGHTNING_POSE_VIDEO_METADATA_INDEX", "")
+    assert utils._default_video_metadata_index_file() is None
+
+
 def test_compute_num_train_frames():
 
     from lightning_pose.data.utils import compute_num_train_frames
@@ -299,6 +395,57 @@ def test_generate_heatmaps_weird_shape(cfg, toy_data_dir):
     torch.cuda.empty_cache()  # remove tensors from gpu
 
 
+def _generate_heatmaps_dense(
+    keypoints, height, width, output_shape, sigma=1.25, uniform_heatmaps=False,
+):
+    """Reference implementation that evaluates the gaussian on the full 2D grid."""
+    keypoints = keypoints.detach().clone()
+    out_height, out_width = output_shape
+    keypoints[:, :, 1] *= out_height / height
+    keypoints[:, :, 0] *= out_width / width
+    nan_idxs = torch.isnan(keypoints)[:, :, 0]
+    yy, xx = torch.meshgrid(torch.arange(out_height), torch.arange(out_width), indexing="ij")
+    heatmaps = (xx - keypoints[:, :, None, None, 0]) ** 2
+    heatmaps += (yy - keypoints[:, :, None, None, 1]) ** 2
+    heatmaps = torch.exp(-heatmaps / (2 * sigma**2))
+    heatmaps = heatmaps / torch.sum(heatmaps, dim=(2, 3), keepdim=True)
+    if uniform_heatmaps:
+        heatmaps[nan_idxs] = 1.0 / (out_height * out_width)
+    else:
+        heatmaps[nan_idxs] = 0.0
+    return heatmaps
+
+
+@pytest.mark.parametrize("uniform_heatmaps", [False, True])
+def test_generate_heatmaps_matches_dense(uniform_heatmaps):
+
+    batch, num_keypoints = 4, 17
+    height, width = 256, 384
+    output_shape = (64, 96)
+    keypoints = torch.rand(batch, num_keypoints, 2) * torch.tensor([width, height])
+    # keypoints on and just outside the image borders, and missing keypoints
+    keypoints[0, :4] = torch.tensor([[0, 0], [width - 1, height - 1], [-3, 10], [10, height + 3]])
+    keypoints[1, 2] = torch.nan
+    keypoints[2] = torch.nan
+
+    for sigma in [1.25, 3.0]:
+        heatmaps = generate_heatmaps(
+            keypoints, height=height, width=width, output_shape=output_shape, sigma=sigma,
+            uniform_heatmaps=uniform_heatmaps,
+        )
+        heatmaps_dense = _generate_heatmaps_dense(
+            keypoints, height=height, width=width, output_shape=output_shape, sigma=sigma,
+            uniform_heatmaps=uniform_heatmaps,
+        )
+        assert heatmaps.shape == (batch, num_keypoints, *output_shape)
+        assert torch.allclose(heatmaps, heatmaps_dense, rtol=1e-5, atol=1e-8)
+
+    # gradients are not propagated to the keypoints
+    keypoints.requires_grad_(True)
+    heatmaps = generate_heatmaps(keypoints, height=height, width=width, output_shape=output_shape)
+    assert not heatmaps.requires_grad
+
+
 def test_evaluate_heatmaps_at_location():
 
     from lightning_pose.data.utils import evaluate_heatmaps_at_location
@@ -408,6 +555,65 @@ def test_evaluate_heatmaps_at_location():
     assert torch.allclose(confs2_g[0], torch.tensor(0.0))
 
 
+def _evaluate_heatmaps_at_location_loop(heatmaps, locs, sigma=1.25, num_stds=2):
+    """Reference implementation that loops over window offsets."""
+    num_pad = int(np.floor(sigma * num_stds))
+    heatmaps_padded = torch.nn.functional.pad(heatmaps, (num_pad,) * 4)
+    i = torch.arange(heatmaps.shape[0]).reshape(-1, 1)
+    j = torch.arange(heatmaps.shape[1]).reshape(1, -1)
+    k = locs[:, :, 1].type(torch.int64) + num_pad
+    m = locs[:, :, 0].type(torch.int64) + num_pad
+    vals = 0
+    for offset in range(-num_pad, num_pad + 1):
+        for offset_2 in range(-num_pad, num_pad + 1):
+            vals = vals + heatmaps_padded[i, j, k + offset, m + offset_2]
+    return vals
+
+
+def test_evaluate_heatmaps_at_location_matches_loop():
+
+    from lightning_pose.data.utils import evaluate_heatmaps_at_location
+
+    batch, num_keypoints, height, width = 8, 17, 48, 64
+    heatmaps = torch.softmax(torch.randn(batch, num_keypoints, height * width), dim=-1)
+    heatmaps = heatmaps.reshape(batch, num_keypoints, height, width)
+    # include locations at the heatmap borders
+    locs = torch.rand(batch, num_keypoints, 2) * torch.tensor([width - 1, height - 1])
+    locs[0, :4] = torch.tensor([[0, 0], [width - 1, 0], [0, height - 1], [width - 1, height - 1]])
+
+    for sigma in [1.25, 2.0]:
+        confs = evaluate_heatmaps_at_location(heatmaps, locs, sigma=sigma)
+        confs_loop = _evaluate_heatmaps_at_location_loop(heatmaps, locs, sigma=sigma)
+        assert confs.shape == (batch, num_keypoints)
+        assert torch.allclose(confs, confs_loop, rtol=1e-6, atol=1e-8)
+
+
+@pytest.mark.benchmark  # print the timings with `pytest -m benchmark -s`
+def test_evaluate_heatmaps_at_location_benchmark():
+
+    from torch.utils import benchmark
+
+    from lightning_pose.data.utils import evaluate_heatmaps_at_location
+
+    # typical training batch: 16 frames, 17 keypoints, 64x64 heatmaps
+    heatmaps = torch.softmax(torch.randn(16, 17, 64 * 64), dim=-1).reshape(16, 17, 64, 64)
+    locs = torch.rand(16, 17, 2) * 63
+
+    # timings are only reported, since they are unreliable on shared machines
+    times = {}
+    for name, fn in [
+        ("gather", evaluate_heatmaps_at_location),
+        ("loop", _evaluate_heatmaps_at_location_loop),
+    ]:
+        timer = benchmark.Timer(
+            stmt="fn(heatmaps, locs)",
+            globals={"fn": fn, "heatmaps": heatmaps, "locs": locs},
+        )
+        times[name] = timer.blocked_autorange(min_run_time=0.2).median
+    print(f"evaluate_heatmaps_at_location: gather {times['gather'] * 1e6:.1f} us, "
+          f"loop {times['loop'] * 1e6:.1f} us")
+
+
 def test_undo_affine_transform():
 
     from lightning_pose.data.utils import undo_affine_transform
@@ -0,0 +1,212 @@
+"""Test cpu video reading functionality."""
+
+import copy
+
+import numpy as np
+import pytest
+import torch
+
+from lightning_pose.data.utils import count_frames
+
+
+def test_get_video_reader(cfg):
+
+    from lightning_pose.data.video_readers import get_video_reader
+
+    cfg_tmp = copy.deepcopy(cfg)
+    # configs without the field default to dali
+    assert get_video_reader(cfg_tmp.dali) == "dali"
+    cfg_tmp.dali.predict_reader = "opencv"
+    assert get_video_reader(cfg_tmp.dali) == "opencv"
+    cfg_tmp.dali.predict_reader = "pyav"
+    with pytest.raises(ValueError):
+        get_video_reader(cfg_tmp.dali)
+
+
+@pytest.mark.parametrize("model_type", ["base", "context"])
+def test_prepare_opencv_single_view(cfg, video_list, model_type):
+
+    from lightning_pose.data.video_readers import PrepareOpenCV
+
+    im_height = 128
+    im_width = 96
+    seq_len = 16
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.dali.base.predict.sequence_length = seq_len
+    cfg_tmp.dali.context.predict.sequence_length = seq_len
+
+    loader_class = PrepareOpenCV(
+        model_type=model_type,
+        filenames=video_list[:1],
+        resize_dims=[im_height, im_width],
+        dali_config=cfg_tmp.dali,
+        num_threads=2,
+    )
+    frame_count = count_frames(video_list[0])
+    step = seq_len if model_type == "base" else seq_len - 4
+    loader = loader_class()
+    assert len(loader) == loader_class.num_iters
+
+    batches = list(loader)
+    assert len(batches) == loader_class.num_iters
+    for batch in batches:
+        assert batch["frames"].shape == (seq_len, 3, im_height, im_width)
+        assert batch["frames"].dtype == torch.float32
+        assert batch["bbox"].shape == (seq_len, 4)
+        assert not batch["is_multiview"]
+
+    # sequences cover the whole video
+    assert (len(batches) - 1) * step + seq_len >= frame_count
+
+    # frames past the end of the video are zero-padded before normalization
+    n_valid_last = frame_count - (len(batches) - 1) * step
+    if n_valid_last < seq_len:
+        pad_frame = batches[-1]["frames"][-1]
+        assert torch.allclose(pad_frame, pad_frame[:, :1, :1].expand_as(pad_frame))
+
+    if model_type == "context":
+        # consecutive sequences overlap by four frames
+        assert torch.allclose(batches[0]["frames"][step:], batches[1]["frames"][:seq_len - step])
+
+
+def test_prepare_opencv_multiview(cfg, video_list):
+
+    from lightning_pose.data.video_readers import PrepareOpenCV
+
+    im_height = 64
+    im_width = 64
+    seq_len = 8
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.dali.base.predict.sequence_length = seq_len
+
+    loader = PrepareOpenCV(
+        model_type="base",
+        filenames=[video_list[:1], video_list[:1]],
+        resize_dims=[im_height, im_width],
+        dali_config=cfg_tmp.dali,
+        num_threads=2,
+    )()
+    batch = next(iter(loader))
+    assert batch["frames"].shape == (seq_len, 2, 3, im_height, im_width)
+    assert batch["bbox"].shape == (seq_len, 2 * 4)
+    assert batch["is_multiview"]
+    # make sure frames match (the different "views" correspond to the same video here)
+    assert torch.allclose(batch["frames"][:, 0], batch["frames"][:, 1])
+    # make sure frames from different indices don't match
+    assert not np.allclose(batch["frames"][0, 0].numpy(), batch["frames"][-1, 0].numpy())
+
+
+@pytest.mark.parametrize("model_type", ["base", "context"])
+def test_prepare_opencv_sequence_range(cfg, video_list, model_type):
+    """Shards of sequences must reproduce the batches of the full video."""
+
+    from lightning_pose.data.video_readers import PrepareOpenCV
+
+    seq_len = 16
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.dali.base.predict.sequence_length = seq_len
+    cfg_tmp.dali.context.predict.sequence_length = seq_len
+    kwargs = dict(
+        model_type=model_type,
+        filenames=video_list[:1],
+        resize_dims=[64, 64],
+        dali_config=cfg_tmp.dali,
+        num_threads=2,
+    )
+    loader_class = PrepareOpenCV(**kwargs)
+    batches = list(loader_class())
+    num_iters = loader_class.num_iters
+
+    # uneven shards, including the zero-padded final sequence
+    bounds = [0, 1, num_iters // 2, num_iters - 1, num_iters]
+    batches_sharded = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        loader = PrepareOpenCV(**kwargs, sequence_range=(first, last))()
+        assert len(loader) == last - first
+        batches_sharded += list(loader)
+
+    assert len(batches_sharded) == len(batches)
+    for batch, batch_sharded in zip(batches, batches_sharded):
+        assert torch.equal(batch["frames"], batch_sharded["frames"])
+        assert torch.equal(batch["bbox"], batch_sharded["bbox"])
+
+
+@pytest.mark.parametrize("model_type", ["base", "context"])
+def test_prepare_opencv_frame_indices(cfg, video_list, model_type):
+    """Batches of selected frames must match the frames of the full video."""
+
+    from lightning_pose.data.video_readers import PrepareOpenCV
+
+    seq_len = 16
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.dali.base.predict.sequence_length = seq_len
+    cfg_tmp.dali.context.predict.sequence_length = seq_len
+    kwargs = dict(
+        model_type="base",
+        filenames=video_list[:1],
+        resize_dims=[64, 64],
+        dali_config=cfg_tmp.dali,
+        num_threads=2,
+    )
+    frame_count = count_frames(video_list[0])
+    # the final sequence is zero-padded
+    frames = torch.cat([batch["frames"] for batch in PrepareOpenCV(**kwargs)()])[:frame_count]
+
+    # frame range at the start of the video, sparse frames that need seeking, and the last frame
+    frame_indices = np.concatenate([np.arange(0, 10, 3), [200, 300], [frame_count - 1]])
+    kwargs["model_type"] = model_type
+    loader = PrepareOpenCV(**kwargs, frame_indices=frame_indices)()
+    batches = list(loader)
+    assert len(batches) == len(loader)
+    frames_selected = torch.cat([batch["frames"] for batch in batches])
+    assert frames_selected.shape[0] == len(frame_indices)
+    if model_type == "base":
+        assert torch.equal(frames_selected, frames[frame_indices])
+    else:
+        # context windows are shifted inside the video at its edges
+        centers = np.clip(frame_indices, 2, frame_count - 3)
+        for window, center in zip(frames_selected, centers):
+            assert torch.equal(window, frames[center - 2:center + 3])
+
+
+def test_prepare_opencv_bboxes(cfg, video_list):
+    """Frames are cropped to their own bbox, which is returned in the batch."""
+
+    import cv2
+
+    from lightning_pose.data.video_readers import PrepareOpenCV
+
+    seq_len = 16
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.dali.base.predict.sequence_length = seq_len
+    kwargs = dict(
+        model_type="base",
+        filenames=video_list[:1],
+        resize_dims=[64, 64],
+        dali_config=cfg_tmp.dali,
+        num_threads=2,
+    )
+    frame_count = count_frames(video_list[0])
+    cap = cv2.VideoCapture(video_list[0])
+    height, width = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame0 = cv2.cvtColor(cap.read()[1], cv2.COLOR_BGR2RGB)
+    cap.release()
+
+    # bboxes covering the full frame leave the frames unchanged
+    loader = PrepareOpenCV(**kwargs)()
+    bboxes = np.tile([0, 0, height, width], (frame_count, 1))
+    loader_crop = PrepareOpenCV(**kwargs, bboxes=bboxes)()
+    assert len(loader_crop) == len(loader)
+    for batch, batch_crop in zip(loader, loader_crop):
+        assert torch.equal(batch["frames"], batch_crop["frames"])
+        assert torch.equal(batch["bbox"].float(), batch_crop["bbox"])
+
+    # bboxes that extend past the frame are zero-filled
+    bboxes = np.tile([-10, 20, 40, 50], (frame_count, 1))
+    bboxes[1:, 0] = np.arange(1, frame_count)
+    batch = next(iter(PrepareOpenCV(**kwargs, bboxes=bboxes)()))
+    assert torch.equal(batch["bbox"], torch.tensor(bboxes[:seq_len], dtype=torch.float32))
+    crop = np.zeros((40, 50, 3), dtype=np.uint8)
+    crop[:, 10:] = frame0[20:60, :40]
+    expected = loader_crop._process_frame(crop)
+    assert np.allclose(batch["frames"][0].numpy(), expected)
@@ -4,6 +4,7 @@ import numpy as np
 import pytest
 import torch
 from kornia.geometry.subpix import spatial_softmax2d
+from kornia.losses import kl_div_loss_2d
 
 from lightning_pose.data.utils import generate_heatmaps
 from lightning_pose.losses.losses import (
@@ -15,6 +16,7 @@ from lightning_pose.losses.losses import (
     PCALoss,
     RegressionMSELoss,
     RegressionRMSELoss,
+    TemporalHeatmapLoss,
     TemporalLoss,
     UnimodalLoss,
     get_loss_classes,
@@ -306,6 +308,57 @@ def test_temporal_loss_multi_epsilon_rectification():
     assert torch.allclose(rectified[1, :], torch.tensor([0.0, 0.0, 0.0]))
 
 
+def test_temporal_loss_remove_nans():
+    temporal_loss = TemporalLoss(epsilon=0.0, prob_threshold=0.5)
+    confidences = torch.rand(size=(20, 16))
+    loss = torch.rand(size=(19, 16))
+    clean_loss = temporal_loss.remove_nans(loss=loss, confidences=confidences)
+    # loop over consecutive frames
+    for i in range(confidences.shape[0] - 1):
+        ignore = (confidences[i] < 0.5) | (confidences[i + 1] < 0.5)
+        assert torch.all(clean_loss[i, ignore] == 0.0)
+        assert torch.all(clean_loss[i, ~ignore] == loss[i, ~ignore])
+    # input is not modified
+    assert torch.all(loss > 0.0)
+
+
+@pytest.mark.parametrize("loss_name", ["temporal_heatmap_mse", "temporal_heatmap_kl"])
+def test_temporal_heatmap_loss(loss_name):
+    temporal_heatmap_loss = TemporalHeatmapLoss(loss_name=loss_name, prob_threshold=0.1)
+
+    n_frames, num_keypoints, img_size = 32, 10, 48
+    heatmaps = spatial_softmax2d(
+        torch.randn(size=(n_frames, num_keypoints, img_size, img_size)),
+        temperature=torch.tensor(10.0),
+    )
+    confidences = torch.rand(size=(n_frames, num_keypoints))
+
+    # loop over consecutive frames
+    diffs = torch.zeros(size=(n_frames - 1, num_keypoints))
+    for i in range(n_frames - 1):
+        if loss_name == "temporal_heatmap_mse":
+            diffs[i] = torch.mean((heatmaps[i] - heatmaps[i + 1]) ** 2, dim=(-2, -1))
+        else:
+            diffs[i] = kl_div_loss_2d(
+                heatmaps[i].unsqueeze(0) + 1e-10,
+                heatmaps[i + 1].unsqueeze(0) + 1e-10,
+                reduction="none",
+            )
+        diffs[i, (confidences[i] < 0.1) | (confidences[i + 1] < 0.1)] = 0.0
+
+    elementwise_loss = temporal_heatmap_loss.compute_loss(predictions=heatmaps)
+    clean_loss = temporal_heatmap_loss.remove_nans(
+        confidences=confidences, loss=elementwise_loss,
+    )
+    assert clean_loss.shape == (n_frames - 1, num_keypoints)
+    assert torch.allclose(clean_loss, diffs, rtol=1e-5, atol=1e-8)
+
+    loss, logs = temporal_heatmap_loss(heatmaps, confidences=confidences, stage=stage)
+    assert loss.shape == torch.Size([])
+    assert torch.allclose(loss, temporal_heatmap_loss.weight * diffs.mean())
+    assert logs[0]["name"] == f"{stage}_{loss_name}_loss"
+
+
 def test_unimodal_mse_loss():
     img_size = 48
     img_size_ds = 32
@@ -3,10 +3,13 @@ import pytest
 import torch
 import torch.nn as nn
 
+from lightning_pose.data.utils import generate_heatmaps
 from lightning_pose.models.heads.heatmap import (
     HeatmapHead,
+    decode_heatmaps,
     make_upsampling_layers,
     run_subpixelmaxima,
+    run_subpixelmaxima_local,
     upsample,
 )
 
@@ -219,6 +222,67 @@ class TestRunSubpixelMaxima:
         assert confidences[0, 0] < torch.tensor(0.5)
 
 
+class TestRunSubpixelMaximaLocal:
+
+    @pytest.mark.parametrize("downsample_factor", [1, 2, 3])
+    def test_matches_full_decoder(self, downsample_factor):
+
+        torch.manual_seed(0)
+        batch_size, num_keypoints = 4, 17
+        height, width = 48, 40
+        scale = 2 ** downsample_factor
+        keypoints = torch.rand(batch_size, num_keypoints, 2) * torch.tensor([width, height])
+        keypoints *= scale
+        # keypoints at corners and edges
+        keypoints[0, :4] = torch.tensor([
+            [0, 0], [width * scale - 1, height * scale - 1], [0, height * scale / 2], [10, 1],
+        ])
+        heatmaps = generate_heatmaps(
+            keypoints, height=height * scale, width=width * scale, output_shape=(height, width),
+        )
+        heatmaps = heatmaps + 1e-4 * torch.rand_like(heatmaps)
+        heatmaps = heatmaps / heatmaps.sum(dim=(2, 3), keepdim=True)
+
+        temperature = torch.tensor(1000.0)
+        preds, confidences = run_subpixelmaxima(heatmaps, downsample_factor, temperature)
+        preds_local, confidences_local = run_subpixelmaxima_local(
+            heatmaps, downsample_factor, temperature,
+        )
+        assert preds_local.shape == preds.shape == (batch_size, num_keypoints * 2)
+        assert confidences_local.shape == confidences.shape == (batch_size, num_keypoints)
+        assert torch.allclose(preds_local, preds, atol=0.1)
+        # confidences pool over integer pixel locations; allow for predictions on either side
+        # of a pixel boundary
+        assert torch.allclose(confidences_local, confidences, atol=0.1)
+        assert torch.median(torch.abs(confidences_local - confidences)) < 1e-3
+
+    @pytest.mark.parametrize("downsample_factor", [1, 2])
+    def test_small_heatmaps(self, downsample_factor):
+
+        # window covers the full heatmap; decoders are identical
+        inputs = torch.rand(2, 3, 8, 8)
+        inputs[0, 0, 0, 0] = 2.0
+        inputs[1, 2, 4, 5] = 2.0
+        temperature = torch.tensor(100.0)
+        preds, confidences = run_subpixelmaxima(inputs, downsample_factor, temperature)
+        preds_local, confidences_local = run_subpixelmaxima_local(
+            inputs, downsample_factor, temperature,
+        )
+        assert torch.allclose(preds_local, preds, atol=1e-4)
+        assert torch.allclose(confidences_local, confidences, atol=1e-5)
+
+    def test_decode_heatmaps(self):
+
+        inputs = torch.rand(2, 3, 8, 8)
+        temperature = torch.tensor(1000.0)
+        preds, _ = decode_heatmaps(inputs, 2, temperature, decoder="full")
+        assert torch.equal(preds, run_subpixelmaxima(inputs, 2, temperature)[0])
+        preds, _ = decode_heatmaps(inputs, 2, temperature, decoder="local")
+        assert torch.equal(preds, run_subpixelmaxima_local(inputs, 2, temperature)[0])
+        with pytest.raises(NotImplementedError):
+            decode_heatmaps(inputs, 2, temperature, decoder="bicubic")
+
+
 class TestHeatmapHead:
 
     @pytest.fixture
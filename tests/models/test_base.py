@@ -5,7 +5,7 @@ import gc
 import torch
 import torchvision
 
-from lightning_pose.models.base import BaseFeatureExtractor
+from lightning_pose.models.base import BaseFeatureExtractor, get_context_from_sequence
 
 _TORCH_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
@@ -17,6 +17,34 @@ EFFICIENTNET_BACKBONES = ["efficientnet_b0", "efficientnet_b1", "efficientnet_b2
 VIT_BACKBONES = ["vits_dino", "vitb_dino", "vitb_imagenet", "vitb_sam"]
 
 
+def test_get_context_from_sequence():
+
+    seq_len = 9
+    img_seq = torch.rand(size=(seq_len, 4, 3, 2))
+
+    # reference: pad with repeated first/last frames, then copy windows one at a time
+    context_length = 5
+    padded_seq = torch.cat([img_seq[:1], img_seq[:1], img_seq, img_seq[-1:], img_seq[-1:]])
+    expected = torch.stack([padded_seq[i:i + context_length] for i in range(seq_len)])
+
+    context = get_context_from_sequence(img_seq, context_length=context_length)
+    assert context.shape == (seq_len, context_length, 4, 3, 2)
+    assert torch.equal(context, expected)
+
+    # without padding, only windows with full context are returned (and no data is copied)
+    context = get_context_from_sequence(img_seq, context_length=context_length, pad=False)
+    assert context.shape == (seq_len - 4, context_length, 4, 3, 2)
+    assert torch.equal(context, expected[2:-2])
+    assert context.data_ptr() == img_seq.data_ptr()
+
+    # other context lengths
+    for context_length in [3, 4, 7]:
+        context = get_context_from_sequence(img_seq, context_length=context_length)
+        assert context.shape == (seq_len, context_length, 4, 3, 2)
+        center = (context_length - 1) // 2
+        assert torch.equal(context[:, center], img_seq)
+
+
 def test_backbones_resnet():
 
     for ind, backbone in enumerate(RESNET_BACKBONES):
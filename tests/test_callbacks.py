@@ -253,6 +253,30 @@ class TestPatchMasker:
         assert torch.equal(masked_images_1, masked_images_2)
         assert torch.equal(patch_mask_1, patch_mask_2)
 
+    def test_masked_pixels_match_patch_mask(self, basic_masker):
+        """Test that exactly the pixels of the masked patches are zeroed out."""
+        batch_size, num_views, patch_size = 3, 2, 16
+        # image size not divisible by the patch size
+        images = torch.rand(batch_size, num_views, 3, 200, 232) + 1.0
+
+        masked_images, patch_mask = basic_masker.apply_patch_masking(
+            images, training_step=600, is_training=True,
+        )
+
+        num_patches_h, num_patches_w = 200 // patch_size, 232 // patch_size
+        assert patch_mask.shape == (batch_size, num_views, num_patches_h * num_patches_w)
+        for b in range(batch_size):
+            for v in range(num_views):
+                expected = images[b, v].clone()
+                for patch_idx in torch.where(patch_mask[b, v] == 0)[0]:
+                    patch_h = (patch_idx // num_patches_w) * patch_size
+                    patch_w = (patch_idx % num_patches_w) * patch_size
+                    expected[:, patch_h:patch_h + patch_size, patch_w:patch_w + patch_size] = 0
+                assert torch.equal(masked_images[b, v], expected)
+        # different patches are masked for different samples and views
+        assert not torch.equal(patch_mask[0, 0], patch_mask[0, 1])
+        assert not torch.equal(patch_mask[0, 0], patch_mask[1, 0])
+
     def test_different_masking_per_step(self, basic_masker):
         """Test that different steps produce different masks."""
         batch_size, num_views = 2, 2
@@ -4,10 +4,15 @@ import shutil
 from pathlib import Path
 from typing import Union
 
+import numpy as np
+import pandas as pd
 import pytest
 from omegaconf import OmegaConf
+from PIL import Image
 
+from lightning_pose.data.datasets import PACKED_IMAGES_FILENAME, PackedImageStore
 from lightning_pose.utils.cropzoom import (
+    _crop_images,
     generate_cropped_labeled_frames,
     generate_cropped_video,
 )
@@ -153,3 +158,39 @@ def test_generate_cropped_video(tmp_path, request):
     )
     # Successfully compared 2 objects (need to skip mp4s)
     assert comparison == 2
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_crop_images(tmp_path, packed):
+    # frames 0-9 of a session; frame 5 was not extracted
+    img_dir = tmp_path / "data" / "labeled-data" / "session0"
+    img_dir.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for i in [0, 1, 2, 3, 4, 6, 7, 8, 9]:
+        img = rng.integers(0, 256, size=(40, 50, 3), dtype=np.uint8)
+        Image.fromarray(img).save(img_dir / f"img{i:03d}.png")
+
+    # the last bbox extends past the frame
+    bbox_df = pd.DataFrame(
+        [[0, 0, 10, 12], [5, 6, 20, 14], [40, 30, 16, 16]],
+        index=[f"labeled-data/session0/img{i:03d}.png" for i in [2, 4, 9]],
+        columns=["x", "y", "h", "w"],
+    )
+    output_dir = tmp_path / "cropped"
+    _crop_images(
+        bbox_df, tmp_path / "data", output_dir, packed=packed, num_workers=2, chunk_size=2,
+    )
+
+    # labeled frames are cropped with their own bbox, context frames with the first labeled
+    # frame they belong to
+    expected_bbox = {0: 2, 1: 2, 2: 2, 3: 2, 4: 4, 6: 4, 7: 9, 8: 9, 9: 9}
+    if packed:
+        assert [p.name for p in output_dir.iterdir()] == [PACKED_IMAGES_FILENAME]
+        store = PackedImageStore(output_dir / PACKED_IMAGES_FILENAME)
+        assert len(store) == len(expected_bbox)
+    for i, labeled in expected_bbox.items():
+        name = f"labeled-data/session0/img{i:03d}.png"
+        x, y, h, w = bbox_df.loc[f"labeled-data/session0/img{labeled:03d}.png"]
+        expected = Image.open(tmp_path / "data" / name).crop((x, y, x + w, y + h))
+        cropped = store.open(name) if packed else Image.open(output_dir / name)
+        assert np.array_equal(np.asarray(cropped), np.asarray(expected))
@@ -0,0 +1,77 @@
+"""Test the export of models and the Lightning-free runtime."""
+
+import copy
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from lightning_pose.data.video_readers import OpenCVVideoLoader
+from lightning_pose.runtime import Predictor
+from lightning_pose.utils.export import export_model
+from lightning_pose.utils.scripts import get_loss_factories, get_model
+
+
+@pytest.mark.parametrize("export_format", ["torchscript", "onnx"])
+@pytest.mark.parametrize("model_type", ["heatmap", "heatmap_mhcrnn"])
+def test_export_model(cfg, video_list, tmp_path, request, model_type, export_format):
+    """Exported models must reproduce the predictions of the LightningModule."""
+    if export_format == "onnx":
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+    data_module = request.getfixturevalue(
+        "heatmap_data_module_context" if model_type == "heatmap_mhcrnn" else "heatmap_data_module"
+    )
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.model.model_type = model_type
+    cfg_tmp.model.losses_to_use = []
+    loss_factories = get_loss_factories(cfg=cfg_tmp, data_module=data_module)
+    model = get_model(cfg=cfg_tmp, data_module=data_module, loss_factories=loss_factories)
+    model.eval()
+
+    # predictions of the model on the first frames of a video
+    n_frames = 12
+    height, width = cfg_tmp.data.image_resize_dims.height, cfg_tmp.data.image_resize_dims.width
+    loader = OpenCVVideoLoader(
+        filenames=video_list[:1],
+        resize_dims=[height, width],
+        sequence_length=n_frames,
+        step=n_frames,
+        num_iters=1,
+    )
+    with torch.no_grad():
+        kps_model, confs_model = model.predict_step(next(iter(loader)), 0)
+    kps_model = kps_model.reshape(kps_model.shape[0], -1, 2).numpy()
+
+    suffix = ".onnx" if export_format == "onnx" else ".pt"
+    model_file = export_model(
+        model, cfg_tmp, tmp_path / f"model{suffix}", export_format=export_format,
+    )
+    # batches smaller than the number of frames, to check that context frames are shared
+    predictor = Predictor(model_file, batch_size=5)
+    assert predictor.keypoint_names == list(cfg_tmp.data.keypoint_names)
+    assert predictor.context == (model_type == "heatmap_mhcrnn")
+
+    cap = cv2.VideoCapture(video_list[0])
+    frames = [cv2.cvtColor(cap.read()[1], cv2.COLOR_BGR2RGB) for _ in range(n_frames)]
+    cap.release()
+    kps, confs = predictor.predict_frames(frames)
+    assert kps.shape == (n_frames, len(predictor.keypoint_names), 2)
+    assert confs.shape == (n_frames, len(predictor.keypoint_names))
+    if predictor.context:
+        # the first and last two frames have the predictions of frames 2 and -3
+        assert np.array_equal(kps[0], kps[2]) and np.array_equal(kps[-1], kps[-3])
+        kps, confs = kps[2:-2], confs[2:-2]
+    assert np.allclose(kps, kps_model, atol=1e-3)
+    assert np.allclose(confs, confs_model.numpy(), atol=1e-5)
+
+
+def test_runtime_does_not_import_lightning():
+    code = (
+        "import sys; import lightning_pose.runtime; "
+        "assert 'lightning' not in sys.modules and 'kornia' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
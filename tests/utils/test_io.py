@@ -5,6 +5,7 @@ import shutil
 import textwrap
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -544,3 +545,65 @@ def test_fix_empty_first_row(tmp_path):
     assert len(fixed_df) == 3
     assert fixed_df.index.name is None
     assert fixed_df.index[0] == "labeled-data/test1.png"
+
+
+def _make_prediction_df(with_set: bool) -> pd.DataFrame:
+    pdindex = pd.MultiIndex.from_product(
+        [["heatmap_tracker"], ["paw", "nose"], ["x", "y", "likelihood"]],
+        names=["scorer", "bodyparts", "coords"],
+    )
+    rng = np.random.default_rng(0)
+    data = rng.random((5, 6)).astype(np.float32).astype(np.float64)
+    df = pd.DataFrame(data, columns=pdindex)
+    if with_set:
+        df["set"] = ["train", "train", "validation", "test", "unused"]
+        df.index = [f"labeled-data/img{i:03d}.png" for i in range(5)]
+    return df
+
+
+@pytest.mark.parametrize("prediction_format", ["npz", "h5"])
+@pytest.mark.parametrize("with_set", [False, True])
+def test_save_load_predictions(tmp_path, prediction_format, with_set):
+    df = _make_prediction_df(with_set)
+    preds_file = tmp_path / "predictions.csv"
+    io_utils.save_predictions(df, preds_file, prediction_format=prediction_format)
+
+    binary_file = tmp_path / f"predictions.{prediction_format}"
+    assert preds_file.exists()
+    assert binary_file.exists()
+
+    # binary copy is used when loading the csv file
+    df_binary = io_utils.load_predictions(preds_file)
+    pd.testing.assert_frame_equal(df_binary, df, check_index_type=False)
+    pd.testing.assert_frame_equal(io_utils.load_predictions(binary_file), df_binary)
+
+    # values match the csv file (up to the precision of the csv parser)
+    binary_file.unlink()
+    df_csv = io_utils.load_predictions(preds_file)
+    assert np.allclose(
+        df_csv.iloc[:, :6].to_numpy(), df_binary.iloc[:, :6].to_numpy(), rtol=1e-12, atol=0,
+    )
+    assert list(df_csv.index) == list(df_binary.index)
+    if with_set:
+        assert df_csv.columns[-1][0] == "set"
+        assert np.array_equal(df_csv.iloc[:, -1].to_numpy(), df_binary.iloc[:, -1].to_numpy())
+
+
+def test_load_predictions_stale_binary(tmp_path):
+    df = _make_prediction_df(with_set=False)
+    preds_file = tmp_path / "predictions.csv"
+    io_utils.save_predictions(df, preds_file, prediction_format="npz")
+
+    # csv file is rewritten without a binary copy; stale binary copy must be ignored
+    df_new = df * 2
+    df_new.to_csv(preds_file)
+    binary_file = tmp_path / "predictions.npz"
+    os.utime(binary_file, (0, 0))
+    assert np.allclose(io_utils.load_predictions(preds_file).to_numpy(), df_new.to_numpy())
+
+
+def test_save_predictions_invalid_format(tmp_path):
+    with pytest.raises(ValueError):
+        io_utils.save_predictions(
+            _make_prediction_df(with_set=False), tmp_path / "p.csv", prediction_format="xlsx",
+        )
@@ -0,0 +1,56 @@
+"""Test the rendering of labeled videos."""
+
+import cv2
+import numpy as np
+import pytest
+
+from lightning_pose.data.utils import count_frames
+from lightning_pose.utils.labeled_video import render_labeled_video
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_render_labeled_video(video_list, tmp_path, num_workers):
+
+    video_file = video_list[0]
+    n_frames = count_frames(video_file)
+    # a single keypoint in the center of the frame, hidden in odd frames
+    cap = cv2.VideoCapture(video_file)
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    xs_arr = np.full((n_frames, 1), width / 2)
+    ys_arr = np.full((n_frames, 1), height / 2)
+    mask_array = np.zeros((n_frames, 1), dtype=bool)
+    mask_array[::2] = True
+
+    output_file = str(tmp_path / "labeled.mp4")
+    render_labeled_video(
+        video_file, xs_arr, ys_arr, mask_array, colormap="cool",
+        output_video_path=output_file, num_workers=num_workers,
+    )
+    assert count_frames(output_file) == n_frames
+    assert list(tmp_path.iterdir()) == [tmp_path / "labeled.mp4"]
+
+    # first frames, and frames around the start of the second chunk when rendering in parallel
+    boundary = n_frames // 2
+    check_frames = list(range(4)) + list(range(boundary - 2, boundary + 3))
+    cap = cv2.VideoCapture(video_file)
+    frames_og = [cap.read()[1].astype(int) for _ in range(boundary + 4)]
+    cap.release()
+    cap = cv2.VideoCapture(output_file)
+    frames = [cap.read()[1].astype(int) for _ in range(boundary + 4)]
+    cap.release()
+    for i in check_frames:
+        frame = frames[i]
+        # the "cool" colormap starts with cyan, the video is grayscale
+        pixel = frame[height // 2, width // 2]
+        if mask_array[i, 0]:
+            assert pixel[0] - pixel[2] > 100
+        else:
+            assert abs(pixel[0] - pixel[2]) < 30
+        # markers are drawn on the right frame: the bottom half of the frame, away from the
+        # marker and the timestamp, matches frame i of the original video best
+        diffs = [
+            np.abs(frame[height // 2 + 10:] - frames_og[j][height // 2 + 10:]).mean()
+            for j in (i - 1, i, i + 1) if j >= 0
+        ]
+        assert np.argmin(diffs) == (1 if i > 0 else 0)
@@ -81,6 +81,44 @@ def test_pca_keypoint_class_singleview(cfg, base_data_module_combined):
     assert err.shape == (n_batches, 14)
 
 
+def test_pca_keypoint_class_cache(cfg, heatmap_data_module, tmp_path):
+
+    kwargs = dict(
+        loss_type="pca_singleview",
+        data_module=heatmap_data_module,
+        components_to_keep=0.99,
+        columns_for_singleview_pca=cfg.data.columns_for_singleview_pca,
+        cache_dir=tmp_path,
+    )
+
+    kp_pca = KeypointPCA(empirical_epsilon_percentile=90.0, **kwargs)
+    assert not kp_pca.cache_file.exists()
+    kp_pca()
+    assert kp_pca.cache_file.is_file()
+
+    # same labels and arguments: parameters are loaded without fitting pca
+    kp_pca_cached = KeypointPCA(empirical_epsilon_percentile=90.0, **kwargs)
+    assert kp_pca_cached.cache_file == kp_pca.cache_file
+    kp_pca_cached()
+    assert kp_pca_cached.pca_object is None
+    assert kp_pca_cached._n_components_kept == kp_pca._n_components_kept
+    for key in ["mean", "kept_eigenvectors", "discarded_eigenvectors"]:
+        assert torch.allclose(kp_pca_cached.parameters[key], kp_pca.parameters[key])
+    assert np.isclose(kp_pca_cached.parameters["epsilon"], kp_pca.parameters["epsilon"])
+
+    # epsilon is recomputed for a different percentile from the cached reprojection errors
+    kp_pca_eps = KeypointPCA(empirical_epsilon_percentile=50.0, **kwargs)
+    assert kp_pca_eps.cache_file == kp_pca.cache_file
+    kp_pca_eps()
+    assert kp_pca_eps.pca_object is None
+    assert kp_pca_eps.parameters["epsilon"] < kp_pca.parameters["epsilon"]
+
+    # different pca arguments use a different cache file
+    kwargs["components_to_keep"] = 3
+    kp_pca_new = KeypointPCA(empirical_epsilon_percentile=90.0, **kwargs)
+    assert kp_pca_new.cache_file != kp_pca.cache_file
+
+
 def test_pca_keypoint_class_median_centering(cfg, base_data_module_combined):
     # initialize an instance
     kp_pca = KeypointPCA(
@@ -1,17 +1,26 @@
 """Test the predictions module."""
 
 import copy
+import filecmp
 import gc
 import os
+from unittest.mock import patch
 
 import lightning.pytorch as pl
+import numpy as np
 import pytest
 import torch
 
+from lightning_pose.data.utils import count_frames
+from lightning_pose.utils.io import save_predictions
 from lightning_pose.utils.predictions import (
+    InferenceSession,
+    PredictionHandler,
+    StreamingPredictionWriter,
     export_predictions_and_labeled_video,
     predict_dataset,
     predict_single_video,
+    select_frames,
 )
 from lightning_pose.utils.scripts import get_loss_factories, get_model
 
@@ -253,3 +262,128 @@ def test_export_predictions_and_labeled_video(
     del model
     gc.collect()
     torch.cuda.empty_cache()
+
+
+@pytest.mark.parametrize(
+    "model_type, seq_len, n_frames_short",
+    [
+        ("heatmap", 16, 0),
+        ("heatmap_mhcrnn", 16, 0),
+        ("heatmap_mhcrnn", 16, 20),  # fewer predictions than frames
+    ],
+)
+def test_streaming_prediction_writer(cfg, video_list, tmpdir, model_type, seq_len, n_frames_short):
+    """Streaming writer must reproduce the outputs of PredictionHandler.unpack_preds."""
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.model.model_type = model_type
+    num_keypoints = len(cfg_tmp.data.keypoint_names)
+    frame_count = count_frames(video_list[0])
+    do_context = model_type == "heatmap_mhcrnn"
+
+    # fake batch outputs, mimicking the number of rows returned by the dali loaders
+    step = seq_len - 4 if do_context else seq_len
+    rows_per_batch = seq_len - 4 if do_context else seq_len
+    num_batches = int(np.ceil((frame_count - n_frames_short) / step))
+    generator = torch.Generator().manual_seed(0)
+    preds = [
+        (
+            torch.rand(rows_per_batch, 2 * num_keypoints, generator=generator) * 100,
+            torch.rand(rows_per_batch, num_keypoints, generator=generator),
+        )
+        for _ in range(num_batches)
+    ]
+
+    pred_handler = PredictionHandler(cfg=cfg_tmp, video_file=video_list[0])
+    preds_expected, confs_expected = pred_handler.unpack_preds(preds=preds)
+
+    writer = StreamingPredictionWriter(
+        array_file=str(tmpdir.join("preds.tmp.npy")),
+        frame_count=pred_handler.frame_count,
+        do_context=do_context,
+    )
+    for batch_idx, pred in enumerate(preds):
+        writer.write_on_batch_end(None, None, pred, None, None, batch_idx, 0)
+    arr_streamed = writer.finalize()
+    assert isinstance(arr_streamed, np.memmap)
+
+    arr_expected = pred_handler.make_pred_arr_undo_resize(
+        preds_expected.numpy(), confs_expected.numpy()
+    )
+    assert np.array_equal(arr_streamed, arr_expected)
+
+    # dataframes are identical as well, and are views of the on-disk array
+    df_expected = pred_handler.make_prediction_dfs(preds_expected, confs_expected)
+    df_streamed = pred_handler.make_prediction_dfs_from_array(arr_streamed)
+    assert np.shares_memory(df_streamed.to_numpy(), arr_streamed)
+    assert df_streamed.astype(np.float64).equals(df_expected)
+
+    # the array stays readable after the file is removed
+    writer.cleanup()
+    assert not os.path.exists(str(tmpdir.join("preds.tmp.npy")))
+    assert df_streamed.astype(np.float64).equals(df_expected)
+
+    # csv files are identical, and are written in chunks
+    save_predictions(df_expected, str(tmpdir.join("expected.csv")))
+    with patch("lightning_pose.utils.io._CSV_CHUNK_SIZE", 7):
+        save_predictions(df_streamed, str(tmpdir.join("streamed.csv")))
+    assert filecmp.cmp(
+        str(tmpdir.join("expected.csv")), str(tmpdir.join("streamed.csv")), shallow=False
+    )
+
+
+def test_select_frames():
+    # the full video takes the default prediction path
+    assert select_frames(100) is None
+    assert select_frames(100, end_frame=200) is None
+    assert np.array_equal(select_frames(100, start_frame=95), np.arange(95, 100))
+    assert np.array_equal(select_frames(100, 10, 20, stride=4), [10, 14, 18])
+    with pytest.raises(ValueError):
+        select_frames(100, start_frame=100)
+    with pytest.raises(ValueError):
+        select_frames(100, stride=0)
+
+
+def test_inference_session(cfg, heatmap_data_module, tmpdir):
+    """Session predictions must match trainer predictions without constructing a trainer."""
+    cfg_tmp = copy.deepcopy(cfg)
+    cfg_tmp.model.model_type = "heatmap"
+    cfg_tmp.model.losses_to_use = []
+    loss_factories = get_loss_factories(cfg=cfg_tmp, data_module=heatmap_data_module)
+    model = get_model(cfg=cfg_tmp, data_module=heatmap_data_module, loss_factories=loss_factories)
+    model.eval()
+
+    trainer = pl.Trainer(accelerator="cpu", devices=1, logger=False)
+    preds_trainer = trainer.predict(
+        model=model,
+        dataloaders=heatmap_data_module.full_labeled_dataloader(),
+        return_predictions=True,
+    )
+
+    session = InferenceSession(model, device="cpu", decoder="local")
+    assert model.head.decoder == "local"
+    session.model.head.decoder = "full"
+    preds_session = session.predict(heatmap_data_module.full_labeled_dataloader())
+    assert len(preds_session) == len(preds_trainer)
+    for (kps_s, confs_s), (kps_t, confs_t) in zip(preds_session, preds_trainer):
+        assert torch.allclose(kps_s, kps_t, atol=1e-4)
+        assert torch.allclose(confs_s, confs_t, atol=1e-5)
+
+    # predictions can also be streamed to a writer without being returned
+    assert session.predict(
+        heatmap_data_module.full_labeled_dataloader(), return_predictions=False,
+    ) is None
+
+    # predict_dataset uses the session instead of a trainer
+    preds_file = str(tmpdir.join("preds_session.csv"))
+    df = predict_dataset(
+        cfg=cfg_tmp,
+        data_module=heatmap_data_module,
+        preds_file=preds_file,
+        session=session,
+    )
+    assert os.path.exists(preds_file)
+    assert df.shape[0] == len(heatmap_data_module.dataset)
+
+    # closing the session restores the decoder the model was loaded with
+    session.close()
+    assert model.head.decoder == "full"